@@ -0,0 +1,186 @@
+"""
+Benchmark: training reads from PostgreSQL only vs. from the Parquet
+archive (core/archive.py) plus the rows still in the table.
+
+Seeds a scratch schema with the partitioned 'behavioral_events' layout
+(see bench_partitioning.py), builds a few users' feature matrices from
+raw events, archives every partition but the newest --hot-days, and
+builds them again. Checks the features are identical and reports read
+times and the size of the table vs. the archive.
+
+--history-rows older events are put in the DEFAULT partition, like the
+pre-partitioning history migration 3b8f0c5d7e21 moves there. They are
+never archived, and must still be read, in their place before the
+archived days.
+
+Then one user's remaining rows are deleted, so all of their history is
+in the archive, and a new mouse movement of theirs reaches a feature
+store that has never seen them. Checks the store rebuilds them from the
+archive instead of starting from that one event.
+
+Usage (uses the DB_* settings from .env unless --url is given):
+    python benchmarks/bench_archive.py --rows 2000000 --users 50 --days 30
+    python benchmarks/bench_archive.py --url postgresql://postgres@localhost/bench --hot-days 3
+
+Needs a PostgreSQL 12+ you can create schemas on, and pyarrow. The
+scratch schema and archive directory are removed afterwards.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# --- Path Setup ---
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'services', 'risk-engine'))
+sys.path.append(os.path.dirname(__file__))
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+from bench_partitioning import create_after, seed, default_url
+
+SCHEMA = "bench_archive"
+
+
+def table_bytes(conn) -> int:
+    return conn.execute(text("""
+        SELECT COALESCE(sum(pg_total_relation_size(inhrelid)), 0)::bigint
+        FROM pg_inherits WHERE inhparent = to_regclass('behavioral_events')
+    """)).scalar()
+
+
+def archive_bytes(root: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for path, _, names in os.walk(root) for name in names)
+
+
+def load_all(engine, user_ids: list[str]) -> tuple[dict, float]:
+    """Mouse + keystroke features from raw events, as training builds them without the feature store."""
+    from data_loader import load_raw_features, load_keystroke_features
+    start = time.perf_counter()
+    features = {}
+    for user_id in user_ids:
+        mouse, _, starts = load_raw_features(engine, user_id)
+        features[user_id] = np.hstack([mouse, load_keystroke_features(engine, user_id, starts)])
+    return features, time.perf_counter() - start
+
+
+def seed_history(conn, rows: int, users: int, days: int) -> None:
+    """Events from before the first daily partition, which land in the DEFAULT one."""
+    conn.execute(text(f"""
+        INSERT INTO behavioral_events (user_id, event_type, x, y, key, timestamp, received_at)
+        SELECT
+            'user-' || (g % {users}),
+            CASE WHEN g % 20 < 17 THEN 'mousemove' WHEN g % 20 < 19 THEN 'keydown' ELSE 'click' END,
+            (g * 11) % 1920,
+            (g * 3) % 1080,
+            CASE WHEN g % 20 IN (17, 18) THEN chr(97 + g % 26) END,
+            1600000000000 + g * 5,
+            now() - interval '{days + 30} days' + (g::float / {max(rows, 1)}) * interval '20 days'
+        FROM generate_series(1, {rows}) AS g
+    """))
+
+
+def first_seen_after_archive(engine, user_id: str) -> bool:
+    """
+    The feature store check from the module docstring: whether the
+    stored windows match the raw features after the new event.
+    """
+    from core.database import Base
+    from core.feature_store import FeatureStoreUpdater, load_features, STATE, WINDOWS
+    from data_loader import load_raw_features
+
+    Base.metadata.create_all(engine, tables=[STATE, WINDOWS])
+    row = {"user_id": user_id, "event_type": "mousemove", "x": 100, "y": 100, "timestamp": 9_000_000_000_000}
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM behavioral_events WHERE user_id = :user_id"), row)
+        conn.execute(text("INSERT INTO behavioral_events (user_id, event_type, x, y, timestamp) "
+                          "VALUES (:user_id, :event_type, :x, :y, :timestamp)"), row)
+
+    # As the event logger does: fold in committed rows, rebuild flagged users
+    updater = FeatureStoreUpdater(engine, rebuild_batch=0)
+    updater.add([row])
+    updater.apply_all()
+    updater.rebuild_flagged(limit=1)
+
+    stored = load_features(engine, user_id)
+    raw, n_raw, _ = load_raw_features(engine, user_id)
+    return (stored is not None and stored[1] == n_raw > 1
+            and stored[0].shape == raw.shape and np.allclose(stored[0], raw, equal_nan=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="SQLAlchemy URL (default: DB_* from .env)")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--hot-days", type=int, default=2, help="newest days left in PostgreSQL")
+    parser.add_argument("--train-users", type=int, default=5, help="users whose features are built")
+    parser.add_argument("--history-rows", type=int, default=50_000, help="older events in the DEFAULT partition")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    args = parser.parse_args()
+
+    # Must be set before core.archive is imported
+    archive_root = tempfile.mkdtemp(prefix="bench-archive-")
+    os.environ["ARCHIVE_DIR"] = archive_root
+    from core import archive
+
+    engine = create_engine(args.url or default_url(), connect_args={"options": f"-csearch_path={SCHEMA}"})
+    user_ids = [f"user-{u}" for u in range(args.train_users)]
+    results = {"rows": args.rows, "users": args.users, "days": args.days, "hot_days": args.hot_days}
+
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+            create_after(conn, args.days)
+            seed(conn, args.rows, args.users, args.days)
+            seed_history(conn, args.history_rows, args.users, args.days)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM ANALYZE behavioral_events"))
+            results["table_bytes_before"] = table_bytes(conn)
+
+        before, results["postgres_seconds"] = load_all(engine, user_ids)
+
+        start = time.perf_counter()
+        exported = archive.archive_aged_partitions(engine, older_than_days=args.hot_days)
+        results["archive_seconds"] = time.perf_counter() - start
+        results["partitions_archived"] = len(exported)
+        results["archive_bytes"] = archive_bytes(archive_root)
+        with engine.connect() as conn:
+            results["table_bytes_after"] = table_bytes(conn)
+
+        after, results["archive_plus_postgres_seconds"] = load_all(engine, user_ids)
+
+        results["identical"] = all(
+            before[u].shape == after[u].shape and np.allclose(before[u], after[u], equal_nan=True) for u in user_ids
+        )
+
+        results["feature_store_rebuilt"] = first_seen_after_archive(engine, user_ids[0])
+
+        print(f"archived {len(exported)} partitions in {results['archive_seconds']:.1f} s: "
+              f"{results['table_bytes_before'] / 1e6:.0f} MB in PostgreSQL -> "
+              f"{results['archive_bytes'] / 1e6:.0f} MB Parquet + {results['table_bytes_after'] / 1e6:.0f} MB left")
+        print(f"features for {len(user_ids)} users: PostgreSQL only {results['postgres_seconds']:.2f} s, "
+              f"archive + PostgreSQL {results['archive_plus_postgres_seconds']:.2f} s")
+        print(f"features identical: {results['identical']}")
+        print(f"feature store rebuilt a user first seen after archiving: {results['feature_store_rebuilt']}")
+
+        if args.json_path:
+            with open(args.json_path, "w") as f:
+                json.dump(results, f, indent=2)
+        if not (results["identical"] and results["feature_store_rebuilt"]):
+            sys.exit(1)
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        shutil.rmtree(archive_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Benchmark: per-request vs. batched scoring in the risk-engine.
+
+Trains small models for a set of users, then scores the same windows of
+events (20 events each, a random user per window) several ways through
+the real app, in-process (httpx over ASGI, so JSON and Pydantic parsing
+are included but no network):
+
+- sequential   one POST /model/predict per window, one at a time
+- concurrent   the same, --concurrency requests in flight
+- coalesced    the same, with the micro-batching coalescer on
+               (PREDICT_COALESCE_MS, --coalesce-ms)
+- bulk         POST /model/predict-batch, --batch-size windows per request
+
+and, without HTTP, score_events() per window vs. score_batch() over all
+of them, to show what the vectorized features and one decision_function
+call per model save on their own. Checks first that bulk results match
+per-request ones.
+
+Usage:
+    python benchmarks/bench_batch_scoring.py --users 100 --windows 2000
+    python benchmarks/bench_batch_scoring.py --batch-size 500 --coalesce-ms 5 --json out.json
+
+Exits 1 on a mismatch, or if bulk isn't --min-speedup times the sequential throughput.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# --- Path Setup ---
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'services', 'risk-engine'))
+
+# The app's model store opens MODEL_DIR at import
+os.environ["MODEL_DIR"] = tempfile.mkdtemp(prefix="bench_batch_scoring_")
+
+import numpy as np
+import pandas as pd
+import httpx
+from sklearn.ensemble import IsolationForest
+
+from core.keystroke_features import event_features, ALL_FEATURE_COLUMNS
+from bench_keystroke_features import synthetic_events
+
+import main as risk_engine
+from coalescer import Coalescer
+
+
+def synthetic_window(n: int, seed: int) -> list[dict]:
+    """One window of events as the frontend sends them, with at least 2 mouse movements."""
+    timestamps, event_types, keys = synthetic_events(n, seed=seed)
+    event_types[:2] = "mousemove"
+    rng = np.random.default_rng(seed)
+    x = np.clip(960 + np.cumsum(rng.normal(0, 6, n)), 0, 1919).round()
+    y = np.clip(540 + np.cumsum(rng.normal(0, 6, n)), 0, 1079).round()
+    window = []
+    for ts, event_type, key, px, py in zip(timestamps.tolist(), event_types, keys, x.tolist(), y.tolist()):
+        event = {"type": event_type, "timestamp": int(ts)}
+        if event_type == "keydown":
+            event["key"] = key
+        else:
+            event["x"], event["y"] = int(px), int(py)
+        window.append(event)
+    return window
+
+
+def train_users(users: int) -> None:
+    for u in range(users):
+        timestamps, event_types, keys = synthetic_events(5000, seed=10_000 + u)
+        rng = np.random.default_rng(u)
+        x = np.clip(960 + np.cumsum(rng.normal(0, 6, 5000)), 0, 1919)
+        y = np.clip(540 + np.cumsum(rng.normal(0, 6, 5000)), 0, 1079)
+        features = pd.DataFrame(event_features(timestamps, event_types, x, y, keys), columns=ALL_FEATURE_COLUMNS)
+        model = IsolationForest(n_estimators=50, max_samples=128, random_state=u).fit(features)
+        risk_engine.model_store.save(f"user-{u}", model)
+
+
+async def run_requests(client, windows, concurrency: int) -> list[dict]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(user_id, events):
+        async with semaphore:
+            response = await client.post(f"/model/predict/{user_id}", json={"events": events})
+            return response.json()
+
+    return await asyncio.gather(*(one(user_id, events) for user_id, events in windows))
+
+
+async def run_bulk(client, windows, batch_size: int) -> list[dict]:
+    results = []
+    for i in range(0, len(windows), batch_size):
+        body = {"requests": [{"user_id": user_id, "events": events} for user_id, events in windows[i:i + batch_size]]}
+        response = await client.post("/model/predict-batch", json=body)
+        results.extend(response.json()["results"])
+    return results
+
+
+async def timed(coro) -> tuple[list, float]:
+    start = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - start
+
+
+def same_results(a: list[dict], b: list[dict]) -> bool:
+    return len(a) == len(b) and all(
+        x["user_id"] == y["user_id"] and x["is_anomalous"] == y["is_anomalous"]
+        and x["windows_scored"] == y["windows_scored"] and abs(x["score"] - y["score"]) < 1e-9
+        for x, y in zip(a, b)
+    )
+
+
+async def bench(args) -> dict:
+    rng = np.random.default_rng(0)
+    windows = [(f"user-{rng.integers(args.users)}", synthetic_window(args.events, seed=i)) for i in range(args.windows)]
+    transport = httpx.ASGITransport(app=risk_engine.app)
+    results = {"users": args.users, "windows": args.windows, "events_per_window": args.events, "modes": {}}
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://risk-engine") as client:
+        # Warm up the model cache (and check every user has a model)
+        warm = await run_requests(client, [(f"user-{u}", windows[0][1]) for u in range(args.users)], 8)
+        if any("score" not in result for result in warm):
+            raise SystemExit(f"Warm-up failed: {warm[0]}")
+
+        risk_engine.predict_coalescer = None
+        sequential, seconds = await timed(run_requests(client, windows, 1))
+        results["modes"]["sequential"] = seconds
+        _, results["modes"]["concurrent"] = await timed(run_requests(client, windows, args.concurrency))
+
+        risk_engine.predict_coalescer = Coalescer(risk_engine.score_batch, args.coalesce_ms, args.batch_size)
+        coalesced, results["modes"]["coalesced"] = await timed(run_requests(client, windows, args.concurrency))
+        results["coalescer"] = risk_engine.predict_coalescer.stats()
+        risk_engine.predict_coalescer = None
+
+        bulk, results["modes"]["bulk"] = await timed(run_bulk(client, windows, args.batch_size))
+
+    if not same_results(sequential, bulk) or not same_results(sequential, coalesced):
+        print("MISMATCH between per-request and batched results")
+        sys.exit(1)
+    print(f"parity: {len(bulk)} bulk and coalesced results match per-request scoring")
+    return results
+
+
+def bench_functions(args) -> dict:
+    """score_events() per window vs. score_batch() over all of them, on parsed requests."""
+    rng = np.random.default_rng(0)
+    items = []
+    for i in range(args.windows):
+        user_id = f"user-{rng.integers(args.users)}"
+        request = risk_engine.PredictRequest(events=synthetic_window(args.events, seed=i))
+        items.append((user_id, risk_engine.model_cache.get(user_id), request.events))
+
+    start = time.perf_counter()
+    for _, model, events in items:
+        risk_engine.score_events(model, events)
+    per_window = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, len(items), args.batch_size):
+        risk_engine.score_batch(items[i:i + args.batch_size])
+    batched = time.perf_counter() - start
+    return {"score_events": per_window, "score_batch": batched}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--windows", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=20, help="events per window")
+    parser.add_argument("--batch-size", type=int, default=250, help="windows per bulk request / coalesced batch")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--coalesce-ms", type=int, default=2)
+    parser.add_argument("--min-speedup", type=float, default=2.0, help="bulk vs. sequential windows/s")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    args = parser.parse_args()
+    logging.getLogger("risk-engine").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    train_users(args.users)
+    results = asyncio.run(bench(args))
+    results["functions"] = bench_functions(args)
+
+    print(f"{args.windows} windows of {args.events} events, {args.users} users:")
+    sequential = results["modes"]["sequential"]
+    for mode, seconds in results["modes"].items():
+        print(f"  {mode:<11} {seconds:7.2f} s  {args.windows / seconds:9,.0f} windows/s  "
+              f"x{sequential / seconds:.1f}")
+    coalescer = results["coalescer"]
+    print(f"  (coalesced into {coalescer['batches']} batches, {coalescer['avg_batch']:.1f} windows on average)")
+    functions = results["functions"]
+    print(f"  without HTTP: score_events {args.windows / functions['score_events']:,.0f} windows/s, "
+          f"score_batch {args.windows / functions['score_batch']:,.0f} windows/s")
+
+    speedup = sequential / results["modes"]["bulk"]
+    results["bulk_speedup"] = speedup
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    if speedup < args.min_speedup:
+        print(f"bulk is only x{speedup:.1f} the sequential throughput (--min-speedup {args.min_speedup})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
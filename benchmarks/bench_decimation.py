@@ -0,0 +1,267 @@
+"""
+Benchmark: mousemove decimation (core/decimation.py) vs. the raw event
+stream, in the ingestor and at predict time in the risk engine.
+
+Synthetic users move the cursor between targets along smooth, slightly
+jittery paths (about 60 Hz), each at their own pace, and type and click
+in between. Their events go through one MouseDecimator per user in
+frames of --frame-size, like a connection's, in every mode. The first
+80% of each user's events are the history a model is trained on; the
+rest are cut into /model/predict windows of --predict-events, which go
+through the risk engine's decimate_window and window_values. Reported
+per mode:
+
+- dropped    share of mousemoves (and of all events) removed
+- path       total cursor path, the sum of create_features' total_distance
+- AUC        of telling each user from the others, with models trained on
+             the decimated history. Scored on the decimated stream (what
+             the stream scorer sees), on predict windows decimated by the
+             risk engine, and on raw predict windows ("mixed", what
+             /model/predict scored before it decimated them)
+- features   change of each mouse feature's median over the predict
+             windows against the windows the models were trained on.
+             Windows are 10 mousemoves, so after decimation they cover
+             more of the path and their time deltas are the gaps between
+             kept points; raw windows would be far off (in the --json
+             output as "mixed_shift").
+
+Checks that keydowns and clicks come out exactly as they went in, and
+that every key and click is still counted by create_features.
+
+Usage:
+    python benchmarks/bench_decimation.py --users 8 --events-per-user 30000
+    python benchmarks/bench_decimation.py --tolerance-px 1 2 --json out.json
+
+Exits 1 if keydowns or clicks changed, if a mode changes the path length
+by more than --max-path-error, if a predict-time feature median is more
+than --max-feature-shift off the trained one, or if the stream or
+predict AUC is more than --max-auc-drop below raw.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import math
+
+# --- Path Setup ---
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'services', 'risk-engine'))
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+
+import main as risk_engine
+from core.decimation import MouseDecimator, decimate
+from core.features import FEATURE_COLUMNS
+from core.keystroke_features import ALL_FEATURE_COLUMNS
+from training_policy import new_model
+
+SCREEN_WIDTH, SCREEN_HEIGHT = 1920, 1080
+KEYDOWN_SHARE, CLICK_SHARE = 0.10, 0.03
+TRAIN_SHARE = 0.8
+
+
+def user_events(seed: int, n: int) -> list[dict]:
+    """
+    One user's events: minimum-jerk moves between random targets with
+    their own pace and hand jitter, pauses between moves, and keydowns
+    and clicks mixed in.
+    """
+    rng = random.Random(seed)
+    pace = rng.uniform(0.5, 2.0)        # px per ms at full speed
+    jitter = rng.uniform(0.3, 1.2)      # px
+    pause_ms = rng.uniform(100, 600)
+    x, y = rng.randrange(SCREEN_WIDTH), rng.randrange(SCREEN_HEIGHT)
+    ts = 1_700_000_000_000
+    events = []
+    while len(events) < n:
+        tx, ty = rng.randrange(SCREEN_WIDTH), rng.randrange(SCREEN_HEIGHT)
+        duration = max(150.0, math.dist((x, y), (tx, ty)) / (pace * rng.uniform(0.7, 1.3)))
+        steps = max(3, int(duration / 16))
+        x0, y0 = x, y
+        for step in range(1, steps + 1):
+            ts += rng.randint(12, 20)
+            roll = rng.random()
+            if roll < KEYDOWN_SHARE:
+                events.append({"type": "keydown", "timestamp": ts, "key": rng.choice("etaoin \b"), "target": "INPUT"})
+                continue
+            if roll < KEYDOWN_SHARE + CLICK_SHARE:
+                events.append({"type": "click", "timestamp": ts, "x": round(x), "y": round(y), "target": "BUTTON"})
+                continue
+            u = step / steps
+            progress = 10 * u ** 3 - 15 * u ** 4 + 6 * u ** 5
+            x = x0 + (tx - x0) * progress + rng.gauss(0, jitter)
+            y = y0 + (ty - y0) * progress + rng.gauss(0, jitter)
+            events.append({"type": "mousemove", "timestamp": ts, "x": round(x), "y": round(y)})
+        ts += round(rng.expovariate(1 / pause_ms))
+    for event in events:
+        if event.get("key") == "\b":
+            event["key"] = "Backspace"
+    return events[:n]
+
+
+def features(events: list[dict]) -> pd.DataFrame:
+    df = pd.DataFrame({
+        "timestamp": [e["timestamp"] for e in events],
+        "event_type": [e["type"] for e in events],
+        "x": [e.get("x") for e in events],
+        "y": [e.get("y") for e in events],
+        "key": [e.get("key") for e in events],
+    })
+    return risk_engine.create_features(df)
+
+
+def predict_rows(events: list[dict], window_events: int, **settings) -> pd.DataFrame:
+    """
+    Feature rows of 'events' sent to /model/predict in windows of
+    'window_events', as the risk engine builds them (decimated with
+    'settings'). Each window's last row covers the mousemoves left over
+    after its full sessions, so it's dropped.
+    """
+    rows = []
+    for i in range(0, len(events) - window_events + 1, window_events):
+        window = [risk_engine.Event(**event) for event in events[i:i + window_events]]
+        rows.append(risk_engine.window_values(risk_engine.decimate_window(window, **settings))[:-1])
+    return pd.DataFrame(np.vstack(rows), columns=ALL_FEATURE_COLUMNS)
+
+
+def mean_auc(train_sets: list[pd.DataFrame], test_sets: list[pd.DataFrame]) -> float:
+    aucs = []
+    for i, train in enumerate(train_sets):
+        model = new_model(n_jobs=1).fit(train)
+        others = pd.concat([test for j, test in enumerate(test_sets) if j != i])
+        scores = -model.score_samples(pd.concat([test_sets[i], others]))  # Higher = more anomalous
+        labels = np.r_[np.zeros(len(test_sets[i])), np.ones(len(others))]
+        aucs.append(roc_auc_score(labels, scores))
+    return float(np.mean(aucs))
+
+
+def median_shift(rows: list[pd.DataFrame], baseline: list[pd.DataFrame]) -> dict:
+    """Relative change of each mouse feature's median, 'rows' against 'baseline'."""
+    medians = pd.concat(rows)[FEATURE_COLUMNS].median()
+    baseline_medians = pd.concat(baseline)[FEATURE_COLUMNS].median()
+    return {c: float(medians[c] / baseline_medians[c] - 1) if baseline_medians[c] else 0.0 for c in FEATURE_COLUMNS}
+
+
+def not_mousemoves(events: list[dict]) -> list[dict]:
+    return [event for event in events if event["type"] != "mousemove"]
+
+
+def history(events: list[dict], cut_ts: int) -> tuple[list[dict], list[dict]]:
+    """The events before 'cut_ts' (to train on) and from it on."""
+    cut = next((i for i, event in enumerate(events) if event["timestamp"] >= cut_ts), len(events))
+    return events[:cut], events[cut:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--events-per-user", type=int, default=30_000)
+    parser.add_argument("--frame-size", type=int, default=20, help="events per frame (the frontend sends up to 20)")
+    parser.add_argument("--predict-events", type=int, default=200,
+                        help="events per /model/predict window (long enough for a few full sessions each)")
+    parser.add_argument("--interval-ms", type=float, nargs="+", default=[33])
+    parser.add_argument("--min-distance-px", type=float, nargs="+", default=[4])
+    parser.add_argument("--tolerance-px", type=float, nargs="+", default=[1, 2])
+    parser.add_argument("--max-path-error", type=float, default=0.02, help="relative change of the total path")
+    parser.add_argument("--max-feature-shift", type=float, default=0.1,
+                        help="relative change of a feature's median, predict windows vs. trained ones")
+    parser.add_argument("--max-auc-drop", type=float, default=0.02)
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    args = parser.parse_args()
+
+    streams = [user_events(u, args.events_per_user) for u in range(args.users)]
+    cut_ts = [events[int(len(events) * TRAIN_SHARE)]["timestamp"] for events in streams]
+    raw_train, raw_test = zip(*(history(events, ts) for events, ts in zip(streams, cut_ts)))
+    raw_train_rows = [features(events) for events in raw_train]
+    raw_test_rows = [features(events) for events in raw_test]
+    raw_predict = [predict_rows(events, args.predict_events, mode="off") for events in raw_test]
+    raw_auc = mean_auc(raw_train_rows, raw_test_rows)
+    raw_predict_auc = mean_auc(raw_train_rows, raw_predict)
+    raw_path = sum(rows["total_distance"].sum() for rows in raw_train_rows + raw_test_rows)
+    raw_shift = median_shift(raw_predict, raw_train_rows)
+    n_moves = sum(len(events) - len(not_mousemoves(events)) for events in streams)
+    n_events = sum(len(events) for events in streams)
+    print(f"{args.users} users, {n_events:,} events ({n_moves:,} mousemoves); "
+          f"raw AUC {raw_auc:.4f}, predict {raw_predict_auc:.4f}")
+    print("  raw predict windows vs. trained: " + " ".join(f"{c}={v:+.1%}" for c, v in raw_shift.items()))
+
+    modes = (
+        [("throttle", {"interval_ms": v}) for v in args.interval_ms]
+        + [("distance", {"min_distance_px": v}) for v in args.min_distance_px]
+        + [("rdp", {"tolerance_px": v}) for v in args.tolerance_px]
+    )
+    results = {"raw_auc": raw_auc, "raw_predict_auc": raw_predict_auc, "raw_shift": raw_shift, "modes": []}
+    failures = []
+    for mode, settings in modes:
+        start = time.perf_counter()
+        decimated = [decimate(events, MouseDecimator(mode, **settings), args.frame_size) for events in streams]
+        seconds = time.perf_counter() - start
+        label = f"{mode} {next(iter(settings.values())):g}"
+
+        if any(not_mousemoves(d) != not_mousemoves(e) for d, e in zip(decimated, streams)):
+            failures.append(f"{label}: keydowns or clicks changed")
+
+        train, test = zip(*(history(events, ts) for events, ts in zip(decimated, cut_ts)))
+        train_rows = [features(events) for events in train]
+        test_rows = [features(events) for events in test]
+        for rows, raw_rows in zip(train_rows + test_rows, raw_train_rows + raw_test_rows):
+            if (rows["key_count"].sum() != raw_rows["key_count"].sum()
+                    or rows["click_count"].sum() != raw_rows["click_count"].sum()):
+                failures.append(f"{label}: create_features lost keys or clicks")
+                break
+        predict = [predict_rows(events, args.predict_events, mode=mode, **settings) for events in raw_test]
+
+        auc = mean_auc(train_rows, test_rows)
+        predict_auc = mean_auc(train_rows, predict)
+        mixed_auc = mean_auc(train_rows, raw_predict)
+        shift = median_shift(predict, train_rows)
+        path_error = sum(rows["total_distance"].sum() for rows in train_rows + test_rows) / raw_path - 1
+        kept = sum(len(events) for events in decimated)
+        result = {
+            "mode": mode, **settings,
+            "mousemoves_dropped": (n_events - kept) / n_moves,
+            "events_dropped": (n_events - kept) / n_events,
+            "ns_per_event": seconds / n_events * 1e9,
+            "path_error": path_error,
+            "auc": auc,
+            "predict_auc": predict_auc,
+            "mixed_auc": mixed_auc,
+            "shift": shift,
+            "mixed_shift": median_shift(raw_predict, train_rows),
+            "median_change": median_shift(train_rows, raw_train_rows),
+        }
+        results["modes"].append(result)
+        if abs(path_error) > args.max_path_error:
+            failures.append(f"{label}: path length off by {path_error:+.2%} (--max-path-error {args.max_path_error})")
+        for c, v in shift.items():
+            if abs(v) > args.max_feature_shift:
+                failures.append(f"{label}: predict-time {c} median {v:+.1%} off the trained one "
+                                f"(--max-feature-shift {args.max_feature_shift})")
+        for name, value in (("AUC", auc), ("predict AUC", predict_auc)):
+            if raw_auc - value > args.max_auc_drop:
+                failures.append(f"{label}: {name} {value:.4f} vs raw {raw_auc:.4f} (--max-auc-drop {args.max_auc_drop})")
+
+    print(f"  {'mode':<14} {'moves':>6} {'events':>6} {'ns/ev':>6} {'path':>7} {'AUC':>7} {'predict':>7} {'mixed':>7}"
+          f"   predict windows vs. trained")
+    for r in results["modes"]:
+        label = f"{r['mode']} {r.get('interval_ms', r.get('min_distance_px', r.get('tolerance_px'))):g}"
+        changes = " ".join(f"{c}={v:+.1%}" for c, v in r["shift"].items())
+        print(f"  {label:<14} {r['mousemoves_dropped']:6.1%} {r['events_dropped']:6.1%} {r['ns_per_event']:6.0f} "
+              f"{r['path_error']:+7.2%} {r['auc']:7.4f} {r['predict_auc']:7.4f} {r['mixed_auc']:7.4f}   {changes}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
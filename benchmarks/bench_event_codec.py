@@ -0,0 +1,152 @@
+"""
+Benchmark: JSON vs. the compact (msgpack) encoding of events on the
+behavioral stream (core/event_codec.py).
+
+Encodes synthetic frames of events (event_generator.py, stamped with a
+UUID user_id like the ingestor does) both ways and reports, per event:
+
+- bytes    payload size on the Redis hop (what XADD stores and XREADGROUP returns)
+- encode   ingestor CPU: json.dumps per event vs. one compact entry per frame
+- decode   consumer CPU: json.loads per entry vs. decoding the compact entry
+- entries  stream entries (XADDs) per event
+
+Checks first that every decoded event matches the original.
+
+Usage:
+    python benchmarks/bench_event_codec.py --frames 20000 --frame-size 20
+    python benchmarks/bench_event_codec.py --frame-size 100 --json out.json
+
+Exits 1 on a mismatch, if the compact format isn't --min-size-ratio
+times smaller, or if its encode + decode CPU isn't --min-cpu-speedup
+times lower.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+# --- Path Setup ---
+benchmarks_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.realpath(os.path.join(benchmarks_dir, '..'))
+sys.path.append(project_root)
+sys.path.append(benchmarks_dir)
+
+from core import event_codec
+from event_generator import EventGenerator
+
+
+def make_frames(n_frames: int, frame_size: int, users: int) -> list[tuple[str, list[dict]]]:
+    user_ids = [str(uuid.UUID(int=u + 1)) for u in range(users)]
+    generators = [EventGenerator(seed=u, start_ms=1_700_000_000_000) for u in range(users)]
+    frames = []
+    for i in range(n_frames):
+        u = i % users
+        events = generators[u].frame(frame_size)
+        for event in events:
+            event["user_id"] = user_ids[u]
+        frames.append((user_ids[u], events))
+    return frames
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def check_parity(frames, compact) -> bool:
+    for (_, events), payloads in zip(frames, compact):
+        decoded = [event for payload in payloads for event in event_codec.decode(payload)]
+        if len(decoded) != len(events):
+            return False
+        for original, event in zip(events, decoded):
+            # Compact events carry every column field, None where it was absent
+            if any(event.get(k) != original.get(k) for k in original.keys() | event.keys()):
+                return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=20_000)
+    parser.add_argument("--frame-size", type=int, default=20, help="events per frame (the frontend sends up to 20)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs (the best is reported)")
+    parser.add_argument("--min-size-ratio", type=float, default=2.0)
+    parser.add_argument("--min-cpu-speedup", type=float, default=1.0)
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames, args.frame_size, args.users)
+    n_events = args.frames * args.frame_size
+
+    def encode_json():
+        return [[json.dumps(event) for event in events] for _, events in frames]
+
+    def encode_compact():
+        return [event_codec.encode_entries(user_id, events, encoding="msgpack") for user_id, events in frames]
+
+    as_json, compact = encode_json(), encode_compact()
+    if not check_parity(frames, compact):
+        print("MISMATCH: decoded compact events differ from the originals")
+        sys.exit(1)
+    print(f"parity: {n_events:,} events decode to the originals")
+
+    def decode_json():
+        for payloads in as_json:
+            for payload in payloads:
+                json.loads(payload)
+
+    def decode_compact():
+        for payloads in compact:
+            for payload in payloads:
+                event_codec.decode(payload)
+
+    results = {"events": n_events, "frame_size": args.frame_size, "formats": {}}
+    for name, encode, decode, payloads in (
+        ("json", encode_json, decode_json, as_json),
+        ("msgpack", encode_compact, decode_compact, compact),
+    ):
+        entries = sum(len(p) for p in payloads)
+        size = sum(len(payload if isinstance(payload, bytes) else payload.encode()) for p in payloads for payload in p)
+        results["formats"][name] = {
+            "bytes_per_event": size / n_events,
+            "encode_ns_per_event": best_of(encode, args.repeat) / n_events * 1e9,
+            "decode_ns_per_event": best_of(decode, args.repeat) / n_events * 1e9,
+            "entries_per_event": entries / n_events,
+        }
+
+    print(f"{n_events:,} events in frames of {args.frame_size}:")
+    print(f"  {'':<8} {'bytes':>7} {'encode':>10} {'decode':>10} {'entries':>8}   (per event)")
+    for name, r in results["formats"].items():
+        print(f"  {name:<8} {r['bytes_per_event']:7.1f} {r['encode_ns_per_event']:8.0f} ns "
+              f"{r['decode_ns_per_event']:8.0f} ns {r['entries_per_event']:8.3f}")
+
+    as_json, compact = results["formats"]["json"], results["formats"]["msgpack"]
+    size_ratio = as_json["bytes_per_event"] / compact["bytes_per_event"]
+    cpu_speedup = ((as_json["encode_ns_per_event"] + as_json["decode_ns_per_event"])
+                   / (compact["encode_ns_per_event"] + compact["decode_ns_per_event"]))
+    results.update(size_ratio=size_ratio, cpu_speedup=cpu_speedup)
+    print(f"  compact: x{size_ratio:.1f} smaller, x{cpu_speedup:.1f} less encode + decode CPU")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    failed = False
+    if size_ratio < args.min_size_ratio:
+        print(f"size ratio below --min-size-ratio {args.min_size_ratio}")
+        failed = True
+    if cpu_speedup < args.min_cpu_speedup:
+        print(f"CPU speedup below --min-cpu-speedup {args.min_cpu_speedup}")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Benchmark: training feature load from the feature store vs. raw events.
+
+Seeds a scratch schema on a local PostgreSQL the way the event logger
+would: synthetic mouse movements for several users are inserted in
+arrival order (jittered, with a few events arriving far too late) in
+batches, and every committed batch is fed to FeatureStoreUpdater.
+
+Then every user gets a few more events at and after their last applied
+timestamp that are committed but never applied, as if the logger died
+holding them, and a fresh updater catches up on them.
+
+Then it checks that the stored windows give the same feature rows as
+recomputing them from raw events (late users are rebuilt first, as the
+logger would), and times both ways of loading a user's features.
+
+Usage (uses the DB_* settings from .env unless --url is given):
+    python benchmarks/bench_feature_store.py --users 20 --events-per-user 100000
+    python benchmarks/bench_feature_store.py --url postgresql://postgres@localhost/bench --json out.json
+
+Drops the scratch schema afterwards unless --keep is given.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# --- Path Setup ---
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+import numpy as np
+from sqlalchemy import create_engine, insert, text
+
+from core.database import Base
+from core.features import WindowFeatureAccumulator
+from core.feature_store import FeatureStoreUpdater, iter_mousemove_chunks, load_features
+from core.models.BehavioralEvent import BehavioralEvent
+
+SCHEMA = "bench_feature_store"
+
+
+def synthetic_arrivals(users: int, per_user: int, jitter_ms: int, late_fraction: float, late_ms: int, seed: int = 42):
+    """
+    Interleaved mouse movements of 'users' users, ordered by when they
+    reach the logger: every event is delayed by up to 'jitter_ms', and
+    'late_fraction' of them by 'late_ms' on top.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for u in range(users):
+        timestamps = 1_700_000_000_000 + np.cumsum(rng.integers(5, 40, per_user))
+        x = np.clip(960 + np.cumsum(rng.normal(0, 6, per_user)), 0, 1919).round()
+        y = np.clip(540 + np.cumsum(rng.normal(0, 6, per_user)), 0, 1079).round()
+        arrival = timestamps + rng.uniform(0, jitter_ms, per_user)
+        arrival[rng.random(per_user) < late_fraction] += late_ms
+        rows.append(np.column_stack([np.full(per_user, u), timestamps, x, y, arrival]))
+
+    events = np.vstack(rows)
+    return events[np.argsort(events[:, 4], kind='stable')]
+
+
+# Per user: applied at a new last timestamp, then (unapplied) at that
+# same timestamp and after it
+CRASH_APPLIED, CRASH_SAME_TS, CRASH_AFTER = 2, 1, 2
+
+
+def crash_and_catch_up(engine, user_ids: list[str]) -> int:
+    """
+    Adds CRASH_* events per user as described in the module docstring and
+    catches up on them with a fresh updater. Returns how many it found.
+    Events at the same timestamp are at the same point, so the raw
+    events' order among them doesn't change the features.
+    """
+    with engine.connect() as conn:
+        state = {user_id: (last_ts, last_x, last_y) for user_id, last_ts, last_x, last_y in conn.execute(
+            text("SELECT user_id, last_ts, last_x, last_y FROM user_feature_state"))}
+
+    def rows(kind: str) -> list[dict]:
+        out = []
+        for user_id in user_ids:
+            last_ts, x, y = state[user_id]
+            steps = {"applied": [1] * CRASH_APPLIED, "unapplied": [1] * CRASH_SAME_TS + list(range(2, 2 + CRASH_AFTER))}
+            out.extend(
+                {"user_id": user_id, "event_type": "mousemove", "x": int(x) + 5 * step, "y": int(y), "key": None,
+                 "timestamp": int(last_ts) + 10 * step, "stream_id": None}
+                for step in steps[kind]
+            )
+        return out
+
+    # Applied: the state's last_ts moves to a timestamp shared by CRASH_APPLIED events
+    applied = rows("applied")
+    with engine.begin() as conn:
+        conn.execute(insert(BehavioralEvent.__table__), applied)
+    updater = FeatureStoreUpdater(engine, rebuild_batch=0)
+    updater.add(applied)
+    updater.apply_all()
+
+    # Committed, then the logger "dies" before applying them
+    with engine.begin() as conn:
+        conn.execute(insert(BehavioralEvent.__table__), rows("unapplied"))
+
+    updater = FeatureStoreUpdater(engine, rebuild_batch=0)
+    found = updater.catch_up()
+    updater.apply_all()
+    return found
+
+
+def raw_features(engine, user_id: str) -> tuple[np.ndarray, int]:
+    """The risk-engine's fallback path (services/risk-engine/data_loader.py)."""
+    accumulator = WindowFeatureAccumulator()
+    parts = [accumulator.add(*chunk) for chunk in iter_mousemove_chunks(engine, user_id)]
+    parts.append(accumulator.finish())
+    return np.vstack(parts), accumulator.n_events
+
+
+def default_url() -> str:
+    from core.database import SQLALCHEMY_DATABASE_URL
+    return SQLALCHEMY_DATABASE_URL
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="SQLAlchemy URL (default: DB_* from .env)")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--events-per-user", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=500, help="logger batch size")
+    parser.add_argument("--jitter-ms", type=int, default=500, help="max reordering delay (within the lateness allowance)")
+    parser.add_argument("--late-fraction", type=float, default=0.00002, help="share of events later than the allowance")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema")
+    args = parser.parse_args()
+
+    url = args.url or default_url()
+    admin = create_engine(url)
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    engine = create_engine(url, connect_args={"options": f"-csearch_path={SCHEMA}"})
+
+    try:
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE behavioral_events_default PARTITION OF behavioral_events DEFAULT"))
+
+        events = synthetic_arrivals(args.users, args.events_per_user, args.jitter_ms, args.late_fraction, late_ms=60_000)
+        # Rebuilds are done (and timed) separately below
+        updater = FeatureStoreUpdater(engine, rebuild_batch=0)
+
+        # --- Ingest: raw insert per batch, then fold into the store ---
+        insert_s = apply_s = 0.0
+        for start in range(0, len(events), args.batch_size):
+            batch = events[start:start + args.batch_size]
+            rows = [
+                {"user_id": f"user-{int(u)}", "event_type": "mousemove", "x": int(x), "y": int(y),
+                 "key": None, "timestamp": int(ts), "stream_id": None}
+                for u, ts, x, y, _ in batch
+            ]
+            t0 = time.perf_counter()
+            with engine.begin() as conn:
+                conn.execute(insert(BehavioralEvent.__table__), rows)
+            t1 = time.perf_counter()
+            updater.add(rows)
+            updater.apply_due()
+            apply_s += time.perf_counter() - t1
+            insert_s += t1 - t0
+
+        t0 = time.perf_counter()
+        updater.apply_all()
+        with engine.connect() as conn:
+            flagged = conn.execute(text("SELECT count(*) FROM user_feature_state WHERE needs_rebuild")).scalar()
+        updater.rebuild_flagged(limit=flagged)
+        rebuild_s = time.perf_counter() - t0
+        user_ids = [f"user-{u}" for u in range(args.users)]
+        caught_up = crash_and_catch_up(engine, user_ids)
+        expected_catch_up = args.users * (CRASH_SAME_TS + CRASH_AFTER)
+        assert caught_up == expected_catch_up, f"caught up on {caught_up} events, expected {expected_catch_up}"
+        per_user = args.events_per_user + CRASH_APPLIED + CRASH_SAME_TS + CRASH_AFTER
+        with engine.connect() as conn:
+            conn.execute(text("ANALYZE"))
+
+        # --- Parity + load timings ---
+        max_diff = 0.0
+        store_s = raw_s = 0.0
+        for u in range(args.users):
+            user_id = f"user-{u}"
+            raw, raw_n = raw_features(engine, user_id)
+            stored, stored_n, _ = load_features(engine, user_id)
+            assert stored_n == raw_n == per_user, (stored_n, raw_n)
+            assert stored.shape == raw.shape, (stored.shape, raw.shape)
+            if not np.allclose(stored, raw, rtol=1e-6, atol=1e-6):
+                raise AssertionError(f"feature mismatch for {user_id}")
+            max_diff = max(max_diff, float(np.max(np.abs(stored - raw))))
+
+            store_s += min(_timed(load_features, engine, user_id) for _ in range(args.repeat))
+            raw_s += min(_timed(raw_features, engine, user_id) for _ in range(args.repeat))
+
+        n_events = len(events)
+        results = {
+            "users": args.users,
+            "events": n_events,
+            "feature_rows_per_user": len(stored),
+            "late_users_rebuilt": int(flagged),
+            "caught_up_events": caught_up,
+            "max_abs_diff": max_diff,
+            "ingest": {
+                "raw_insert_seconds": insert_s,
+                "store_apply_seconds": apply_s,
+                "store_apply_events_per_s": n_events / apply_s if apply_s else None,
+                "rebuild_seconds": rebuild_s,
+            },
+            "load_per_user_ms": {
+                "feature_store": store_s / args.users * 1000,
+                "raw_events": raw_s / args.users * 1000,
+            },
+            "stats": updater.stats(),
+        }
+        results["load_speedup"] = raw_s / store_s if store_s else None
+
+        print(f"catch-up: re-buffered {caught_up} unapplied events, none twice")
+        print(f"parity: OK ({args.users} users, {len(stored)} windows each, max |diff| {max_diff:.2e})")
+        print(f"ingest: raw inserts {insert_s:.2f} s, feature store {apply_s:.2f} s "
+              f"({results['ingest']['store_apply_events_per_s']:,.0f} events/s), "
+              f"{flagged} late user(s) rebuilt in {rebuild_s:.2f} s")
+        print(f"load per user: feature store {results['load_per_user_ms']['feature_store']:.1f} ms, "
+              f"raw events {results['load_per_user_ms']['raw_events']:.1f} ms "
+              f"({results['load_speedup']:.1f}x)")
+
+        if args.json_path:
+            with open(args.json_path, "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        engine.dispose()
+        if not args.keep:
+            with admin.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+def _timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark: vectorized feature engineering vs. the original pandas version.
+
+Checks that core.features.window_features produces the same six features
+as the original pandas implementation of create_features (kept below as
+the reference), then times both on synthetic mousemove streams.
+
+Usage:
+    python benchmarks/bench_features.py                   # 10k, 1M, 10M events
+    python benchmarks/bench_features.py --sizes 10000 100000
+    python benchmarks/bench_features.py --reference-limit 1000000
+
+The pandas reference runs a Python-level lambda per row, so it takes
+minutes at 10M events; use --reference-limit to skip it above a size.
+"""
+import argparse
+import os
+import sys
+import time
+
+# --- Path Setup ---
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+import numpy as np
+import pandas as pd
+
+from core.features import window_features, FEATURE_COLUMNS
+
+
+def reference_create_features(df: pd.DataFrame) -> pd.DataFrame:
+    """The original pandas implementation from the risk-engine."""
+    df = df.sort_values(by='timestamp')
+    df['time_delta_s'] = df['timestamp'].diff() / 1000.0
+    df['x_delta'] = df['x'].diff().fillna(0)
+    df['y_delta'] = df['y'].diff().fillna(0)
+    df['distance'] = (df['x_delta']**2 + df['y_delta']**2)**0.5
+    df['speed_px_s'] = df.apply(
+        lambda row: row['distance'] / row['time_delta_s'] if row['time_delta_s'] > 0 else 0,
+        axis=1
+    )
+    n = 10
+    df['group'] = (df.index // n)
+    features = df.groupby('group').agg(
+        avg_speed=('speed_px_s', 'mean'),
+        std_speed=('speed_px_s', 'std'),
+        max_speed=('speed_px_s', 'max'),
+        avg_time_delta=('time_delta_s', 'mean'),
+        std_time_delta=('time_delta_s', 'std'),
+        total_distance=('distance', 'sum')
+    )
+    features = features.fillna(0)
+    features.replace([pd.NA, pd.NaT, float('inf'), -float('inf')], 0, inplace=True)
+    return features
+
+
+def synthetic_mousemoves(n: int, seed: int = 42, shuffle_fraction: float = 0.0) -> pd.DataFrame:
+    """
+    A random walk of mouse positions with jittery inter-event times,
+    shaped like the rows read from 'behavioral_events'.
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = 1_700_000_000_000 + np.cumsum(rng.integers(1, 40, size=n))
+    x = np.clip(500 + np.cumsum(rng.normal(0, 8, size=n)), 0, 1920).astype(np.int64)
+    y = np.clip(400 + np.cumsum(rng.normal(0, 8, size=n)), 0, 1080).astype(np.int64)
+    df = pd.DataFrame({'timestamp': timestamps, 'x': x, 'y': y})
+
+    if shuffle_fraction:
+        # Swap a few rows so the sort/scatter path is exercised too
+        k = int(n * shuffle_fraction) // 2 * 2
+        idx = rng.choice(n, size=k, replace=False)
+        df.iloc[idx] = df.iloc[idx[::-1]].to_numpy()
+    return df
+
+
+def vectorized(df: pd.DataFrame) -> np.ndarray:
+    return window_features(
+        df['timestamp'].to_numpy(),
+        df['x'].to_numpy(dtype=np.float64),
+        df['y'].to_numpy(dtype=np.float64)
+    )
+
+
+def check_parity(n: int = 20_000) -> None:
+    """Fails loudly if the vectorized output differs from pandas."""
+    for shuffle_fraction in (0.0, 0.05):
+        df = synthetic_mousemoves(n, seed=7, shuffle_fraction=shuffle_fraction)
+        # Sprinkle in missing coordinates, like a non-mouse row would have
+        df = df.astype({'x': 'float64', 'y': 'float64'})
+        df.loc[df.sample(frac=0.01, random_state=1).index, ['x', 'y']] = np.nan
+
+        expected = reference_create_features(df.copy())[FEATURE_COLUMNS].to_numpy()
+        actual = vectorized(df)
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9)
+    print(f"parity: OK ({n} events, sorted and partially shuffled input)")
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--reference-limit", type=int, default=None,
+                        help="skip the pandas reference above this many events")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    check_parity()
+
+    print(f"{'events':>12} {'pandas (s)':>12} {'numpy (s)':>12} {'speedup':>10} {'numpy ev/s':>14}")
+    for n in args.sizes:
+        df = synthetic_mousemoves(n)
+
+        numpy_s = best_of(lambda: vectorized(df), args.repeat)
+
+        if args.reference_limit is None or n <= args.reference_limit:
+            pandas_s = best_of(lambda: reference_create_features(df.copy()), 1)
+            speedup = f"{pandas_s / numpy_s:,.0f}x"
+            pandas_col = f"{pandas_s:.3f}"
+        else:
+            pandas_col, speedup = "skipped", "-"
+
+        print(f"{n:>12,} {pandas_col:>12} {numpy_s:>12.4f} {speedup:>10} {n / numpy_s:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark: vectorized keystroke-dynamics features (core/keystroke_features.py).
+
+Checks keystroke_features() against a plain-Python reference on a small
+stream, then times it on synthetic, time-ordered streams of one user's
+events of every type (~87% mousemoves, ~10% keydowns, ~3% clicks, like
+the frontend sends), including finding the mouse windows they align to.
+
+Usage:
+    python benchmarks/bench_keystroke_features.py                  # 100k, 1M, 10M events
+    python benchmarks/bench_keystroke_features.py --sizes 1000000 --min-rate 2000000
+
+Exits 1 if any size is slower than --min-rate events/s (default 1M/s, one core).
+"""
+import argparse
+import bisect
+import json
+import math
+import os
+import sys
+import time
+
+# --- Path Setup ---
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+import numpy as np
+
+from core.features import WINDOW_SIZE
+from core.keystroke_features import (
+    keystroke_features, window_starts, KEYSTROKE_COLUMNS, KEYSTROKE_BURST_GAP_MS, CORRECTION_KEYS
+)
+
+KEYS = np.array(list("etaoinshrdlu") + ["Backspace", " ", "Enter", "Shift"], dtype=object)
+
+
+def synthetic_events(n: int, seed: int = 42) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(timestamps, event_types, keys) of one user, sorted by time."""
+    rng = np.random.default_rng(seed)
+    roll = rng.random(n)
+    event_types = np.where(roll < 0.10, "keydown", np.where(roll < 0.13, "click", "mousemove")).astype(object)
+    # Mostly 8-25 ms apart, with an occasional long pause
+    gaps = rng.integers(8, 26, n) + (rng.random(n) < 0.01) * rng.integers(1000, 5000, n)
+    timestamps = (1_700_000_000_000 + np.cumsum(gaps)).astype(np.float64)
+    keys = np.where(event_types == "keydown", KEYS[rng.integers(0, len(KEYS), n)], None)
+    return timestamps, event_types, keys
+
+
+def reference_features(starts, timestamps, event_types, keys) -> np.ndarray:
+    """One event at a time, straight from the definitions."""
+    windows = [dict(keys=0, flights=[], pauses=0, corrections=0, clicks=0, click_dts=[]) for _ in starts]
+    last_key = last_click = None
+    for ts, event_type, key in zip(timestamps, event_types, keys):
+        if event_type not in ("keydown", "click"):
+            continue
+        w = windows[max(bisect.bisect_right(starts, ts) - 1, 0)]
+        if event_type == "keydown":
+            w["keys"] += 1
+            w["corrections"] += key in CORRECTION_KEYS
+            if last_key is not None:
+                dt = (ts - last_key) / 1000.0
+                if dt < KEYSTROKE_BURST_GAP_MS / 1000.0:
+                    w["flights"].append(dt)
+                else:
+                    w["pauses"] += 1
+            last_key = ts
+        else:
+            w["clicks"] += 1
+            if last_click is not None:
+                w["click_dts"].append((ts - last_click) / 1000.0)
+            last_click = ts
+
+    def mean_std(values):
+        if not values:
+            return 0.0, 0.0
+        mean = sum(values) / len(values)
+        if len(values) < 2:
+            return mean, 0.0
+        return mean, math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1))
+
+    rows = []
+    for w in windows:
+        flight_mean, flight_std = mean_std(w["flights"])
+        click_mean, click_std = mean_std(w["click_dts"])
+        rows.append([
+            w["keys"], flight_mean, flight_std, flight_std / flight_mean if flight_mean else 0.0,
+            w["pauses"] / w["keys"] if w["keys"] else 0.0, w["corrections"] / w["keys"] if w["keys"] else 0.0,
+            w["clicks"], click_mean, click_std,
+        ])
+    return np.array(rows, dtype=np.float64).reshape(-1, len(KEYSTROKE_COLUMNS))
+
+
+def run(timestamps, event_types, keys) -> np.ndarray:
+    starts = window_starts(timestamps[event_types == "mousemove"], WINDOW_SIZE)
+    return keystroke_features(starts, timestamps, event_types, keys)
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-rate", type=float, default=1_000_000, help="events/s every size must reach")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    args = parser.parse_args()
+
+    # --- Parity ---
+    timestamps, event_types, keys = synthetic_events(20_000, seed=7)
+    starts = window_starts(timestamps[event_types == "mousemove"])
+    expected = reference_features(starts, timestamps, event_types, keys)
+    actual = run(timestamps, event_types, keys)
+    if not np.allclose(actual, expected, rtol=1e-9, atol=1e-9):
+        print("MISMATCH against the reference implementation")
+        sys.exit(1)
+    print(f"parity: {len(actual)} windows match the reference")
+
+    # --- Throughput ---
+    results = {"min_rate": args.min_rate, "sizes": []}
+    too_slow = False
+    for n in args.sizes:
+        timestamps, event_types, keys = synthetic_events(n)
+        seconds = best_of(lambda: run(timestamps, event_types, keys), args.repeat)
+        rate = n / seconds
+        too_slow |= rate < args.min_rate
+        results["sizes"].append({"events": n, "seconds": seconds, "events_per_s": rate})
+        print(f"{n:>12,} events: {seconds * 1000:9.1f} ms  {rate / 1e6:6.2f} M events/s"
+              f"{'' if rate >= args.min_rate else '  << below --min-rate'}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    if too_slow:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
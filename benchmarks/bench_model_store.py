@@ -0,0 +1,208 @@
+"""
+Benchmark: loading per-user models from the model store vs. joblib pickles.
+
+Trains a handful of IsolationForests on synthetic feature rows, checks
+that a packed (memory-mapped) model scores exactly like the sklearn
+model, then lays out N user models in three formats:
+
+    pickle       one joblib pickle per user (the old format)
+    pickle-zlib  the same, joblib compress=3
+    packed       the model store's memory-mappable .forest files
+
+and, in a fresh process per format and N, loads every user's model the
+way the risk-engine's ModelCache would, keeping the most recent
+--cache-size models in memory. Reports disk size, load latency and the
+process's resident memory (anonymous and file-backed) afterwards.
+
+Usage:
+    python benchmarks/bench_model_store.py                       # 1k and 10k models
+    python benchmarks/bench_model_store.py --sizes 1000 --cache-size 0 --json out.json
+
+To keep disk usage down, the N files of a format are hard links to
+--distinct different models; every load still reads and decodes its
+own file. Files are read from a warm page cache.
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+# --- Path Setup ---
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'services', 'risk-engine'))
+
+import numpy as np
+
+FORMATS = ["pickle", "pickle-zlib", "packed"]
+
+
+def synthetic_feature_rows(n: int, rng) -> np.ndarray:
+    scale = np.array([100, 50, 200, 0.02, 0.01, 100])
+    center = np.array([300, 100, 600, 0.03, 0.01, 300])
+    return np.abs(rng.normal(size=(n, 6)) * scale + center)
+
+
+def rss_kb() -> dict:
+    """Resident memory of this process, split like /proc reports it."""
+    values = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon:", "RssFile:", "VmRSS:")):
+                key, value = line.split(":")
+                values[key] = int(value.split()[0])
+    return values
+
+
+def prepare(root: str, sizes: list[int], distinct: int) -> dict:
+    """Trains 'distinct' models and writes every format for max(sizes) users."""
+    import joblib
+    from sklearn.ensemble import IsolationForest
+    from model_store import ModelStore
+
+    rng = np.random.default_rng(42)
+    models = [
+        IsolationForest(contamination=0.1, random_state=i).fit(synthetic_feature_rows(1000, rng))
+        for i in range(distinct)
+    ]
+
+    # --- Parity: packed files score exactly like sklearn ---
+    from model_store import read_forest
+    store = ModelStore(os.path.join(root, "packed"))
+    probe = synthetic_feature_rows(10_000, rng) * rng.uniform(0.5, 2.0, size=(10_000, 6))
+    for i, model in enumerate(models):
+        entry = store.save(f"seed-{i}", model)
+        packed = read_forest(os.path.join(store.model_dir, entry["path"]))
+        np.testing.assert_array_equal(packed.decision_function(probe), model.decision_function(probe))
+
+    n_users = max(sizes)
+    sizes_on_disk = {}
+    for fmt in FORMATS:
+        directory = os.path.join(root, fmt)
+        os.makedirs(directory, exist_ok=True)
+        sources = []
+        for i, model in enumerate(models):
+            if fmt == "packed":
+                sources.append(store.model_path(f"seed-{i}", 1))
+            else:
+                path = os.path.join(directory, f"seed-{i}_model.pkl")
+                joblib.dump(model, path, compress=3 if fmt == "pickle-zlib" else 0)
+                sources.append(path)
+        sizes_on_disk[fmt] = int(np.mean([os.path.getsize(path) for path in sources]))
+
+        for u in range(n_users):
+            source = sources[u % distinct]
+            target = store.model_path(f"user-{u}", 1) if fmt == "packed" else os.path.join(directory, f"user-{u}_model.pkl")
+            os.link(source, target)
+
+    # Manifest entries for the linked users, as ModelStore.save would write them
+    with sqlite3.connect(store.manifest_path) as conn:
+        conn.executemany(
+            "INSERT INTO models (user_id, version, path, size, trained_at, info) VALUES (?, 1, ?, ?, ?, '{}')",
+            [(f"user-{u}", f"user-{u}.v1.forest", sizes_on_disk["packed"], time.time()) for u in range(n_users)]
+        )
+    return sizes_on_disk
+
+
+def child(root: str, fmt: str, n_users: int, cache_size: int) -> dict:
+    """Runs in a fresh process: loads n_users models, holding cache_size of them."""
+    import joblib
+    from model_store import ModelStore
+    from model_cache import ModelCache
+
+    directory = os.path.join(root, fmt)
+    rng = np.random.default_rng(0)
+    window = synthetic_feature_rows(2, rng)
+
+    if fmt == "packed":
+        cache = ModelCache(ModelStore(directory), max_size=cache_size or n_users)
+        load = cache.get
+    else:
+        held = OrderedDict()
+
+        def load(user_id):
+            model = joblib.load(os.path.join(directory, f"{user_id}_model.pkl"))
+            held[user_id] = model
+            while len(held) > (cache_size or n_users):
+                held.popitem(last=False)
+            return model
+
+    before = rss_kb()
+    latencies = np.empty(n_users)
+    first_score = np.empty(n_users)
+    start = time.perf_counter()
+    for u in range(n_users):
+        t0 = time.perf_counter()
+        model = load(f"user-{u}")
+        t1 = time.perf_counter()
+        model.decision_function(window)
+        latencies[u] = t1 - t0
+        first_score[u] = time.perf_counter() - t1
+    total = time.perf_counter() - start
+    after = rss_kb()
+
+    held_models = min(n_users, cache_size or n_users)
+    return {
+        "format": fmt,
+        "models": n_users,
+        "held": held_models,
+        "load_total_s": total,
+        "load_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "load_p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "first_score_p50_ms": float(np.percentile(first_score, 50) * 1000),
+        "rss_anon_mb": (after["RssAnon"] - before["RssAnon"]) / 1024,
+        "rss_file_mb": (after["RssFile"] - before["RssFile"]) / 1024,
+        "rss_kb_per_held_model": (after["VmRSS"] - before["VmRSS"]) / held_models,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--cache-size", type=int, default=1000, help="models held in memory at once (0 = all)")
+    parser.add_argument("--distinct", type=int, default=8, help="distinct trained models behind the N files")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    parser.add_argument("--child", nargs=4, metavar=("ROOT", "FORMAT", "N", "CACHE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        root, fmt, n_users, cache_size = args.child
+        print(json.dumps(child(root, fmt, int(n_users), int(cache_size))))
+        return
+
+    root = tempfile.mkdtemp(prefix="bench_model_store_")
+    try:
+        sizes_on_disk = prepare(root, args.sizes, args.distinct)
+        results = {"bytes_per_model": sizes_on_disk, "cache_size": args.cache_size, "runs": []}
+        print("parity: OK (packed decision_function == sklearn)")
+        print("bytes per model: " + ", ".join(f"{fmt} {size / 1024:.0f} KiB" for fmt, size in sizes_on_disk.items()))
+
+        for n_users in args.sizes:
+            print(f"\n=== {n_users} models, holding {min(n_users, args.cache_size or n_users)} ===")
+            for fmt in FORMATS:
+                output = subprocess.run(
+                    [sys.executable, __file__, "--child", root, fmt, str(n_users), str(args.cache_size)],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                run = json.loads(output.strip().splitlines()[-1])
+                results["runs"].append(run)
+                print(f"{fmt:>12}: load p50 {run['load_p50_ms']:7.3f} ms  p99 {run['load_p99_ms']:7.3f} ms  "
+                      f"total {run['load_total_s']:6.2f} s  first score p50 {run['first_score_p50_ms']:.3f} ms  "
+                      f"RSS +{run['rss_anon_mb']:.0f} MiB anon +{run['rss_file_mb']:.0f} MiB file "
+                      f"({run['rss_kb_per_held_model']:.0f} KiB/model)")
+
+        if args.json_path:
+            with open(args.json_path, "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
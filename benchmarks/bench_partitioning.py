@@ -0,0 +1,256 @@
+"""
+Benchmark: training query on 'behavioral_events', before vs. after
+the composite index + daily range partitioning migration.
+
+Seeds two scratch schemas on a local PostgreSQL with the same synthetic
+data, one with the original layout (only an index on id) and one with
+the partitioned layout, then runs the risk-engine's training query on
+both and prints the query plans and timings. Also checks that
+ensure_partitions creates a day whose rows already sit in the DEFAULT
+partition (moving them over) instead of failing on it.
+
+Usage (uses the DB_* settings from .env unless --url is given):
+    python benchmarks/bench_partitioning.py --rows 2000000 --users 200 --days 30
+    python benchmarks/bench_partitioning.py --url postgresql://postgres@localhost/bench --keep
+
+Needs a PostgreSQL 12+ you can create schemas on. Drops the scratch
+schemas afterwards unless --keep is given.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+# --- Path Setup ---
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from sqlalchemy import create_engine, text
+
+BEFORE_SCHEMA = "bench_unpartitioned"
+AFTER_SCHEMA = "bench_partitioned"
+
+COLUMNS_DDL = """
+    user_id VARCHAR(100),
+    event_type VARCHAR(50),
+    x INTEGER,
+    y INTEGER,
+    key VARCHAR(20),
+    timestamp BIGINT,
+    stream_id VARCHAR(32),
+"""
+
+TRAINING_QUERY = """
+    SELECT timestamp, x, y
+    FROM behavioral_events
+    WHERE user_id = :user_id AND event_type = 'mousemove'
+    ORDER BY timestamp
+"""
+
+
+def create_before(conn) -> None:
+    """The layout created by the original migration (+ stream_id)."""
+    conn.execute(text(f"""
+        CREATE TABLE behavioral_events (
+            id SERIAL PRIMARY KEY,
+            {COLUMNS_DDL}
+            received_at TIMESTAMP DEFAULT now()
+        )
+    """))
+    conn.execute(text("CREATE INDEX ix_behavioral_events_id ON behavioral_events (id)"))
+
+
+def create_after(conn, days: int) -> None:
+    """The layout created by migration 3b8f0c5d7e21."""
+    conn.execute(text(f"""
+        CREATE TABLE behavioral_events (
+            id SERIAL,
+            {COLUMNS_DDL}
+            received_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, received_at)
+        ) PARTITION BY RANGE (received_at)
+    """))
+    conn.execute(text("CREATE INDEX ix_behavioral_events_id ON behavioral_events (id)"))
+    conn.execute(text(
+        "CREATE INDEX ix_behavioral_events_user_type_ts ON behavioral_events "
+        "(user_id, event_type, timestamp) INCLUDE (x, y)"
+    ))
+    first_day = date.today() - timedelta(days=days)
+    for offset in range(days + 2):
+        day = first_day + timedelta(days=offset)
+        conn.execute(text(
+            f"CREATE TABLE behavioral_events_p{day:%Y%m%d} PARTITION OF behavioral_events "
+            f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+        ))
+    conn.execute(text("CREATE TABLE behavioral_events_default PARTITION OF behavioral_events DEFAULT"))
+
+
+def seed(conn, rows: int, users: int, days: int) -> None:
+    """
+    Interleaved events from many users over 'days' days, ~85% mousemoves,
+    inserted in arrival order like the logger would.
+    """
+    conn.execute(text(f"""
+        INSERT INTO behavioral_events (user_id, event_type, x, y, key, timestamp, received_at)
+        SELECT
+            'user-' || (g % {users}),
+            CASE WHEN g % 20 < 17 THEN 'mousemove' WHEN g % 20 < 19 THEN 'keydown' ELSE 'click' END,
+            (g * 7) % 1920,
+            (g * 13) % 1080,
+            CASE WHEN g % 20 IN (17, 18) THEN chr(97 + g % 26) END,
+            1700000000000 + g * 5,
+            now() - interval '{days} days' + (g::float / {rows}) * interval '{days} days'
+        FROM generate_series(1, {rows}) AS g
+    """))
+    conn.execute(text("ANALYZE behavioral_events"))
+
+
+def explain(conn, user_id: str) -> dict:
+    plan = conn.execute(
+        text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {TRAINING_QUERY}"),
+        {"user_id": user_id}
+    ).scalar()
+    return plan[0] if isinstance(plan, list) else json.loads(plan)[0]
+
+
+def plan_nodes(node: dict) -> list[str]:
+    """Flattens a JSON plan into 'Node Type [on relation/index]' lines."""
+    label = node["Node Type"]
+    if "Index Name" in node:
+        label += f" using {node['Index Name']}"
+    elif "Relation Name" in node:
+        label += f" on {node['Relation Name']}"
+    nodes = [label]
+    for child in node.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+def time_query(conn, user_id: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(text(TRAINING_QUERY), {"user_id": user_id}).fetchall()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def stranded_default_rows(conn) -> dict:
+    """
+    Puts rows for a day past the created partitions into the DEFAULT
+    partition, then runs ensure_partitions over that day. Returns where
+    the rows ended up.
+    """
+    from core import partitions
+
+    day = date.today() + timedelta(days=2)
+    conn.execute(text(f"""
+        INSERT INTO behavioral_events (user_id, event_type, x, y, timestamp, received_at)
+        SELECT 'user-late', 'mousemove', g, g, 1700000000000 + g,
+               '{day}'::timestamp + g * interval '1 second'
+        FROM generate_series(1, 100) AS g
+    """))
+    before = conn.execute(text(f"SELECT count(*) FROM behavioral_events_default WHERE received_at >= '{day}'")).scalar()
+    created = partitions.ensure_partitions(conn, start=day, days_ahead=3)
+    name = partitions.partition_name(day)
+    return {
+        "default_rows_before": before,
+        "created": created,
+        "partition_rows": conn.execute(text(f'SELECT count(*) FROM "{name}"')).scalar() if name in created else 0,
+        "default_rows_after": conn.execute(
+            text(f"SELECT count(*) FROM behavioral_events_default WHERE received_at >= '{day}'")
+        ).scalar(),
+        "default_attached": partitions.default_partition(conn) == "behavioral_events_default",
+    }
+
+
+def default_url() -> str:
+    from core.database import SQLALCHEMY_DATABASE_URL
+    return SQLALCHEMY_DATABASE_URL
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="SQLAlchemy URL (default: DB_* from .env)")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schemas")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url or default_url())
+    user_id = "user-7"
+    results = {"rows": args.rows, "users": args.users, "days": args.days, "layouts": {}}
+
+    try:
+        for schema, create in ((BEFORE_SCHEMA, create_before), (AFTER_SCHEMA, lambda c: create_after(c, args.days))):
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+                conn.execute(text(f"CREATE SCHEMA {schema}"))
+                conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+                create(conn)
+                start = time.perf_counter()
+                seed(conn, args.rows, args.users, args.days)
+                seed_s = time.perf_counter() - start
+
+            # Sets the visibility map, so index-only scans are possible
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(f"VACUUM ANALYZE {schema}.behavioral_events"))
+
+            with engine.connect() as conn:
+                conn.execute(text(f"SET search_path TO {schema}"))
+                plan = explain(conn, user_id)
+                best_s = time_query(conn, user_id, args.repeat)
+                conn.rollback()
+
+            results["layouts"][schema] = {
+                "seed_seconds": seed_s,
+                "plan": plan_nodes(plan["Plan"]),
+                "planning_ms": plan.get("Planning Time"),
+                "execution_ms": plan.get("Execution Time"),
+                "query_best_seconds": best_s,
+            }
+
+        for schema, result in results["layouts"].items():
+            print(f"\n=== {schema} ===")
+            print(f"execution {result['execution_ms']:.1f} ms (EXPLAIN ANALYZE), "
+                  f"best of {args.repeat}: {result['query_best_seconds'] * 1000:.1f} ms")
+            for line in result["plan"][:8]:
+                print(f"  {line}")
+            if len(result["plan"]) > 8:
+                print(f"  ... {len(result['plan']) - 8} more plan nodes")
+
+        before = results["layouts"][BEFORE_SCHEMA]["query_best_seconds"]
+        after = results["layouts"][AFTER_SCHEMA]["query_best_seconds"]
+        results["speedup"] = before / after if after else None
+        print(f"\nspeedup: {results['speedup']:.1f}x")
+
+        with engine.begin() as conn:
+            conn.execute(text(f"SET LOCAL search_path TO {AFTER_SCHEMA}"))
+            stranded = stranded_default_rows(conn)
+        results["stranded_default_rows"] = stranded
+        moved_ok = (
+            stranded["default_rows_before"] == stranded["partition_rows"] == 100
+            and stranded["default_rows_after"] == 0
+            and stranded["default_attached"]
+        )
+        print(f"DEFAULT rows moved into new partition: {stranded} -> {'ok' if moved_ok else 'FAILED'}")
+
+        if args.json_path:
+            with open(args.json_path, "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                for schema in (BEFORE_SCHEMA, AFTER_SCHEMA):
+                    conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+    if not moved_ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Benchmark: the whole ingest pipeline, end to end, in one process.
+
+Runs the real ingestor app (uvicorn, on a free local port) and the real
+event logger loop (a thread) against local stand-ins, drives N
+authenticated WebSocket connections at it (load_driver.py) and measures:
+
+- client send rate (events/s),
+- end-to-end throughput: events committed to behavioral_events per second,
+- end-to-end latency: from a frame's send time (the events' timestamp)
+  to the commit of the row, p50/p95/p99/max.
+
+Stand-ins:
+    --redis fake                 fakeredis, shared by ingestor and logger (default)
+    --redis redis://localhost:6379/15
+                                 a local redis-server; use a scratch DB, the
+                                 benchmark writes to the real stream key
+    --db sqlite                  a temporary SQLite file (default)
+    --db postgresql://postgres@localhost/bench
+                                 a local PostgreSQL; tables go into a scratch
+                                 schema that is dropped afterwards
+
+Usage:
+    python benchmarks/bench_pipeline.py --connections 50 --events 2000
+    python benchmarks/bench_pipeline.py --db postgresql://postgres@localhost/bench --feature-store --json out.json
+    python benchmarks/bench_pipeline.py --json new.json --baseline old.json   # exit 1 on regression
+
+Everything shares one machine (and the client shares the ingestor's event
+loop), so compare runs from the same box only.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# --- Path Setup ---
+benchmarks_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.realpath(os.path.join(benchmarks_dir, '..'))
+sys.path.append(project_root)
+sys.path.append(benchmarks_dir)
+sys.path.append(os.path.join(project_root, 'services', 'ingestor'))
+sys.path.append(os.path.join(project_root, 'services', 'event-logger'))
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+SCHEMA = "bench_pipeline"
+JWT_SECRET = "bench-secret-" + "x" * 32
+JWT_ISSUER, JWT_AUDIENCE = "bench", "bench"
+
+# Headline numbers compared against --baseline: (key, higher is better)
+REGRESSION_KEYS = [("send_events_per_s", True), ("e2e_events_per_s", True), ("latency_p99_ms", False)]
+
+# behavioral_events is partitioned with a composite (id, received_at) key
+# on PostgreSQL; SQLite only auto-increments a lone INTEGER PRIMARY KEY.
+SQLITE_EVENTS_DDL = """
+    CREATE TABLE behavioral_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id VARCHAR(100),
+        event_type VARCHAR(50),
+        x INTEGER,
+        y INTEGER,
+        key VARCHAR(20),
+        timestamp BIGINT,
+        stream_id VARCHAR(32),
+        received_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def setup_database(url: str):
+    """Creates the schema the logger writes to. Returns (engine, cleanup)."""
+    directory = None
+    if url == "sqlite":
+        directory = tempfile.mkdtemp(prefix="bench_pipeline_")
+        url = f"sqlite:///{os.path.join(directory, 'events.db')}"
+    # So the services' own core.database engine points here too
+    os.environ["DATABASE_URL"] = url
+
+    from core.database import Base
+    from core.models.BehavioralEvent import BehavioralEvent
+    # The feature store's tables, for Base.metadata
+    import core.models.UserFeatureState
+    import core.models.UserFeatureWindow
+
+    if directory is not None:
+        engine = create_engine(url)
+        with engine.begin() as conn:
+            conn.execute(text(SQLITE_EVENTS_DDL))
+            conn.execute(text("CREATE INDEX ix_behavioral_events_stream_id ON behavioral_events (stream_id)"))
+        tables = [table for table in Base.metadata.sorted_tables if table is not BehavioralEvent.__table__]
+        Base.metadata.create_all(engine, tables=tables)
+
+        def cleanup():
+            engine.dispose()
+            shutil.rmtree(directory, ignore_errors=True)
+        return engine, cleanup
+
+    admin = create_engine(url)
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    engine = create_engine(url, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE behavioral_events_default PARTITION OF behavioral_events DEFAULT"))
+
+    def cleanup():
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        admin.dispose()
+    return engine, cleanup
+
+
+def redis_clients(url: str):
+    """(async client for the ingestor, sync client for the logger), configured like theirs."""
+    if url == "fake":
+        import fakeredis
+        server = fakeredis.FakeServer()
+        return (fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+                fakeredis.FakeRedis(server=server, decode_responses=False))
+    import redis
+    import redis.asyncio as aioredis
+    return aioredis.from_url(url, decode_responses=True), redis.from_url(url, decode_responses=False)
+
+
+class CommitRecorder:
+    """Collects send-to-commit latencies from the logger's on_commit hook."""
+
+    def __init__(self):
+        self.latencies_ms: list[np.ndarray] = []
+        self.rows = 0
+        self.batches = 0
+        self.last_commit = None
+        self._lock = threading.Lock()
+
+    def __call__(self, rows):
+        now_ms = time.time() * 1000
+        sent_ms = np.fromiter((row['timestamp'] for row in rows), dtype=np.float64, count=len(rows))
+        with self._lock:
+            self.latencies_ms.append(now_ms - sent_ms)
+            self.rows += len(rows)
+            self.batches += 1
+            self.last_commit = time.perf_counter()
+
+
+async def run_pipeline(args, engine, async_redis, sync_redis) -> dict:
+    import uvicorn
+    import main as ingestor
+    import logger as event_logger
+    from load_driver import drive, mint_tokens
+
+    if not args.verbose:
+        # One line per connection/batch would swamp the results
+        logging.getLogger("ingestor").setLevel(logging.ERROR)
+        logging.getLogger("event-logger").setLevel(logging.ERROR)
+
+    # --- Logger: the real consume loop, in a thread ---
+    recorder = CommitRecorder()
+    stop = threading.Event()
+    logger_thread = threading.Thread(
+        target=event_logger.consume,
+        args=(sync_redis, engine),
+        kwargs={"consumer_name": "bench", "feature_store": args.feature_store, "stop": stop, "on_commit": recorder},
+        daemon=True
+    )
+    logger_thread.start()
+
+    # --- Ingestor: the real app, served on a free port ---
+    ingestor.redis_client = async_redis
+    server = uvicorn.Server(uvicorn.Config(ingestor.app, host="127.0.0.1", port=0, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    # The ingestor refuses connections until its Redis ping has answered
+    await asyncio.wait_for(ingestor.redis_ready.wait(), timeout=10)
+
+    # --- Load ---
+    tokens = mint_tokens(args.connections, JWT_SECRET, JWT_ISSUER, JWT_AUDIENCE)
+    start = time.perf_counter()
+    driver = await drive(f"ws://127.0.0.1:{port}", tokens, args.events, args.frame_size, args.rate)
+
+    # --- Wait for everything sent to be committed ---
+    # (less the mousemoves the ingestor decimated, see INGEST_DECIMATION)
+    deadline = time.perf_counter() + args.drain_timeout
+    while (recorder.rows < driver["events_sent"] - ingestor.decimation_totals["dropped"]
+           and time.perf_counter() < deadline):
+        await asyncio.sleep(0.05)
+    queue_stats = ingestor.publish_queue.stats()
+    decimated = ingestor.decimation_totals["dropped"]
+
+    server.should_exit = True
+    await serve_task
+    stop.set()
+    await asyncio.to_thread(logger_thread.join)
+
+    latencies = np.concatenate(recorder.latencies_ms) if recorder.latencies_ms else np.empty(0)
+    e2e_seconds = (recorder.last_commit or time.perf_counter()) - start
+    return {
+        "driver": driver,
+        "publish_queue": queue_stats,
+        "committed": recorder.rows,
+        "decimated": decimated,
+        "lost": driver["events_sent"] - decimated - recorder.rows,
+        "batches": recorder.batches,
+        "avg_batch_rows": recorder.rows / recorder.batches if recorder.batches else 0.0,
+        "send_events_per_s": driver["events_per_s"],
+        "e2e_seconds": e2e_seconds,
+        "e2e_events_per_s": recorder.rows / e2e_seconds if e2e_seconds else None,
+        "latency_p50_ms": _percentile(latencies, 50),
+        "latency_p95_ms": _percentile(latencies, 95),
+        "latency_p99_ms": _percentile(latencies, 99),
+        "latency_max_ms": float(latencies.max()) if len(latencies) else None,
+    }
+
+
+def _percentile(values: np.ndarray, q: float) -> float | None:
+    return float(np.percentile(values, q)) if len(values) else None
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Headline numbers that got worse than the baseline by more than 'tolerance'."""
+    regressions = []
+    for key, higher_is_better in REGRESSION_KEYS:
+        new, old = results.get(key), baseline.get(key)
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append(f"{key}: {old:,.1f} -> {new:,.1f} ({change:+.0%})")
+    return regressions
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis", default="fake", help="'fake' or a redis:// URL")
+    parser.add_argument("--db", default="sqlite", help="'sqlite' or a postgresql:// URL")
+    parser.add_argument("--connections", type=int, default=20)
+    parser.add_argument("--events", type=int, default=1000, help="events per connection")
+    parser.add_argument("--frame-size", type=int, default=20, help="events per frame")
+    parser.add_argument("--rate", type=float, default=0.0, help="events/s per connection (0 = as fast as possible)")
+    parser.add_argument("--batch-size", type=int, default=500, help="logger batch size")
+    parser.add_argument("--flush-interval-ms", type=int, default=100, help="logger flush interval")
+    parser.add_argument("--feature-store", action="store_true", help="also keep the feature store up to date")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="max seconds to wait for commits after sending")
+    parser.add_argument("--verbose", action="store_true", help="keep the services' info logging")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    parser.add_argument("--baseline", default=None, help="earlier --json output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression vs. --baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # The services read their config at import time
+    os.environ.update({
+        "JWT_SECRET": JWT_SECRET, "JWT_ISSUER": JWT_ISSUER, "JWT_AUDIENCE": JWT_AUDIENCE,
+        "LOGGER_BATCH_SIZE": str(args.batch_size),
+        "LOGGER_FLUSH_INTERVAL_MS": str(args.flush_interval_ms),
+    })
+
+    engine, cleanup = setup_database(args.db)
+    async_redis, sync_redis = redis_clients(args.redis)
+    try:
+        results = asyncio.run(run_pipeline(args, engine, async_redis, sync_redis))
+    finally:
+        cleanup()
+
+    results["run"] = {
+        "revision": git_revision(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "redis": "fake" if args.redis == "fake" else "redis",
+        "db": "sqlite" if args.db == "sqlite" else "postgresql",
+        "args": {key: value for key, value in vars(args).items() if key not in ("json_path", "baseline", "redis", "db")},
+    }
+
+    driver = results["driver"]
+    print(f"sent {driver['events_sent']:,} events over {driver['connected']} connections "
+          f"in {driver['seconds']:.2f} s ({results['send_events_per_s']:,.0f} events/s)")
+    if results["decimated"]:
+        print(f"decimated {results['decimated']:,} mousemoves (INGEST_DECIMATION)")
+    print(f"committed {results['committed']:,} ({results['lost']} missing) in {results['e2e_seconds']:.2f} s "
+          f"({results['e2e_events_per_s']:,.0f} events/s, {results['avg_batch_rows']:.0f} rows/batch)")
+    if results["latency_p50_ms"] is not None:
+        print(f"send -> commit latency: p50 {results['latency_p50_ms']:.0f} ms, p95 {results['latency_p95_ms']:.0f} ms, "
+              f"p99 {results['latency_p99_ms']:.0f} ms, max {results['latency_max_ms']:.0f} ms")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("REGRESSIONS vs. baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"no regressions vs. {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
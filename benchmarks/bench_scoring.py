@@ -0,0 +1,92 @@
+"""
+Benchmark: real-time scoring latency in the risk-engine.
+
+Saves a fitted IsolationForest to a ModelStore and loads it back as the
+PackedForest /model/predict serves, checks that it returns the same
+decision_function values as scikit-learn, then reports p50/p99 latency
+of scoring a 20-event window both ways.
+
+Usage:
+    python benchmarks/bench_scoring.py --requests 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# --- Path Setup ---
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'services', 'risk-engine'))
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from core.features import window_features, FEATURE_COLUMNS
+from model_store import ModelStore
+
+
+def synthetic_feature_rows(n: int, rng) -> pd.DataFrame:
+    scale = np.array([100, 50, 200, 0.02, 0.01, 100])
+    center = np.array([300, 100, 600, 0.03, 0.01, 300])
+    return pd.DataFrame(np.abs(rng.normal(size=(n, 6)) * scale + center), columns=FEATURE_COLUMNS)
+
+
+def synthetic_window(rng, n_events: int = 20):
+    timestamps = 1_700_000_000_000 + np.cumsum(rng.integers(5, 30, size=n_events))
+    x = 500 + np.cumsum(rng.normal(0, 10, size=n_events))
+    y = 400 + np.cumsum(rng.normal(0, 10, size=n_events))
+    return timestamps, x, y
+
+
+def percentiles(samples) -> str:
+    samples = np.asarray(samples) * 1000
+    return f"p50 {np.percentile(samples, 50):7.3f} ms   p99 {np.percentile(samples, 99):7.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--train-rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    model = IsolationForest(contamination=0.1, random_state=42).fit(synthetic_feature_rows(args.train_rows, rng))
+    with tempfile.TemporaryDirectory(prefix="bench_scoring_") as model_dir:
+        store = ModelStore(model_dir)
+        store.save("bench-user", model)
+        packed = store.load("bench-user")
+        # The packed arrays are memory-mapped from the store's files
+        compare(args, rng, model, packed)
+
+
+def compare(args, rng, model, packed):
+    """Parity and latency of the stored PackedForest against the fitted model."""
+    # --- Parity ---
+    probe = synthetic_feature_rows(10_000, rng).to_numpy() * rng.uniform(0.5, 2.0, size=(10_000, 6))
+    expected = model.decision_function(pd.DataFrame(probe, columns=FEATURE_COLUMNS))
+    np.testing.assert_allclose(packed.decision_function(probe), expected, rtol=1e-12, atol=1e-12)
+    print("parity: OK (stored PackedForest matches IsolationForest.decision_function)")
+
+    # --- Latency ---
+    windows = [synthetic_window(rng) for _ in range(args.requests)]
+
+    def time_scoring(score):
+        timings = []
+        for timestamps, x, y in windows:
+            start = time.perf_counter()
+            score(window_features(timestamps, x, y))
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    sklearn_timings = time_scoring(lambda f: model.decision_function(pd.DataFrame(f, columns=FEATURE_COLUMNS)))
+    packed_timings = time_scoring(packed.decision_function)
+
+    print(f"sklearn decision_function : {percentiles(sklearn_timings)}")
+    print(f"PackedForest (model store): {percentiles(packed_timings)}")
+
+
+if __name__ == "__main__":
+    main()
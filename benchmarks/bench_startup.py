@@ -0,0 +1,211 @@
+"""
+Benchmark: cold start of the risk-engine and ingestor processes.
+
+For each service it measures, in fresh processes:
+
+- import   seconds to 'import main' (the app module, as uvicorn does),
+           and whether the heavy ML stack (pandas, scikit-learn,
+           joblib) got imported with it. Only training needs it.
+- ready    seconds from starting 'uvicorn main:app' until the first
+           request (GET /) is answered
+- first    seconds for the first real request after that: a
+           /model/predict for the risk-engine, /stats for the ingestor
+
+The ingestor is pointed at a Redis that isn't there, to check it still
+starts (and reports redis_ready: false) instead of waiting or giving up.
+The risk-engine gets a few trained models and, with --preload, warms
+them in the background (MODEL_PRELOAD_USERS); the run reports how many
+were in the cache shortly after startup.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 5 --preload 3 --json out.json
+
+Exits 1 if the ML stack is imported by an app, or an app is slower to
+import or get ready than --max-import-s / --max-ready-s.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# --- Path Setup ---
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'services', 'risk-engine'))
+
+import httpx
+
+SERVICES = {
+    "risk-engine": os.path.join(project_root, 'services', 'risk-engine'),
+    "ingestor": os.path.join(project_root, 'services', 'ingestor'),
+}
+HEAVY_MODULES = ("pandas", "sklearn", "joblib")
+
+IMPORT_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+import main
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def service_env(model_dir: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "MODEL_DIR": model_dir,
+        "DATABASE_URL": f"sqlite:///{os.path.join(model_dir, 'bench.db')}",
+        # Nothing listens there: the ingestor must start anyway
+        "REDIS_HOST": "127.0.0.1",
+        "REDIS_PORT": str(free_port()),
+        "JWT_SECRET": "bench",
+    })
+    return env
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(service: str, env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT], cwd=SERVICES[service], env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_ready(service: str, env: dict, first_request, timeout: float = 30.0) -> dict:
+    """Starts uvicorn, polls GET / until it answers, then times first_request(client)."""
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVICES[service], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=10.0) as client:
+            while True:
+                if process.poll() is not None:
+                    raise SystemExit(f"{service} exited with {process.returncode} during startup")
+                if time.perf_counter() - start > timeout:
+                    raise SystemExit(f"{service} not ready after {timeout:.0f} s")
+                try:
+                    if client.get("/").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    time.sleep(0.01)
+            ready = time.perf_counter() - start
+
+            start = time.perf_counter()
+            details = first_request(client)
+            first = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {"ready": ready, "first": first, **details}
+
+
+def train_models(model_dir: str, users: int) -> None:
+    import numpy as np
+    import pandas as pd
+    from sklearn.ensemble import IsolationForest
+    from model_store import ModelStore
+    from data_loader import training_columns
+
+    store = ModelStore(model_dir)
+    rng = np.random.default_rng(0)
+    for u in range(users):
+        features = pd.DataFrame(rng.gamma(2.0, 1.0, size=(500, len(training_columns()))), columns=training_columns())
+        store.save(f"user-{u}", IsolationForest(n_estimators=50, random_state=u).fit(features))
+        time.sleep(0.01)  # Distinct trained_at, newest last
+
+
+def predict_window() -> list[dict]:
+    return [
+        {"type": "mousemove", "x": 100 + 7 * i, "y": 200 + 3 * i, "timestamp": 1_700_000_000_000 + 16 * i}
+        for i in range(20)
+    ]
+
+
+def risk_engine_first_request(users: int, preload: int):
+    def first_request(client) -> dict:
+        response = client.post(f"/model/predict/user-{users - 1}", json={"events": predict_window()})
+        response.raise_for_status()
+        # Give the background preload a moment, then see what it loaded
+        deadline = time.perf_counter() + 5.0
+        cache = client.get("/model/cache").json()
+        while preload and cache["size"] < min(preload, users) and time.perf_counter() < deadline:
+            time.sleep(0.05)
+            cache = client.get("/model/cache").json()
+        return {"cache_size": cache["size"]}
+    return first_request
+
+
+def ingestor_first_request(client) -> dict:
+    response = client.get("/stats")
+    response.raise_for_status()
+    return {"redis_ready": response.json()["redis_ready"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (the median is reported)")
+    parser.add_argument("--users", type=int, default=5, help="trained models in the risk-engine's store")
+    parser.add_argument("--preload", type=int, default=0, help="MODEL_PRELOAD_USERS for the risk-engine")
+    parser.add_argument("--max-import-s", type=float, default=2.0)
+    parser.add_argument("--max-ready-s", type=float, default=5.0)
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    args = parser.parse_args()
+
+    model_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    train_models(model_dir, args.users)
+    env = service_env(model_dir)
+    env["MODEL_PRELOAD_USERS"] = str(args.preload)
+    first_requests = {
+        "risk-engine": risk_engine_first_request(args.users, args.preload),
+        "ingestor": ingestor_first_request,
+    }
+
+    results, failures = {}, []
+    for service in SERVICES:
+        imports = [measure_import(service, env) for _ in range(args.repeat)]
+        runs = [measure_ready(service, env, first_requests[service]) for _ in range(args.repeat)]
+        result = {
+            "import_s": statistics.median(run["seconds"] for run in imports),
+            "heavy_modules": imports[0]["heavy"],
+            "ready_s": statistics.median(run["ready"] for run in runs),
+            "first_request_s": statistics.median(run["first"] for run in runs),
+            **{k: v for k, v in runs[-1].items() if k not in ("ready", "first")},
+        }
+        results[service] = result
+
+        extra = ", ".join(f"{k}={result[k]}" for k in ("cache_size", "redis_ready") if k in result)
+        print(f"{service:<12} import {result['import_s']:5.2f} s  ready {result['ready_s']:5.2f} s  "
+              f"first request {result['first_request_s'] * 1000:6.1f} ms  {extra}")
+        if result["heavy_modules"]:
+            failures.append(f"{service} imports {', '.join(result['heavy_modules'])} at startup")
+        if result["import_s"] > args.max_import_s:
+            failures.append(f"{service} import takes {result['import_s']:.2f} s (--max-import-s {args.max_import_s})")
+        if result["ready_s"] > args.max_ready_s:
+            failures.append(f"{service} is ready after {result['ready_s']:.2f} s (--max-ready-s {args.max_ready_s})")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Benchmark: live window scoring in the risk-engine's stream scorer.
+
+Checks that the windows the scorer closes, fed one user's events in
+stream-sized batches, get the same scores as scoring the features of
+the whole event sequence at once (what training sees). Then it times
+the scorer on interleaved events of many users, read from a (fake)
+Redis Stream in batches and published to the scores channel, and
+reports the scorer's events/s against an ingest rate it must keep up
+with.
+
+Usage:
+    python benchmarks/bench_stream_scorer.py --users 1000 --events-per-user 500
+    python benchmarks/bench_stream_scorer.py --min-rate 20000 --json out.json
+
+Exits 1 on a parity mismatch or if it's slower than --min-rate events/s.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+# --- Path Setup ---
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'services', 'risk-engine'))
+
+import numpy as np
+import pandas as pd
+import fakeredis
+from sklearn.ensemble import IsolationForest
+
+from core import stream, event_codec
+from core.keystroke_features import event_features, select_columns, ALL_FEATURE_COLUMNS
+from bench_keystroke_features import synthetic_events
+from model_cache import ModelCache
+from model_store import ModelStore
+from stream_scorer import StreamScorer, SCORER_CONSUMER_GROUP, SCORER_BATCH_SIZE
+
+
+def user_events(user_id: str, n: int, seed: int) -> list[dict]:
+    """One user's events of every type, as the ingestor publishes them."""
+    timestamps, event_types, keys = synthetic_events(n, seed=seed)
+    rng = np.random.default_rng(seed)
+    x = np.clip(960 + np.cumsum(rng.normal(0, 6, n)), 0, 1919).round()
+    y = np.clip(540 + np.cumsum(rng.normal(0, 6, n)), 0, 1079).round()
+    events = []
+    for ts, event_type, key, px, py in zip(timestamps.tolist(), event_types, keys, x.tolist(), y.tolist()):
+        event = {"type": event_type, "timestamp": int(ts), "user_id": user_id}
+        if event_type == "keydown":
+            event["key"] = key
+        else:
+            event["x"], event["y"] = int(px), int(py)
+        events.append(event)
+    return events
+
+
+def expected_features(events: list[dict]) -> np.ndarray:
+    return event_features(
+        np.array([e["timestamp"] for e in events], dtype=np.float64),
+        np.array([e["type"] for e in events], dtype=object),
+        np.array([e.get("x", np.nan) for e in events], dtype=np.float64),
+        np.array([e.get("y", np.nan) for e in events], dtype=np.float64),
+        np.array([e.get("key") for e in events], dtype=object),
+    )
+
+
+def drain(client, scorer: StreamScorer, batch_size: int) -> tuple[int, int, float]:
+    """
+    Scores everything in the stream, as the scorer's main loop would.
+    Returns (entries, windows, seconds spent in the scorer itself).
+    """
+    consumer = stream.StreamConsumer(client, "bench", group=SCORER_CONSUMER_GROUP, count=batch_size)
+    n_entries = windows = 0
+    scoring = 0.0
+    while True:
+        entries, _ = consumer.read(block_ms=None)
+        if not entries:
+            return n_entries, windows, scoring
+        n_entries += len(entries)
+        start = time.perf_counter()
+        windows += scorer.process(entries)
+        scoring += time.perf_counter() - start
+        consumer.ack([entry_id for entry_id, _ in entries])
+
+
+def publish_all(client, events: list[dict], batch_size: int = 500) -> None:
+    """Publishes like the ingestor: each user's events in a batch become one entry."""
+    pipe = client.pipeline(transaction=False)
+    for i in range(0, len(events), batch_size):
+        by_user: dict[str, list[dict]] = {}
+        for event in events[i:i + batch_size]:
+            by_user.setdefault(event["user_id"], []).append(event)
+        for user_id, user_events in by_user.items():
+            for data in event_codec.encode_entries(user_id, user_events):
+                stream.publish(pipe, data)
+    pipe.execute()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--events-per-user", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=SCORER_BATCH_SIZE)
+    parser.add_argument("--min-rate", type=float, default=10_000, help="events/s the scorer must keep up with")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    args = parser.parse_args()
+
+    model_dir = tempfile.mkdtemp(prefix="bench_stream_scorer_")
+    store = ModelStore(model_dir)
+
+    # --- Parity ---
+    events = user_events("parity", 20_000, seed=7)
+    expected = expected_features(events)
+    model = IsolationForest(n_estimators=50, random_state=0).fit(pd.DataFrame(expected, columns=ALL_FEATURE_COLUMNS))
+    store.save("parity", model)
+    forest = store.load("parity")
+    expected_scores = forest.decision_function(select_columns(expected, forest.feature_names))
+
+    client = fakeredis.FakeRedis(decode_responses=False)
+    pubsub = client.pubsub()
+    pubsub.subscribe(stream.RISK_SCORES_CHANNEL)
+    pubsub.get_message(timeout=1.0)  # The subscribe confirmation
+    scorer = StreamScorer(client, ModelCache(store))
+    publish_all(client, events)
+    drain(client, scorer, args.batch_size)
+    scores = []
+    while (message := pubsub.get_message(timeout=0.1)) is not None:
+        scores.append(json.loads(message["data"])["score"])
+    pubsub.close()
+
+    # Every window but the last (still open) one is scored
+    if len(scores) != len(expected) - 1 or not np.allclose(scores, expected_scores[:-1], rtol=1e-9, atol=1e-12):
+        print(f"MISMATCH: {len(scores)} windows scored, expected {len(expected) - 1} matching scores")
+        sys.exit(1)
+    print(f"parity: {len(scores)} live window scores match scoring the whole sequence")
+
+    # --- Throughput ---
+    # Every user shares the parity model; the ModelCache lookups still happen per user
+    for u in range(args.users):
+        store.save(f"user-{u}", model)
+    interleaved = [user_events(f"user-{u}", args.events_per_user, seed=u) for u in range(args.users)]
+    arrivals = sorted((e for user in interleaved for e in user), key=lambda e: e["timestamp"])
+
+    client = fakeredis.FakeRedis(decode_responses=False)
+    scorer = StreamScorer(client, ModelCache(store, max_size=args.users))
+    publish_all(client, arrivals)
+    start = time.perf_counter()
+    n_entries, n_windows, scoring = drain(client, scorer, args.batch_size)
+    n_events = len(arrivals)
+    seconds = time.perf_counter() - start
+    # The scorer's own rate: fakeredis is far slower than Redis at handing out entries
+    rate = n_events / scoring
+
+    results = {
+        "users": args.users, "events": n_events, "entries": n_entries, "windows_scored": n_windows, "seconds": seconds,
+        "scoring_seconds": scoring, "events_per_s": rate, "windows_per_s": n_windows / scoring,
+        "min_rate": args.min_rate,
+    }
+    print(f"{n_events:,} events of {args.users} users in {n_entries:,} entries, {n_windows:,} windows scored")
+    print(f"scorer: {scoring:.2f} s, {rate:,.0f} events/s, {n_windows / scoring:,.0f} windows/s"
+          f"{'' if rate >= args.min_rate else '  << below --min-rate'}")
+    print(f"with fakeredis reads and acks: {seconds:.2f} s, {n_events / seconds:,.0f} events/s")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    if rate < args.min_rate:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
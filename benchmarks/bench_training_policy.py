@@ -0,0 +1,173 @@
+"""
+Benchmark: accuracy vs. training time of the risk-engine's training
+policy (services/risk-engine/training_policy.py).
+
+Synthetic users move the mouse for --days days, their speed and jitter
+drifting slowly over that time. Each user's model is trained on their
+history under several policies:
+
+- all rows (TRAINING_MAX_ROWS=0) with the default IsolationForest
+- at most --max-rows rows, sampled uniformly (reservoir) or weighted
+  towards recent windows (recent)
+- every --n-estimators / --max-samples combination on the first
+  --max-rows sample
+
+and scored on windows from the day after its history (the user's own,
+which should look normal) and from other users (which should not).
+The sampler gets the feature rows in chunks, as the data loader feeds
+it while streaming from the database.
+
+Reported per policy, averaged over users: rows trained on, sample + fit
+seconds, and ROC AUC of telling the user from the others.
+
+Usage:
+    python benchmarks/bench_training_policy.py --users 8 --days 60 --events-per-day 20000
+    python benchmarks/bench_training_policy.py --max-rows 5000 20000 --n-jobs -1 --json out.json
+
+Exits 1 if the default policy (reservoir, first --max-rows, default
+model) loses more than --max-auc-drop AUC against training on all rows.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# --- Path Setup ---
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'services', 'risk-engine'))
+
+import numpy as np
+from sklearn.metrics import roc_auc_score
+
+from core.features import window_features, WINDOW_SIZE
+import training_policy
+from training_policy import RowSampler
+
+DAY_MS = 86_400_000
+START_MS = 1_700_000_000_000
+CHUNK_ROWS = 5000  # Rows per sampler.add, like one loader chunk of 50k events
+
+
+def user_events(rng, profile: dict, days: int, per_day: int, start_day: int = 0, span: int | None = None):
+    """
+    Mouse movements over 'days' days from 'start_day'; step size and
+    timing drift linearly by profile["drift"] every 'span' days.
+    """
+    timestamps, x, y = [], [], []
+    for day in range(start_day, start_day + days):
+        drift = 1.0 + profile["drift"] * day / (span or days)
+        gaps = rng.gamma(2.0, profile["gap_ms"] * drift / 2.0, per_day).round().clip(1)
+        ts = START_MS + day * DAY_MS + np.cumsum(gaps)
+        steps = rng.normal(0, profile["step"] * drift, (per_day, 2))
+        timestamps.append(ts)
+        x.append(np.clip(960 + np.cumsum(steps[:, 0]), 0, 1919).round())
+        y.append(np.clip(540 + np.cumsum(steps[:, 1]), 0, 1079).round())
+    return np.concatenate(timestamps), np.concatenate(x), np.concatenate(y)
+
+
+def features_and_starts(timestamps, x, y):
+    features = window_features(timestamps, x, y)
+    return features, timestamps[::WINDOW_SIZE][:len(features)]
+
+
+def make_users(n_users: int, days: int, per_day: int, seed: int = 42) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    users = []
+    for _ in range(n_users):
+        profile = {
+            "gap_ms": rng.uniform(8, 30),
+            "step": rng.uniform(3, 12),
+            "drift": rng.uniform(-0.4, 0.6),
+        }
+        history, starts = features_and_starts(*user_events(rng, profile, days, per_day))
+        # The day after the history: what the model will be scoring
+        test, _ = features_and_starts(*user_events(rng, profile, 1, per_day // 4, start_day=days, span=days))
+        users.append({"history": history, "starts": starts, "test": test})
+    return users
+
+
+def sample_rows(history, starts, max_rows: int, sampling: str) -> np.ndarray:
+    if max_rows <= 0:
+        return history
+    half_life_ms = training_policy.TRAINING_RECENCY_HALF_LIFE_DAYS * DAY_MS if sampling == "recent" else None
+    sampler = RowSampler(max_rows, half_life_ms)
+    for i in range(0, len(history), CHUNK_ROWS):
+        sampler.add(history[i:i + CHUNK_ROWS], starts[i:i + CHUNK_ROWS])
+    return sampler.sample()
+
+
+def evaluate(users, max_rows: int, sampling: str, n_estimators: int, max_samples, n_jobs: int) -> dict:
+    rows, sample_s, fit_s, aucs = [], [], [], []
+    for i, user in enumerate(users):
+        start = time.perf_counter()
+        train = sample_rows(user["history"], user["starts"], max_rows, sampling)
+        sample_s.append(time.perf_counter() - start)
+
+        model = training_policy.new_model(n_estimators, max_samples, n_jobs)
+        start = time.perf_counter()
+        model.fit(train)
+        fit_s.append(time.perf_counter() - start)
+
+        others = np.vstack([other["test"] for j, other in enumerate(users) if j != i])
+        scores = -model.score_samples(np.vstack([user["test"], others]))  # Higher = more anomalous
+        labels = np.r_[np.zeros(len(user["test"])), np.ones(len(others))]
+        aucs.append(roc_auc_score(labels, scores))
+        rows.append(len(train))
+    return {
+        "max_rows": max_rows, "sampling": sampling if max_rows > 0 else "all",
+        "n_estimators": n_estimators, "max_samples": max_samples,
+        "rows": float(np.mean(rows)), "sample_s": float(np.mean(sample_s)),
+        "fit_s": float(np.mean(fit_s)), "auc": float(np.mean(aucs)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--events-per-day", type=int, default=20_000)
+    parser.add_argument("--max-rows", type=int, nargs="+", default=[5_000, 20_000])
+    parser.add_argument("--n-estimators", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--max-samples", nargs="+", default=["auto", "1024"])
+    parser.add_argument("--n-jobs", type=int, default=1, help="IsolationForest n_jobs (TRAINING_N_JOBS)")
+    parser.add_argument("--max-auc-drop", type=float, default=0.02)
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    args = parser.parse_args()
+
+    users = make_users(args.users, args.days, args.events_per_day)
+    print(f"{args.users} users, {np.mean([len(u['history']) for u in users]):,.0f} training windows each "
+          f"({args.days} days), {np.mean([len(u['test']) for u in users]):,.0f} test windows each")
+
+    default = dict(n_estimators=training_policy.TRAINING_N_ESTIMATORS, max_samples="auto", n_jobs=args.n_jobs)
+    runs = [evaluate(users, 0, "reservoir", **default)]
+    for max_rows in args.max_rows:
+        for sampling in ("reservoir", "recent"):
+            runs.append(evaluate(users, max_rows, sampling, **default))
+    for n_estimators in args.n_estimators:
+        for max_samples in args.max_samples:
+            if n_estimators == default["n_estimators"] and max_samples == "auto":
+                continue
+            runs.append(evaluate(users, args.max_rows[0], "reservoir", n_estimators,
+                                 training_policy.max_samples_setting(max_samples), args.n_jobs))
+
+    baseline = runs[0]
+    print(f"  {'policy':<16} {'trees':>5} {'samples':>7} {'rows':>8} {'sample':>8} {'fit':>8} {'AUC':>7} {'dAUC':>7}")
+    for run in runs:
+        policy = "all" if run["max_rows"] <= 0 else f"{run['sampling']} {run['max_rows']}"
+        print(f"  {policy:<16} {run['n_estimators']:5d} {str(run['max_samples']):>7} {run['rows']:8,.0f} "
+              f"{run['sample_s'] * 1000:6.1f}ms {run['fit_s']:7.2f}s {run['auc']:7.4f} {run['auc'] - baseline['auc']:+7.4f}")
+
+    checked = runs[1]
+    drop = baseline["auc"] - checked["auc"]
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"users": args.users, "days": args.days, "runs": runs, "auc_drop": drop}, f, indent=2)
+    if drop > args.max_auc_drop:
+        print(f"reservoir {checked['max_rows']} loses {drop:.4f} AUC against all rows (--max-auc-drop {args.max_auc_drop})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Synthetic behavioral events, shaped like the frontend's BehavioralEvent
+(services/frontend/src/lib/websocket.ts):
+
+    {"type": "mousemove", "timestamp": 1700000000000, "x": 512, "y": 301}
+    {"type": "keydown",   "timestamp": 1700000000016, "key": "a", "target": "INPUT"}
+    {"type": "click",     "timestamp": 1700000000033, "x": 514, "y": 300, "target": "BUTTON"}
+
+Each simulated user has their own cursor (a random walk over the screen),
+types in bursts and clicks now and then. Used by the load driver and the
+pipeline benchmark; can also dump events as JSON lines:
+
+    python benchmarks/event_generator.py --users 3 --events 10
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+SCREEN_WIDTH, SCREEN_HEIGHT = 1920, 1080
+
+# Share of each event type (the rest are mousemoves)
+KEYDOWN_SHARE = 0.10
+CLICK_SHARE = 0.03
+
+KEYS = list(string.ascii_lowercase + string.digits) + ["Enter", "Backspace", "Shift", "Tab", " "]
+KEY_TARGETS = ["INPUT", "TEXTAREA"]
+CLICK_TARGETS = ["BUTTON", "A", "DIV", "INPUT"]
+
+
+class EventGenerator:
+    """
+    An endless stream of one user's events. Timestamps follow a 60 Hz
+    mousemove rhythm from 'start_ms' unless the caller stamps events
+    with real send times (see frame()).
+    """
+
+    def __init__(self, seed: int = 0, start_ms: int | None = None):
+        self.rng = random.Random(seed)
+        self.x = self.rng.randrange(SCREEN_WIDTH)
+        self.y = self.rng.randrange(SCREEN_HEIGHT)
+        self.timestamp = int(time.time() * 1000) if start_ms is None else start_ms
+
+    def event(self, timestamp: int | None = None) -> dict:
+        """The next event; 'timestamp' overrides the simulated clock."""
+        self.timestamp += self.rng.randint(8, 25)
+        roll = self.rng.random()
+
+        if roll < KEYDOWN_SHARE:
+            event = {"type": "keydown", "timestamp": self.timestamp,
+                     "key": self.rng.choice(KEYS), "target": self.rng.choice(KEY_TARGETS)}
+        elif roll < KEYDOWN_SHARE + CLICK_SHARE:
+            event = {"type": "click", "timestamp": self.timestamp,
+                     "x": self.x, "y": self.y, "target": self.rng.choice(CLICK_TARGETS)}
+        else:
+            self.x = min(SCREEN_WIDTH - 1, max(0, self.x + round(self.rng.gauss(0, 6))))
+            self.y = min(SCREEN_HEIGHT - 1, max(0, self.y + round(self.rng.gauss(0, 6))))
+            event = {"type": "mousemove", "timestamp": self.timestamp, "x": self.x, "y": self.y}
+
+        if timestamp is not None:
+            event["timestamp"] = timestamp
+        return event
+
+    def frame(self, size: int, timestamp: int | None = None) -> list[dict]:
+        """
+        One WebSocket frame's worth of events (the frontend sends up to
+        20 per frame). With 'timestamp' (e.g. the send time in ms) every
+        event carries it, which is what end-to-end latency is measured from.
+        """
+        return [self.event(timestamp) for _ in range(size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--events", type=int, default=100, help="events per user")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for u in range(args.users):
+        generator = EventGenerator(seed=args.seed + u)
+        for _ in range(args.events):
+            print(json.dumps({**generator.event(), "user_id": f"bench-user-{u}"}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+WebSocket load driver for the ingestor.
+
+Opens N authenticated connections to /ws/ingest (one synthetic user per
+connection, tokens signed with the same secret/issuer/audience as the
+identity service) and has each send frames of synthetic events at a fixed
+rate. Every event in a frame carries the frame's send time as its
+timestamp, so downstream latency can be measured from it.
+
+Against a running ingestor (tokens are signed with JWT_* from .env):
+    python benchmarks/load_driver.py --url ws://localhost:8000 --connections 200 --events 2000
+    python benchmarks/load_driver.py --connections 50 --rate 500 --json out.json
+
+Reports connects/rejections, events sent per second and how often the
+ingestor asked clients to slow down. For end-to-end numbers (send to a
+row in behavioral_events) see bench_pipeline.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+# --- Path Setup ---
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+sys.path.append(os.path.dirname(__file__))
+
+import jwt
+import numpy as np
+import websockets
+from dotenv import load_dotenv
+
+from event_generator import EventGenerator
+
+
+def mint_tokens(n_users: int, secret: str, issuer: str | None, audience: str | None, ttl_s: int = 3600) -> list[str]:
+    """One access token per synthetic user ('bench-user-<i>')."""
+    expires = int(time.time()) + ttl_s
+    tokens = []
+    for u in range(n_users):
+        claims = {"sub": f"bench-user-{u}", "exp": expires}
+        if issuer:
+            claims["iss"] = issuer
+        if audience:
+            claims["aud"] = audience
+        tokens.append(jwt.encode(claims, secret, algorithm="HS256"))
+    return tokens
+
+
+async def _connection(url: str, token: str, seed: int, events: int, frame_size: int, rate: float,
+                      honour_slow_down: bool, stats: dict) -> None:
+    generator = EventGenerator(seed=seed)
+    start = time.perf_counter()
+    try:
+        ws = await websockets.connect(f"{url}/ws/ingest?token={token}", max_queue=None)
+    except Exception as e:
+        stats["connect_errors"].append(type(e).__name__)
+        return
+    stats["connect_s"].append(time.perf_counter() - start)
+
+    paused_until = 0.0
+
+    async def receive():
+        # The ingestor only ever sends backpressure messages
+        nonlocal paused_until
+        try:
+            async for message in ws:
+                data = json.loads(message)
+                if data.get("action") == "slow_down":
+                    stats["slow_down"] += 1
+                    if honour_slow_down:
+                        paused_until = time.perf_counter() + data.get("retry_after_ms", 1000) / 1000
+        except websockets.ConnectionClosed:
+            pass
+
+    receiver = asyncio.create_task(receive())
+    interval = frame_size / rate if rate else 0.0
+    next_send = time.perf_counter()
+    sent = 0
+    try:
+        while sent < events:
+            now = time.perf_counter()
+            if now < paused_until:
+                await asyncio.sleep(paused_until - now)
+            if interval:
+                next_send += interval
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            size = min(frame_size, events - sent)
+            await ws.send(json.dumps(generator.frame(size, timestamp=int(time.time() * 1000))))
+            sent += size
+            if not interval:
+                await asyncio.sleep(0)  # Let the other connections have a go
+    except websockets.ConnectionClosed as e:
+        stats["closed"].append(e.rcvd.code if e.rcvd else None)
+    finally:
+        stats["events_sent"] += sent
+        receiver.cancel()
+        await ws.close()
+
+
+async def drive(url: str, tokens: list[str], events_per_connection: int, frame_size: int = 20,
+                rate: float = 0.0, honour_slow_down: bool = True) -> dict:
+    """
+    Runs one connection per token until each has sent its events.
+    'rate' is events per second per connection (0 = as fast as possible).
+    """
+    stats = {"connect_s": [], "connect_errors": [], "closed": [], "events_sent": 0, "slow_down": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _connection(url, token, seed, events_per_connection, frame_size, rate, honour_slow_down, stats)
+        for seed, token in enumerate(tokens)
+    ))
+    elapsed = time.perf_counter() - start
+
+    connect_ms = np.array(stats["connect_s"]) * 1000
+    return {
+        "connections": len(tokens),
+        "connected": len(stats["connect_s"]),
+        "connect_errors": len(stats["connect_errors"]),
+        "closed_by_server": {str(code): stats["closed"].count(code) for code in set(stats["closed"])},
+        "connect_p50_ms": float(np.percentile(connect_ms, 50)) if len(connect_ms) else None,
+        "connect_p99_ms": float(np.percentile(connect_ms, 99)) if len(connect_ms) else None,
+        "events_sent": stats["events_sent"],
+        "seconds": elapsed,
+        "events_per_s": stats["events_sent"] / elapsed if elapsed else None,
+        "slow_down_signals": stats["slow_down"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://localhost:8000")
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--events", type=int, default=1000, help="events per connection")
+    parser.add_argument("--frame-size", type=int, default=20, help="events per frame (the frontend sends up to 20)")
+    parser.add_argument("--rate", type=float, default=0.0, help="events/s per connection (0 = as fast as possible)")
+    parser.add_argument("--ignore-slow-down", action="store_true", help="keep sending when asked to slow down")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    args = parser.parse_args()
+
+    load_dotenv(os.path.join(project_root, '.env'))
+    secret = os.getenv("JWT_SECRET") or os.getenv("JWT_SECRET_KEY")
+    if not secret:
+        parser.error("JWT_SECRET / JWT_SECRET_KEY is not set")
+    tokens = mint_tokens(args.connections, secret, os.getenv("JWT_ISSUER"), os.getenv("JWT_AUDIENCE"))
+
+    results = asyncio.run(drive(args.url, tokens, args.events, args.frame_size, args.rate,
+                                honour_slow_down=not args.ignore_slow_down))
+    print(f"{results['connected']}/{results['connections']} connected "
+          f"(connect p50 {results['connect_p50_ms'] or 0:.1f} ms), "
+          f"{results['events_sent']:,} events in {results['seconds']:.2f} s "
+          f"({results['events_per_s']:,.0f} events/s), {results['slow_down_signals']} slow-down signals")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
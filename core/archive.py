@@ -0,0 +1,258 @@
+import os
+import json
+import logging
+import itertools
+from datetime import date, datetime, timedelta
+from urllib.parse import quote
+
+from sqlalchemy import text
+
+from core import partitions
+
+logger = logging.getLogger(__name__)
+
+# --- Archive Config (from .env) ---
+# Aged 'behavioral_events' partitions are exported here as Parquet, one
+# file per user per day, then dropped from PostgreSQL:
+#   <ARCHIVE_DIR>/user_id=<user>/day=2026-10-01.parquet
+# The event logger's archive job and the risk engine must see the same
+# directory (e.g. a shared volume).
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR") or os.path.realpath(
+    os.path.join(os.path.dirname(__file__), '..', 'event_archive')
+)
+
+# Partitions whose day is at least this many days old get archived
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "7"))
+
+# Lists the archived days. A day only counts as archived (and is only
+# read from Parquet instead of PostgreSQL) once it is in here.
+MANIFEST_FILE = "_manifest.json"
+
+# Only what the mouse and keystroke features need.
+# id, stream_id and received_at stay behind; user_id and the day are
+# in the path.
+ARCHIVE_COLUMNS = ("event_type", "timestamp", "x", "y", "key")
+
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("event_type", pa.string()),
+        ("timestamp", pa.int64()),
+        ("x", pa.int32()),
+        ("y", pa.int32()),
+        ("key", pa.string()),
+    ])
+
+
+def user_dir(user_id: str, root: str = ARCHIVE_DIR) -> str:
+    return os.path.join(root, f"user_id={quote(user_id, safe='')}")
+
+
+def day_file(user_id: str, day: date, root: str = ARCHIVE_DIR) -> str:
+    return os.path.join(user_dir(user_id, root), f"day={day.isoformat()}.parquet")
+
+
+def archived_days(root: str = ARCHIVE_DIR) -> list[date]:
+    """Days whose events live in the archive, oldest first."""
+    try:
+        with open(os.path.join(root, MANIFEST_FILE)) as f:
+            return sorted(date.fromisoformat(day) for day in json.load(f)["days"])
+    except FileNotFoundError:
+        return []
+
+
+def has_archived_events(user_id: str, root: str = ARCHIVE_DIR) -> bool:
+    """Whether any of the user's events are in an archived day's file."""
+    directory = user_dir(user_id, root)
+    if not os.path.isdir(directory):
+        return False
+    return any(os.path.exists(day_file(user_id, day, root)) for day in archived_days(root))
+
+
+def read_plan(root: str = ARCHIVE_DIR) -> list[tuple]:
+    """
+    The order to read a user's events in, oldest first: runs of archived
+    days, ("archive", [days]), and between them the spans of received_at
+    to read from the table, ("table", since, until) with None for
+    unbounded. Only the days in the manifest are skipped in the table,
+    so rows of any other day still come from there, in their place:
+    pre-partitioning history in the DEFAULT partition, or a day whose
+    export failed.
+    """
+    plan, since, run = [], None, []
+    for day in archived_days(root):
+        if run and day == run[-1] + timedelta(days=1):
+            run.append(day)
+            continue
+        if run:
+            plan.append(("archive", run))
+            since = _midnight(run[-1] + timedelta(days=1))
+        plan.append(("table", since, _midnight(day)))
+        run = [day]
+    if run:
+        plan.append(("archive", run))
+        since = _midnight(run[-1] + timedelta(days=1))
+    plan.append(("table", since, None))
+    return plan
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+def _write_manifest(days: list[date], root: str) -> None:
+    path = os.path.join(root, MANIFEST_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"days": [day.isoformat() for day in sorted(days)]}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def partitions_to_archive(conn, older_than_days: int = ARCHIVE_AFTER_DAYS, root: str = ARCHIVE_DIR) -> list[tuple[str, date]]:
+    """(partition, day) of every aged partition not archived yet, oldest first."""
+    cutoff = date.today() - timedelta(days=older_than_days)
+    done = set(archived_days(root))
+    due = []
+    for name in partitions.list_partitions(conn):
+        day = partitions.partition_day(name)
+        if day is not None and day <= cutoff and day not in done:
+            due.append((name, day))
+    return sorted(due, key=lambda item: item[1])
+
+
+def export_partition(conn, name: str, day: date, root: str = ARCHIVE_DIR, chunk_size: int = 50000) -> dict:
+    """
+    Writes one daily partition out as per-user Parquet files. Each file
+    is sorted by (event_type, timestamp) with one row group per event
+    type, so readers filtering on event_type skip the other row groups.
+    Events without a user_id are not exported.
+    Returns {"users", "rows", "bytes"}.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _schema()
+    result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(text(
+        f'SELECT user_id, {", ".join(ARCHIVE_COLUMNS)} FROM "{name}" '
+        f"WHERE user_id IS NOT NULL ORDER BY user_id, event_type, timestamp"
+    ))
+
+    stats = {"users": 0, "rows": 0, "bytes": 0}
+    writer, current, path = None, None, None
+
+    def close():
+        if writer is not None:
+            writer.close()
+            os.replace(path + ".tmp", path)
+            stats["bytes"] += os.path.getsize(path)
+
+    for rows in result.partitions():
+        for (user_id, event_type), group in itertools.groupby(rows, key=lambda row: (row[0], row[1])):
+            if user_id != current:
+                close()
+                current, path = user_id, day_file(user_id, day, root)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                writer = pq.ParquetWriter(path + ".tmp", schema, compression="zstd",
+                                          use_dictionary=["event_type", "key"])
+                stats["users"] += 1
+            columns = list(zip(*group))[1:]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            ))
+            stats["rows"] += len(columns[0])
+    close()
+    return stats
+
+
+def archive_aged_partitions(engine, older_than_days: int = ARCHIVE_AFTER_DAYS, drop: bool = True,
+                            root: str = ARCHIVE_DIR) -> list[str]:
+    """
+    Exports every aged partition, oldest first, records its day in the
+    manifest and (with 'drop') drops it. Stops at the first failure, so
+    the archived days stay contiguous. Returns the exported partitions.
+    """
+    os.makedirs(root, exist_ok=True)
+    with engine.connect() as conn:
+        due = partitions_to_archive(conn, older_than_days, root)
+
+    exported = []
+    for name, day in due:
+        try:
+            with engine.connect() as conn:
+                stats = export_partition(conn, name, day, root)
+            # Readers switch this day over to the archive from here on
+            _write_manifest(archived_days(root) + [day], root)
+            logger.info(f"Archived {name}: {stats['rows']} events of {stats['users']} users, "
+                        f"{stats['bytes'] / 1e6:.1f} MB of Parquet.")
+            exported.append(name)
+        except Exception as e:
+            logger.error(f"Could not archive {name}: {e}")
+            break
+
+        if drop:
+            with engine.begin() as conn:
+                partitions.drop_partition(conn, name)
+            logger.info(f"Dropped archived partition {name}.")
+    return exported
+
+
+def _iter_archived_batches(user_id: str, columns: list[str], event_types: tuple, chunk_size: int, root: str,
+                           days=None):
+    """The user's archived record batches, day by day (of 'days', default all archived), in file order."""
+    directory = user_dir(user_id, root)
+    if not os.path.isdir(directory):
+        return
+    days = set(archived_days(root) if days is None else days)
+    files = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.startswith("day=") and filename.endswith(".parquet"):
+            if date.fromisoformat(filename[4:-8]) in days:
+                files.append(os.path.join(directory, filename))
+    if not files:
+        return
+
+    import pyarrow.dataset as ds
+
+    for path in files:
+        dataset = ds.dataset(path, format="parquet")
+        batches = dataset.to_batches(columns=columns, filter=ds.field("event_type").isin(list(event_types)),
+                                     batch_size=chunk_size)
+        for batch in batches:
+            if batch.num_rows:
+                yield batch
+
+
+def iter_archived_mousemoves(user_id: str, chunk_size: int = 50000, root: str = ARCHIVE_DIR, days=None):
+    """
+    Streams a user's archived mouse movements (of 'days', default all
+    archived ones), day by day, as
+    (timestamps, x, y) float64 arrays like iter_mousemove_chunks().
+    Only the three columns are read, and the event_type filter is pushed
+    down to the files, so keystroke and click row groups are skipped.
+    """
+    import pyarrow as pa
+
+    for batch in _iter_archived_batches(user_id, ["timestamp", "x", "y"], ("mousemove",), chunk_size, root, days):
+        # Missing x/y come through as NaN, as from the database
+        yield tuple(column.cast(pa.float64()).to_numpy(zero_copy_only=False) for column in batch.columns)
+
+
+def iter_archived_keystrokes(user_id: str, chunk_size: int = 50000, root: str = ARCHIVE_DIR, days=None):
+    """
+    Streams a user's archived keydowns and clicks (of 'days', default
+    all archived ones), day by day, as
+    (event_types, timestamps, keys) arrays like iter_keystroke_chunks().
+    A file holds all of a day's clicks after its keydowns; each kind is
+    in time order, which is all the keystroke features need.
+    """
+    import pyarrow as pa
+
+    for batch in _iter_archived_batches(user_id, ["event_type", "timestamp", "key"], ("keydown", "click"),
+                                        chunk_size, root, days):
+        yield (
+            batch.column(0).to_numpy(zero_copy_only=False),
+            batch.column(1).cast(pa.float64()).to_numpy(zero_copy_only=False),
+            batch.column(2).to_numpy(zero_copy_only=False),
+        )
@@ -1,6 +1,8 @@
 import os
+import threading
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -13,15 +15,125 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 
-# This is the connection string, like in Django's settings
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# This is the connection string, like in Django's settings.
+# DATABASE_URL, if set, replaces it (any SQLAlchemy URL, e.g. a local
+# SQLite file for the benchmarks).
+SQLALCHEMY_DATABASE_URL = (
+    os.getenv("DATABASE_URL")
+    or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
 
-# The "engine" is the main connection point
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# --- Connection Pool Config (from .env) ---
+# Connections kept open per engine (per process), and how many more
+# may be opened under load before callers wait up to DB_POOL_TIMEOUT s
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Test connections before handing them out, and replace them after this
+# many seconds, so restarts/failovers don't surface as request errors
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Prepared statements asyncpg caches per connection. Set 0 behind
+# PgBouncer in transaction mode, which can't keep them.
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+# Engines are created on first use, not at import, so importing 'core'
+# (or a module that imports a model) never needs a reachable database
+_engine = None
+_async_engine = None
+_session_factory = None
+_async_session_factory = None
+_lock = threading.Lock()
+
+
+def _pool_options(url) -> dict:
+    if url.get_backend_name() == "sqlite":
+        # SQLite has no server to pool connections to
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def async_database_url(url: str = SQLALCHEMY_DATABASE_URL):
+    """The same database, through an asyncio driver (asyncpg / aiosqlite)."""
+    url = make_url(url)
+    if url.get_backend_name() == "postgresql":
+        return url.set(drivername="postgresql+asyncpg")
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+
+def get_engine():
+    """The process's synchronous engine, created on first call."""
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                url = make_url(SQLALCHEMY_DATABASE_URL)
+                _engine = create_engine(url, **_pool_options(url))
+    return _engine
+
+
+def get_async_engine():
+    """
+    The process's asyncio engine, created on first call. Use it from
+    async code (FastAPI handlers), so a DB round trip never blocks
+    the event loop.
+    """
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        with _lock:
+            if _async_engine is None:
+                url = async_database_url()
+                options = _pool_options(url)
+                if url.drivername == "postgresql+asyncpg":
+                    options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+                _async_engine = create_async_engine(url, **options)
+    return _async_engine
+
+
+def SessionLocal():
+    """A new (synchronous) Session bound to the engine."""
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+    return _session_factory()
+
+
+def AsyncSessionLocal():
+    """A new AsyncSession, for 'async with AsyncSessionLocal() as session:'."""
+    global _async_session_factory
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        _async_session_factory = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return _async_session_factory()
+
+
+async def dispose_async_engine() -> None:
+    """Closes the async engine's pooled connections (on shutdown)."""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_session_factory = None
+
+
+def __getattr__(name):
+    # 'from core.database import engine' keeps working, lazily
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# This creates a "Session" class, which we will use
-# to interact with the database in our logger.
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # This is the base class our models will inherit from
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
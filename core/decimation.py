@@ -0,0 +1,185 @@
+import os
+import math
+from collections import Counter
+
+# How a connection's mousemoves are thinned out before publishing
+DECIMATION_MODES = ("off", "throttle", "distance", "rdp")
+
+# --- Decimation Config (from .env) ---
+# Mousemoves are most of what gets published and stored, and many are
+# redundant points along a nearly straight path. INGEST_DECIMATION
+# (off, throttle, distance or rdp) thins them out per connection in the
+# ingestor before they are queued; keydowns and clicks are never touched.
+# Models are trained on the stored events, so the risk engine puts the
+# windows sent to /model/predict through the same policy before scoring
+# them. Both services must read the same settings; retrain models after
+# switching them.
+INGEST_DECIMATION = os.getenv("INGEST_DECIMATION", "off").lower()
+INGEST_DECIMATION_INTERVAL_MS = float(os.getenv("INGEST_DECIMATION_INTERVAL_MS", "33"))
+INGEST_DECIMATION_MIN_DISTANCE_PX = float(os.getenv("INGEST_DECIMATION_MIN_DISTANCE_PX", "4"))
+INGEST_DECIMATION_TOLERANCE_PX = float(os.getenv("INGEST_DECIMATION_TOLERANCE_PX", "1"))
+
+# The frontend sends at most this many events per WebSocket frame. rdp
+# simplifies one frame at a time, so windows decimated after the fact
+# are cut into frames of this size too.
+FRAME_EVENTS = 20
+
+
+class MouseDecimator:
+    """
+    Drops redundant mousemoves from one connection's frames before they
+    are queued, so fewer of them are published and stored. Keydowns,
+    clicks and anything else always pass through untouched, in order.
+
+    One per connection (it remembers the last mousemove it kept):
+    - throttle: keeps a mousemove only if it is at least 'interval_ms'
+      after the last kept one
+    - distance: keeps a mousemove only if it is at least
+      'min_distance_px' away from the last kept one
+    - rdp: simplifies each frame's path (Ramer-Douglas-Peucker, starting
+      from the last point kept before it): keeps the points the path
+      strays more than 'tolerance_px' from a straight line without, and
+      the frame's last point
+    Mousemoves without numeric coordinates (or, for throttle, timestamp)
+    are kept as they are.
+
+    Counts go into 'totals' (shared by all connections):
+    "mousemoves" received and "dropped".
+    """
+
+    def __init__(self, mode: str = "off", interval_ms: float = 33, min_distance_px: float = 4,
+                 tolerance_px: float = 1, totals: Counter | None = None):
+        if mode not in DECIMATION_MODES:
+            raise ValueError(f"Unknown decimation mode {mode!r}, expected one of {DECIMATION_MODES}")
+        self.mode = mode
+        self.interval_ms = interval_ms
+        self.min_distance_px = min_distance_px
+        self.tolerance_px = tolerance_px
+        self.totals = totals if totals is not None else Counter()
+
+        self._last_ts = None
+        self._last_point = None
+
+    def filter(self, events: list[dict]) -> list[dict]:
+        """The frame's events without the dropped mousemoves."""
+        if self.mode == "off":
+            return events
+        if self.mode == "rdp":
+            kept = self._simplify(events)
+        else:
+            keep = self._keep_after_interval if self.mode == "throttle" else self._keep_after_distance
+            kept = [event for event in events if event.get('type') != 'mousemove' or keep(event)]
+
+        self.totals["mousemoves"] += sum(1 for event in events if event.get('type') == 'mousemove')
+        self.totals["dropped"] += len(events) - len(kept)
+        return kept
+
+    def _keep_after_interval(self, event: dict) -> bool:
+        ts = event.get('timestamp')
+        if not _is_number(ts):
+            return True
+        if self._last_ts is not None and ts - self._last_ts < self.interval_ms:
+            return False
+        self._last_ts = ts
+        return True
+
+    def _keep_after_distance(self, event: dict) -> bool:
+        point = _point(event)
+        if point is None:
+            return True
+        if self._last_point is not None and math.dist(point, self._last_point) < self.min_distance_px:
+            return False
+        self._last_point = point
+        return True
+
+    def _simplify(self, events: list[dict]) -> list[dict]:
+        positions, points = [], []
+        for i, event in enumerate(events):
+            if event.get('type') == 'mousemove':
+                point = _point(event)
+                if point is not None:
+                    positions.append(i)
+                    points.append(point)
+        if not points:
+            return events
+
+        # The last point kept from earlier frames anchors this one's path
+        anchored = self._last_point is not None
+        keep = simplify_path(([self._last_point] if anchored else []) + points, self.tolerance_px)
+        if anchored:
+            keep = keep[1:]
+        self._last_point = points[-1]
+
+        dropped = {position for position, kept in zip(positions, keep) if not kept}
+        if not dropped:
+            return events
+        return [event for i, event in enumerate(events) if i not in dropped]
+
+
+def new_decimator(totals: Counter | None = None, **settings) -> MouseDecimator:
+    """
+    A decimator with the configured INGEST_DECIMATION settings (any of
+    them replaced by 'settings', e.g. mode="rdp").
+    """
+    return MouseDecimator(**{
+        "mode": INGEST_DECIMATION,
+        "interval_ms": INGEST_DECIMATION_INTERVAL_MS,
+        "min_distance_px": INGEST_DECIMATION_MIN_DISTANCE_PX,
+        "tolerance_px": INGEST_DECIMATION_TOLERANCE_PX,
+        **settings,
+    }, totals=totals)
+
+
+def decimate(events: list[dict], decimator: MouseDecimator, frame_size: int = FRAME_EVENTS) -> list[dict]:
+    """A whole run of events through 'decimator', in frames like a connection's."""
+    if decimator.mode == "off":
+        return events
+    kept = []
+    for i in range(0, len(events), frame_size):
+        kept.extend(decimator.filter(events[i:i + frame_size]))
+    return kept
+
+
+def simplify_path(points: list[tuple[float, float]], tolerance: float) -> list[bool]:
+    """
+    Ramer-Douglas-Peucker: which points of a path to keep so that none of
+    the dropped ones is more than 'tolerance' from the simplified path.
+    The first and last points are always kept.
+    """
+    n = len(points)
+    keep = [True] * n
+    if n < 3:
+        return keep
+    keep[1:-1] = [False] * (n - 2)
+
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x0, y0), (x1, y1) = points[first], points[last]
+        dx, dy = x1 - x0, y1 - y0
+        length = math.hypot(dx, dy)
+        farthest, index = -1.0, -1
+        for i in range(first + 1, last):
+            x, y = points[i]
+            # Distance to the line through both ends (to the point, if they coincide)
+            distance = abs(dy * (x - x0) - dx * (y - y0)) / length if length else math.hypot(x - x0, y - y0)
+            if distance > farthest:
+                farthest, index = distance, i
+        if farthest > tolerance:
+            keep[index] = True
+            if index - first > 1:
+                stack.append((first, index))
+            if last - index > 1:
+                stack.append((index, last))
+    return keep
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _point(event: dict) -> tuple[float, float] | None:
+    x, y = event.get('x'), event.get('y')
+    if _is_number(x) and _is_number(y):
+        return (x, y)
+    return None
@@ -0,0 +1,191 @@
+import os
+import json
+import itertools
+
+import msgpack
+
+from core.stream import DATA_FIELD
+
+# --- Codec Config (from .env) ---
+# How the ingestor encodes events on the behavioral stream:
+# - msgpack (default): one entry per user per publish batch, in the
+#   compact columnar format below
+# - json: one JSON object per entry, the original format. Use it while
+#   consumers that only read JSON are still running; every current
+#   consumer reads both.
+STREAM_ENCODING = os.getenv("STREAM_ENCODING", "msgpack").lower()
+
+# Version 1 of the compact format is a msgpack array:
+#   [1, user_id, first_ts, extra_types, types, ts_deltas, x_deltas, y_deltas, keys, extras]
+# - types: an event-type code per event; codes below len(EVENT_TYPES)
+#   are EVENT_TYPES, higher ones index 'extra_types' (other type names,
+#   spelled out once per entry)
+# - ts_deltas: timestamp differences to the previous event (n - 1 of them)
+# - x_deltas / y_deltas: differences to the previous event that has one,
+#   nil for events without; the whole column is nil if no event has one
+# - keys: the key per event (nil for none); nil if no event has one
+# - extras: any other fields, a map (or nil) per event; usually nil
+# Deltas of integer milliseconds and pixels are mostly 1-byte integers.
+FORMAT_VERSION = 1
+EVENT_TYPES = ("mousemove", "keydown", "click")
+_TYPE_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+
+# Fields with a column of their own; the rest go into 'extras'
+_COLUMN_FIELDS = frozenset(("type", "timestamp", "x", "y", "key", "user_id"))
+
+# Clients with decode_responses=False return field names as bytes
+_DATA_FIELD_BYTES = DATA_FIELD.encode()
+
+
+def encode_entries(user_id: str | None, events: list[dict], encoding: str = STREAM_ENCODING) -> list:
+    """
+    The stream entry payloads for a batch of one user's events, in order.
+    One compact entry for all of them, or (with encoding="json", or if
+    an event doesn't fit the compact format, e.g. a float timestamp)
+    one JSON entry per event.
+    """
+    if encoding == "msgpack" and events:
+        payload = encode_batch(user_id, events)
+        if payload is not None:
+            return [payload]
+    return [json.dumps(event) for event in events]
+
+
+def encode_batch(user_id: str | None, events: list[dict]) -> bytes | None:
+    """One user's events in the compact format, or None if they don't all fit it."""
+    n = len(events)
+    types, extra_types = [], []
+    timestamps = []
+    x, y, keys = [None] * n, [None] * n, [None] * n
+    extras = None
+    has_xy = has_key = False
+
+    for i, event in enumerate(events):
+        event_type = event.get('type')
+        code = _TYPE_CODES.get(event_type)
+        if code is None:
+            if not isinstance(event_type, str):
+                return None
+            if event_type not in extra_types:
+                extra_types.append(event_type)
+            code = len(EVENT_TYPES) + extra_types.index(event_type)
+        types.append(code)
+
+        ts = event.get('timestamp')
+        if type(ts) is not int:
+            return None
+        timestamps.append(ts)
+
+        px, py = event.get('x'), event.get('y')
+        if px is not None or py is not None:
+            if type(px) is not int or type(py) is not int:
+                return None
+            x[i], y[i] = px, py
+            has_xy = True
+
+        key = event.get('key')
+        if key is not None:
+            if not isinstance(key, str):
+                return None
+            keys[i] = key
+            has_key = True
+
+        other = event.keys() - _COLUMN_FIELDS
+        if other:
+            if extras is None:
+                extras = [None] * n
+            extras[i] = {k: event[k] for k in other}
+
+    try:
+        return msgpack.packb([
+            FORMAT_VERSION, user_id, timestamps[0], extra_types, types,
+            [b - a for a, b in zip(timestamps, timestamps[1:])],
+            _deltas(x) if has_xy else None,
+            _deltas(y) if has_xy else None,
+            keys if has_key else None,
+            extras,
+        ])
+    except (TypeError, ValueError, OverflowError):
+        # Something in 'extras' msgpack can't encode
+        return None
+
+
+def decode_fields(fields: dict) -> list[dict]:
+    """The events of one stream entry, from its fields (str or bytes keys)."""
+    data = fields.get(DATA_FIELD)
+    if data is None:
+        data = fields.get(_DATA_FIELD_BYTES)
+    return decode(data)
+
+
+def decode(data: bytes | str) -> list[dict]:
+    """
+    The events of one stream entry's payload, in either format.
+    Events decoded from the compact format have every column field
+    (type, timestamp, x, y, key, user_id), None where it was absent.
+    Raises ValueError for anything that isn't a valid entry.
+    """
+    if data is None:
+        raise ValueError("stream entry has no data")
+    if isinstance(data, str) or data[:1] in (b"{", b"["):
+        # The original format: one JSON event (or a list of them)
+        try:
+            payload = json.loads(data)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ValueError(f"invalid JSON entry: {e}") from None
+        events = payload if isinstance(payload, list) else [payload]
+        if not all(isinstance(event, dict) for event in events):
+            raise ValueError("JSON entry is not an event object")
+        return events
+
+    try:
+        version, user_id, first_ts, extra_types, types, ts_deltas, x_deltas, y_deltas, keys, extras = (
+            msgpack.unpackb(data, use_list=True)
+        )
+    except (ValueError, TypeError, msgpack.UnpackException) as e:
+        raise ValueError(f"invalid compact entry: {e}") from None
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unsupported stream entry version {version}")
+
+    try:
+        n = len(types)
+        names = EVENT_TYPES + tuple(extra_types)
+        timestamps = itertools.accumulate(ts_deltas, initial=first_ts)
+        x = _undelta(x_deltas) if x_deltas is not None else itertools.repeat(None, n)
+        y = _undelta(y_deltas) if y_deltas is not None else itertools.repeat(None, n)
+        keys = keys if keys is not None else itertools.repeat(None, n)
+
+        events = [
+            {"type": names[code], "timestamp": ts, "x": px, "y": py, "key": key, "user_id": user_id}
+            for code, ts, px, py, key in zip(types, timestamps, x, y, keys)
+        ]
+        if extras is not None:
+            for event, extra in zip(events, extras):
+                if extra:
+                    event.update(extra)
+    except (IndexError, TypeError, ValueError) as e:
+        raise ValueError(f"invalid compact entry: {e}") from None
+    return events
+
+
+def _deltas(values: list) -> list:
+    """Differences to the previous non-None value; None stays None."""
+    out, last = [], 0
+    for value in values:
+        if value is None:
+            out.append(None)
+        else:
+            out.append(value - last)
+            last = value
+    return out
+
+
+def _undelta(deltas: list) -> list:
+    out, last = [], 0
+    for delta in deltas:
+        if delta is None:
+            out.append(None)
+        else:
+            last += delta
+            out.append(last)
+    return out
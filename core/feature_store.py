@@ -0,0 +1,576 @@
+import os
+import time
+import logging
+
+import numpy as np
+from sqlalchemy import select, insert, update, delete, tuple_, bindparam, false, func, or_
+
+from core import archive
+from core.models.BehavioralEvent import BehavioralEvent
+from core.models.UserFeatureState import UserFeatureState
+from core.models.UserFeatureWindow import UserFeatureWindow
+from core.features import (
+    WINDOW_SIZE, FEATURE_COLUMNS, SUM_COLUMNS,
+    event_deltas, window_sums, merge_window_sums, features_from_sums
+)
+
+logger = logging.getLogger(__name__)
+
+# --- Feature Store Config (from .env) ---
+# Mouse movements are held back this long (by event timestamp) before they
+# are folded into windows, so events that arrive slightly out of order are
+# still applied in time order. Anything later than that triggers a rebuild.
+FEATURE_STORE_LATENESS_MS = int(os.getenv("FEATURE_STORE_LATENESS_MS", "2000"))
+
+# How many users the logger rebuilds from raw events per maintenance pass
+FEATURE_STORE_REBUILD_BATCH = int(os.getenv("FEATURE_STORE_REBUILD_BATCH", "1"))
+
+STATE = UserFeatureState.__table__
+WINDOWS = UserFeatureWindow.__table__
+EVENTS = BehavioralEvent.__table__
+
+
+def iter_mousemove_chunks(engine, user_id: str, chunk_size: int = 50000):
+    """
+    Streams a user's mouse movements in time order as
+    (timestamps, x, y) float64 arrays of at most 'chunk_size' rows.
+
+    Only the three columns the features need are selected, and rows
+    come from a server-side cursor, so the full history is never
+    held in memory at once. Missing x/y come through as NaN.
+
+    Days already moved to the Parquet archive (core/archive.py) are
+    read from there, in their place among the rows still in the table.
+    """
+    query = (
+        select(BehavioralEvent.timestamp, BehavioralEvent.x, BehavioralEvent.y)
+        .where(
+            BehavioralEvent.user_id == user_id,
+            BehavioralEvent.event_type == 'mousemove'
+        )
+        .order_by(BehavioralEvent.timestamp)
+    )
+    for source, rows in _iter_sources(engine, query, archive.iter_archived_mousemoves, user_id, chunk_size):
+        if source == "archive":
+            yield rows
+        else:
+            # Plain tuples: numpy probes Row objects key by key otherwise
+            chunk = np.array([tuple(row) for row in rows], dtype=np.float64).reshape(-1, 3)
+            yield chunk[:, 0], chunk[:, 1], chunk[:, 2]
+
+
+def iter_keystroke_chunks(engine, user_id: str, chunk_size: int = 50000):
+    """
+    Streams a user's keydowns and clicks in time order as
+    (event_types, timestamps, keys) arrays of at most 'chunk_size' rows,
+    archived days in their place, like iter_mousemove_chunks().
+    """
+    query = (
+        select(BehavioralEvent.event_type, BehavioralEvent.timestamp, BehavioralEvent.key)
+        .where(
+            BehavioralEvent.user_id == user_id,
+            BehavioralEvent.event_type.in_(('keydown', 'click'))
+        )
+        .order_by(BehavioralEvent.timestamp)
+    )
+    for source, rows in _iter_sources(engine, query, archive.iter_archived_keystrokes, user_id, chunk_size):
+        if source == "archive":
+            yield rows
+        else:
+            event_types, timestamps, keys = zip(*rows)
+            yield (np.array(event_types, dtype=object), np.array(timestamps, dtype=np.float64),
+                   np.array(keys, dtype=object))
+
+
+def _iter_sources(engine, query, iter_archived, user_id: str, chunk_size: int):
+    """
+    ("archive", chunk) and ("table", rows) in archive.read_plan() order:
+    each run of archived days from the Parquet files, and the table's
+    rows of the received_at spans around them.
+    """
+    for step in archive.read_plan():
+        if step[0] == "archive":
+            for chunk in iter_archived(user_id, chunk_size, days=step[1]):
+                yield "archive", chunk
+            continue
+
+        _, since, until = step
+        span = query
+        if since is not None:
+            span = span.where(BehavioralEvent.received_at >= since)
+        if until is not None:
+            span = span.where(BehavioralEvent.received_at < until)
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(span)
+            for rows in result.partitions():
+                yield "table", rows
+
+
+def fold_events(n_events: int, last_event, open_sums, timestamps, x, y, window: int = WINDOW_SIZE):
+    """
+    Extends a user's windows with new events (sorted by time, none
+    earlier than 'last_event'). 'open_sums' are the totals of the open
+    (partial) window, or None if the last window is complete.
+
+    Returns (window_indexes, sums, first_ts, last_ts) for every window
+    the events touched. The first one already includes 'open_sums'
+    when it continues the open window.
+    """
+    if last_event is None:
+        deltas = event_deltas(timestamps, x, y)
+    else:
+        # Prepend the last applied event, then drop its delta
+        last_ts, last_x, last_y = last_event
+        deltas = event_deltas(
+            np.concatenate(([last_ts], timestamps)),
+            np.concatenate(([last_x], x)),
+            np.concatenate(([last_y], y))
+        )
+        deltas = tuple(values[1:] for values in deltas)
+
+    positions = n_events + np.arange(len(timestamps))
+    window_indexes, sums = window_sums(*deltas, positions // window)
+
+    bounds = np.append(np.searchsorted(positions // window, window_indexes), len(timestamps))
+    first_ts = timestamps[bounds[:-1]]
+    last_ts = timestamps[bounds[1:] - 1]
+
+    if open_sums is not None:
+        sums[0] = merge_window_sums(open_sums, sums[0])
+    return window_indexes, sums, first_ts, last_ts
+
+
+def _window_rows(user_id, window_indexes, sums, first_ts, last_ts) -> list[dict]:
+    rows = []
+    for index, totals, first, last in zip(window_indexes, sums, first_ts, last_ts):
+        row = {"user_id": user_id, "window_index": int(index), "first_ts": int(first), "last_ts": int(last)}
+        row.update(zip(SUM_COLUMNS, totals.tolist()))
+        row["event_count"] = int(row["event_count"])
+        row["dt_count"] = int(row["dt_count"])
+        rows.append(row)
+    return rows
+
+
+def _count_at_last(timestamps, last_ts, last_ts_count: int) -> int:
+    """
+    How many events have the last timestamp once sorted 'timestamps'
+    follow a state whose last 'last_ts_count' events were at 'last_ts'.
+    """
+    count = len(timestamps) - int(np.searchsorted(timestamps, timestamps[-1], side='left'))
+    if count == len(timestamps) and last_ts is not None and timestamps[-1] == last_ts:
+        count += last_ts_count
+    return count
+
+
+def _coordinate(value: float) -> float | None:
+    return None if np.isnan(value) else float(value)
+
+
+def load_features(engine, user_id: str, sampler=None,
+                  chunk_size: int = 50000) -> tuple[np.ndarray, int, np.ndarray] | None:
+    """
+    Reads a user's precomputed feature rows. Returns (features, n_events,
+    window_starts), or None when the store has nothing trustworthy for
+    the user, in which case the caller should compute features from raw
+    events instead. 'window_starts' are the windows' first timestamps
+    (of every window, also with a sampler).
+
+    Rows are read 'chunk_size' at a time. With a 'sampler' (anything
+    with add(rows, times) and sample(), e.g. the risk engine's
+    RowSampler) each chunk goes to it and only its sample is returned.
+    """
+    parts, starts, n_events = [], [], 0
+    with engine.connect() as conn:
+        state = conn.execute(
+            select(STATE.c.needs_rebuild).where(STATE.c.user_id == user_id)
+        ).first()
+        if state is None or state.needs_rebuild:
+            return None
+
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(
+            select(WINDOWS.c.first_ts, *(WINDOWS.c[column] for column in SUM_COLUMNS))
+            .where(WINDOWS.c.user_id == user_id)
+            .order_by(WINDOWS.c.window_index)
+        )
+        for chunk in result.partitions():
+            rows = np.array([tuple(row) for row in chunk], dtype=np.float64).reshape(-1, len(SUM_COLUMNS) + 1)
+            features = features_from_sums(rows[:, 1:])
+            n_events += int(rows[:, 1].sum())
+            starts.append(rows[:, 0])
+            if sampler is None:
+                parts.append(features)
+            else:
+                sampler.add(features, rows[:, 0])
+
+    starts = np.concatenate(starts) if starts else np.empty(0)
+    if sampler is not None:
+        return sampler.sample(), n_events, starts
+    return (np.vstack(parts) if parts else np.empty((0, len(FEATURE_COLUMNS)))), n_events, starts
+
+
+def mark_for_rebuild(conn, user_ids) -> None:
+    """Flags users whose windows must be recomputed from raw events."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    existing = set(conn.execute(select(STATE.c.user_id).where(STATE.c.user_id.in_(user_ids))).scalars())
+    if existing:
+        conn.execute(update(STATE).where(STATE.c.user_id.in_(existing)).values(needs_rebuild=True))
+    missing = [user_id for user_id in user_ids if user_id not in existing]
+    if missing:
+        conn.execute(insert(STATE), [{"user_id": user_id, "n_events": 0, "needs_rebuild": True} for user_id in missing])
+
+
+def rebuild_user(engine, user_id: str, chunk_size: int = 50000) -> int:
+    """
+    Recomputes a user's windows from their raw events and replaces the
+    stored ones. Returns the number of events folded in.
+
+    Only the process that feeds the store (the event logger) should call
+    this while it is running, otherwise events it still buffers for the
+    user could be counted twice.
+    """
+    n_events, last_event, last_ts_count, rows = 0, None, 0, []
+    for timestamps, x, y in iter_mousemove_chunks(engine, user_id, chunk_size):
+        open_sums = None
+        if n_events % WINDOW_SIZE:
+            # The last row so far is the open window; this chunk continues it
+            open_row = rows.pop()
+            open_sums = np.array([open_row[column] for column in SUM_COLUMNS], dtype=np.float64)
+        window_indexes, sums, first_ts, last_ts = fold_events(n_events, last_event, open_sums, timestamps, x, y)
+        if open_sums is not None:
+            first_ts[0] = open_row["first_ts"]
+        rows.extend(_window_rows(user_id, window_indexes, sums, first_ts, last_ts))
+        n_events += len(timestamps)
+        last_ts_count = _count_at_last(timestamps, None if last_event is None else last_event[0], last_ts_count)
+        last_event = (timestamps[-1], x[-1], y[-1])
+
+    state = {"n_events": n_events, "needs_rebuild": False, "last_ts": None, "last_x": None, "last_y": None,
+             "last_ts_count": 0}
+    if last_event is not None:
+        state.update(last_ts=int(last_event[0]), last_x=_coordinate(last_event[1]), last_y=_coordinate(last_event[2]),
+                     last_ts_count=last_ts_count)
+
+    with engine.begin() as conn:
+        locked = conn.execute(
+            select(STATE.c.user_id).where(STATE.c.user_id == user_id).with_for_update()
+        ).first()
+        if locked is None:
+            conn.execute(insert(STATE).values(user_id=user_id, **state))
+        else:
+            conn.execute(update(STATE).where(STATE.c.user_id == user_id).values(**state))
+        conn.execute(delete(WINDOWS).where(WINDOWS.c.user_id == user_id))
+        if rows:
+            conn.execute(insert(WINDOWS), rows)
+
+    logger.info(f"Rebuilt {len(rows)} feature windows from {n_events} events for {user_id}.")
+    return n_events
+
+
+class FeatureStoreUpdater:
+    """
+    Folds committed mouse movements into the per-user window totals
+    (user_feature_windows), so training never has to re-scan raw events.
+
+    - Events are buffered per user and released in time order once they
+      are 'lateness_ms' older than the newest event seen for that user,
+      or once the user has been quiet for that long.
+    - A window that straddles two batches is continued from the stored
+      state (last event + open window), in the same transaction that
+      stores the new windows.
+    - An event older than what was already applied can't be placed any
+      more: the user is flagged and later rebuilt from raw events, which
+      are the source of truth. Training falls back to them meanwhile.
+
+    A user's windows must only ever be written by one updater. When the
+    stream is sharded across logger workers, 'owns' (a predicate on
+    user_id) limits catch-up and rebuilds to the worker's own users.
+    """
+
+    def __init__(self, engine, lateness_ms: int = FEATURE_STORE_LATENESS_MS,
+                 rebuild_batch: int = FEATURE_STORE_REBUILD_BATCH, rebuild_interval: float = 5.0, owns=None):
+        self.engine = engine
+        self.lateness_ms = lateness_ms
+        self.rebuild_batch = rebuild_batch
+        self.rebuild_interval = rebuild_interval
+        self.owns = owns
+
+        # user_id -> list of (timestamp, x, y) not applied yet
+        self._pending: dict[str, list[tuple]] = {}
+        self._last_arrival: dict[str, float] = {}
+        self._next_rebuild_at = 0.0
+
+        # Running totals, for the logs
+        self.events_applied = 0
+        self.windows_written = 0
+        self.late_events = 0
+        self.rebuilds = 0
+
+    def add(self, rows: list[dict]) -> None:
+        """Buffers the mouse movements among rows that were just committed."""
+        now = time.monotonic()
+        for row in rows:
+            user_id, timestamp = row.get('user_id'), row.get('timestamp')
+            if row.get('event_type') != 'mousemove' or user_id is None or timestamp is None:
+                continue
+            x, y = row.get('x'), row.get('y')
+            self._pending.setdefault(user_id, []).append((
+                timestamp,
+                np.nan if x is None else x,
+                np.nan if y is None else y
+            ))
+            self._last_arrival[user_id] = now
+
+    def seconds_until_due(self) -> float | None:
+        """How long until some quiet user's buffered events are due."""
+        if not self._last_arrival:
+            return None
+        elapsed = time.monotonic() - max(self._last_arrival.values())
+        return max(0.0, self.lateness_ms / 1000.0 - elapsed)
+
+    def apply_due(self) -> int:
+        """
+        Applies every event that is past its lateness allowance, and
+        rebuilds a few flagged users now and then.
+        Returns the number of events applied.
+        """
+        now = time.monotonic()
+        released = {}
+        for user_id in list(self._pending):
+            quiet = now - self._last_arrival[user_id] >= self.lateness_ms / 1000.0
+            events = self._take(user_id, None if quiet else self.lateness_ms)
+            if events is not None:
+                released[user_id] = events
+
+        applied = self._apply(released)
+
+        if self.rebuild_batch > 0 and now >= self._next_rebuild_at:
+            self._next_rebuild_at = now + self.rebuild_interval
+            self.rebuild_flagged(self.rebuild_batch)
+        return applied
+
+    def apply_all(self) -> int:
+        """Applies everything still buffered (on shutdown)."""
+        released = {user_id: self._take(user_id, None) for user_id in list(self._pending)}
+        return self._apply({user_id: events for user_id, events in released.items() if events is not None})
+
+    def catch_up(self, chunk_size: int = 50000) -> int:
+        """
+        Re-buffers committed events that were never applied, e.g.
+        because the previous logger process died while holding them.
+        Call once at start-up, before consuming new entries.
+        """
+        # Events at last_ts may or may not have been applied: the first
+        # last_ts_count of them (by id, i.e. insertion order) were
+        ranked = (
+            select(
+                EVENTS.c.user_id, EVENTS.c.timestamp, EVENTS.c.x, EVENTS.c.y,
+                func.row_number().over(partition_by=(EVENTS.c.user_id, EVENTS.c.timestamp), order_by=EVENTS.c.id)
+                .label("nth")
+            )
+            .join(STATE, STATE.c.user_id == EVENTS.c.user_id)
+            .where(
+                EVENTS.c.event_type == 'mousemove',
+                EVENTS.c.timestamp >= STATE.c.last_ts,
+                STATE.c.needs_rebuild == false()
+            )
+            .subquery()
+        )
+        query = (
+            select(ranked.c.user_id, ranked.c.timestamp, ranked.c.x, ranked.c.y)
+            .join(STATE, STATE.c.user_id == ranked.c.user_id)
+            .where(or_(ranked.c.timestamp > STATE.c.last_ts, ranked.c.nth > STATE.c.last_ts_count))
+        )
+        found = 0
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+            for rows in result.partitions():
+                if self.owns is not None:
+                    rows = [row for row in rows if self.owns(row[0])]
+                self.add([
+                    {"event_type": "mousemove", "user_id": user_id, "timestamp": timestamp, "x": x, "y": y}
+                    for user_id, timestamp, x, y in rows
+                ])
+                found += len(rows)
+        if found:
+            logger.info(f"Re-buffered {found} unapplied events for the feature store.")
+        return found
+
+    def rebuild_flagged(self, limit: int) -> int:
+        """Rebuilds up to 'limit' flagged users. Returns how many were rebuilt."""
+        try:
+            query = select(STATE.c.user_id).where(STATE.c.needs_rebuild)
+            with self.engine.connect() as conn:
+                if self.owns is None:
+                    user_ids = conn.execute(query.limit(limit)).scalars().all()
+                else:
+                    user_ids = [user_id for user_id in conn.execute(query).scalars() if self.owns(user_id)][:limit]
+            for user_id in user_ids:
+                # Raw events include everything buffered for this user
+                self._pending.pop(user_id, None)
+                self._last_arrival.pop(user_id, None)
+                rebuild_user(self.engine, user_id)
+                self.rebuilds += 1
+        except Exception as e:
+            logger.error(f"Feature store rebuild failed: {e}")
+            return 0
+        return len(user_ids)
+
+    def stats(self) -> dict:
+        return {
+            "events_applied": self.events_applied,
+            "windows_written": self.windows_written,
+            "late_events": self.late_events,
+            "rebuilds": self.rebuilds,
+            "buffered": sum(len(events) for events in self._pending.values()),
+        }
+
+    def _take(self, user_id: str, lateness_ms: int | None):
+        """
+        Removes and returns a user's releasable events as sorted
+        (timestamps, x, y) arrays; all of them if lateness_ms is None.
+        """
+        events = np.array(self._pending[user_id], dtype=np.float64)
+        events = events[np.argsort(events[:, 0], kind='stable')]
+
+        cut = len(events)
+        if lateness_ms is not None:
+            cut = int(np.searchsorted(events[:, 0], events[-1, 0] - lateness_ms, side='right'))
+
+        if cut == len(events):
+            del self._pending[user_id]
+            del self._last_arrival[user_id]
+        else:
+            self._pending[user_id] = [tuple(event) for event in events[cut:]]
+        if cut == 0:
+            return None
+        return events[:cut, 0], events[:cut, 1], events[:cut, 2]
+
+    def _apply(self, released: dict) -> int:
+        """Folds released events into the store in one transaction."""
+        if not released:
+            return 0
+        try:
+            with self.engine.begin() as conn:
+                applied, windows = self._apply_in(conn, released)
+        except Exception as e:
+            # Put them back, they'll be retried on the next pass
+            logger.error(f"Feature store update failed: {e}")
+            for user_id, (timestamps, x, y) in released.items():
+                self._pending.setdefault(user_id, []).extend(zip(timestamps, x, y))
+                self._last_arrival.setdefault(user_id, time.monotonic())
+            return 0
+
+        self.events_applied += applied
+        self.windows_written += windows
+        return applied
+
+    def _apply_in(self, conn, released: dict) -> tuple[int, int]:
+        user_ids = list(released)
+        states = {
+            row.user_id: row for row in conn.execute(
+                select(STATE).where(STATE.c.user_id.in_(user_ids)).with_for_update()
+            )
+        }
+
+        open_keys = [
+            (user_id, state.n_events // WINDOW_SIZE)
+            for user_id, state in states.items()
+            if state.n_events % WINDOW_SIZE and not state.needs_rebuild
+        ]
+        open_windows = {}
+        if open_keys:
+            for row in conn.execute(
+                select(WINDOWS).where(tuple_(WINDOWS.c.user_id, WINDOWS.c.window_index).in_(open_keys))
+            ):
+                open_windows[row.user_id] = row
+
+        new_windows, open_updates, new_states, state_updates, flagged = [], [], [], [], []
+        applied = 0
+        for user_id, (timestamps, x, y) in released.items():
+            state = states.get(user_id)
+            if state is None:
+                # First events we've seen for this user. If they have older
+                # raw events (history from before the store, events lost in
+                # a crash, or days already moved to the archive), the
+                # windows have to be built from those: rebuild_user reads
+                # the table and the archive in order.
+                earlier = conn.execute(
+                    select(EVENTS.c.id).where(
+                        EVENTS.c.user_id == user_id,
+                        EVENTS.c.event_type == 'mousemove',
+                        EVENTS.c.timestamp < int(timestamps[0])
+                    ).limit(1)
+                ).first()
+                if earlier is not None or archive.has_archived_events(user_id):
+                    new_states.append({"user_id": user_id, "n_events": 0, "needs_rebuild": True})
+                    continue
+                n_events, last_event, last_ts_count, open_window = 0, None, 0, None
+            elif state.needs_rebuild:
+                continue # The rebuild will read these from the raw events
+            elif timestamps[0] < state.last_ts:
+                # Too late to be placed in order
+                self.late_events += int(np.sum(timestamps < state.last_ts))
+                flagged.append(user_id)
+                continue
+            else:
+                n_events = state.n_events
+                last_event = (
+                    state.last_ts,
+                    np.nan if state.last_x is None else state.last_x,
+                    np.nan if state.last_y is None else state.last_y
+                )
+                last_ts_count = state.last_ts_count
+                open_window = open_windows.get(user_id)
+
+            open_sums = None
+            if open_window is not None:
+                open_sums = np.array([open_window._mapping[column] for column in SUM_COLUMNS], dtype=np.float64)
+
+            window_indexes, sums, first_ts, last_ts = fold_events(n_events, last_event, open_sums, timestamps, x, y)
+            if open_window is not None:
+                first_ts[0] = open_window.first_ts
+            rows = _window_rows(user_id, window_indexes, sums, first_ts, last_ts)
+            if open_window is not None:
+                # SET comes from the remaining keys (the totals and last_ts)
+                continued = rows.pop(0)
+                del continued["user_id"], continued["window_index"], continued["first_ts"]
+                open_updates.append({"b_user_id": user_id, "b_window_index": open_window.window_index, **continued})
+            new_windows.extend(rows)
+
+            values = {
+                "n_events": n_events + len(timestamps),
+                "last_ts": int(timestamps[-1]),
+                "last_x": _coordinate(x[-1]),
+                "last_y": _coordinate(y[-1]),
+                "last_ts_count": _count_at_last(timestamps, None if last_event is None else last_event[0], last_ts_count),
+            }
+            if state is None:
+                new_states.append({"user_id": user_id, "needs_rebuild": False, **values})
+            else:
+                state_updates.append({"b_user_id": user_id, **values})
+            applied += len(timestamps)
+
+        if new_windows:
+            conn.execute(insert(WINDOWS), new_windows)
+        if open_updates:
+            conn.execute(
+                update(WINDOWS).where(
+                    WINDOWS.c.user_id == bindparam("b_user_id"),
+                    WINDOWS.c.window_index == bindparam("b_window_index")
+                ),
+                open_updates
+            )
+        if new_states:
+            conn.execute(insert(STATE), [{"n_events": 0, "last_ts": None, "last_x": None, "last_y": None,
+                                          "last_ts_count": 0, **row} for row in new_states])
+        if state_updates:
+            conn.execute(
+                update(STATE).where(STATE.c.user_id == bindparam("b_user_id")),
+                state_updates
+            )
+        if flagged:
+            conn.execute(update(STATE).where(STATE.c.user_id.in_(flagged)).values(needs_rebuild=True))
+            logger.warning(f"Late events for {len(flagged)} user(s); their feature windows will be rebuilt.")
+
+        return applied, len(new_windows) + len(open_updates)
@@ -0,0 +1,268 @@
+import numpy as np
+
+# --- Feature Config ---
+# Events are grouped into "sessions" of this many events,
+# and each session becomes one feature row.
+WINDOW_SIZE = 10
+
+# Column order of every feature matrix produced here
+FEATURE_COLUMNS = [
+    "avg_speed",
+    "std_speed",
+    "max_speed",
+    "avg_time_delta",
+    "std_time_delta",
+    "total_distance",
+]
+
+# Per-window running totals kept by the feature store (core/feature_store.py).
+# Every feature above can be recomputed from these without the raw events,
+# and two partial totals of the same window merge by adding (max: maximum).
+SUM_COLUMNS = [
+    "event_count",
+    "dt_count",
+    "speed_sum",
+    "speed_sum_sq",
+    "speed_max",
+    "dt_sum",
+    "dt_sum_sq",
+    "distance_sum",
+]
+
+
+def event_deltas(timestamps, x, y):
+    """
+    Per-event deltas for events that are already in time order.
+
+    Returns (time_delta_s, distance, speed_px_s) as float64 arrays:
+    - time_delta_s is NaN for the first event (nothing to diff against)
+    - a missing x/y gives a 0 coordinate delta, like pandas diff().fillna(0)
+    - speed is 0 wherever the time delta isn't positive
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    n = len(timestamps)
+    time_delta_s = np.empty(n)
+    x_delta = np.zeros(n)
+    y_delta = np.zeros(n)
+    if n:
+        time_delta_s[0] = np.nan
+        np.subtract(timestamps[1:], timestamps[:-1], out=time_delta_s[1:])
+        time_delta_s[1:] /= 1000.0
+        np.subtract(x[1:], x[:-1], out=x_delta[1:])
+        np.subtract(y[1:], y[:-1], out=y_delta[1:])
+        x_delta[np.isnan(x_delta)] = 0.0
+        y_delta[np.isnan(y_delta)] = 0.0
+
+    distance = np.sqrt(x_delta * x_delta + y_delta * y_delta)
+
+    # Avoid division by zero (and NaN time deltas)
+    speed = np.zeros(n)
+    moving = time_delta_s > 0
+    np.divide(distance, time_delta_s, out=speed, where=moving)
+
+    return time_delta_s, distance, speed
+
+
+def aggregate_windows(time_delta_s, distance, speed, window: int = WINDOW_SIZE, starts=None) -> np.ndarray:
+    """
+    Reduces per-event deltas into one feature row per block of
+    'window' consecutive events (the last block may be shorter), or
+    per block beginning at each of 'starts' (increasing positions,
+    the first being 0).
+    NaN time deltas are skipped, like pandas' mean/std do.
+    Returns a (n_windows, len(FEATURE_COLUMNS)) float64 array.
+    """
+    n = len(speed)
+    if n == 0:
+        return np.empty((0, len(FEATURE_COLUMNS)))
+
+    if starts is None:
+        starts = np.arange(0, n, window)
+    counts = np.diff(np.append(starts, n))
+
+    # Speed: every event counts
+    speed_sum = np.add.reduceat(speed, starts)
+    avg_speed = speed_sum / counts
+    speed_dev = speed - np.repeat(avg_speed, counts)
+    std_speed = _sample_std(np.add.reduceat(speed_dev * speed_dev, starts), counts)
+    max_speed = np.maximum.reduceat(speed, starts)
+
+    # Time deltas: NaN (first event) doesn't count
+    valid = ~np.isnan(time_delta_s)
+    dt = np.where(valid, time_delta_s, 0.0)
+    dt_counts = np.add.reduceat(valid.astype(np.int64), starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_time_delta = np.add.reduceat(dt, starts) / dt_counts
+    dt_dev = np.where(valid, dt - np.repeat(avg_time_delta, counts), 0.0)
+    std_time_delta = _sample_std(np.add.reduceat(dt_dev * dt_dev, starts), dt_counts)
+
+    total_distance = np.add.reduceat(distance, starts)
+
+    features = np.column_stack([
+        avg_speed, std_speed, max_speed,
+        avg_time_delta, std_time_delta,
+        total_distance,
+    ])
+    # Our AI model can't handle missing or infinite values
+    features[~np.isfinite(features)] = 0.0
+    return features
+
+
+def window_features(timestamps, x, y, window: int = WINDOW_SIZE) -> np.ndarray:
+    """
+    Vectorized feature engineering over contiguous arrays.
+
+    Deltas are computed in time order, but events are grouped into
+    windows by their ORIGINAL position (position // window), which is
+    exactly what the original pandas implementation did. For input
+    that is already sorted by time the two orders are the same.
+    """
+    timestamps = np.ascontiguousarray(timestamps, dtype=np.float64)
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    y = np.ascontiguousarray(y, dtype=np.float64)
+
+    # Fast path: rows from the DB usually arrive in time order already
+    if np.all(timestamps[1:] >= timestamps[:-1]):
+        return aggregate_windows(*event_deltas(timestamps, x, y), window=window)
+
+    order = np.argsort(timestamps, kind='stable')
+    sorted_deltas = event_deltas(timestamps[order], x[order], y[order])
+
+    # Scatter the deltas back to the original positions
+    deltas = []
+    for values in sorted_deltas:
+        original = np.empty_like(values)
+        original[order] = values
+        deltas.append(original)
+
+    return aggregate_windows(*deltas, window=window)
+
+
+def window_sums(time_delta_s, distance, speed, window_index) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reduces per-event deltas into the running totals of SUM_COLUMNS,
+    one row per distinct value of 'window_index' (which must be
+    non-decreasing, e.g. position // WINDOW_SIZE).
+    Returns (window_indexes, sums).
+    """
+    window_index = np.asarray(window_index)
+    n = len(window_index)
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(SUM_COLUMNS)))
+
+    starts = np.flatnonzero(np.r_[True, window_index[1:] != window_index[:-1]])
+    counts = np.diff(np.append(starts, n))
+
+    valid = ~np.isnan(time_delta_s)
+    dt = np.where(valid, time_delta_s, 0.0)
+
+    sums = np.column_stack([
+        counts.astype(np.float64),
+        np.add.reduceat(valid.astype(np.float64), starts),
+        np.add.reduceat(speed, starts),
+        np.add.reduceat(speed * speed, starts),
+        np.maximum.reduceat(speed, starts),
+        np.add.reduceat(dt, starts),
+        np.add.reduceat(dt * dt, starts),
+        np.add.reduceat(distance, starts),
+    ])
+    return window_index[starts], sums
+
+
+def merge_window_sums(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Totals of one window from two parts of it (rows of SUM_COLUMNS)."""
+    merged = np.asarray(a, dtype=np.float64) + b
+    max_col = SUM_COLUMNS.index("speed_max")
+    merged[..., max_col] = np.maximum(np.asarray(a)[..., max_col], np.asarray(b)[..., max_col])
+    return merged
+
+
+def features_from_sums(sums: np.ndarray) -> np.ndarray:
+    """
+    Feature rows (FEATURE_COLUMNS) from per-window totals (SUM_COLUMNS).
+    Matches aggregate_windows() up to float rounding.
+    """
+    sums = np.asarray(sums, dtype=np.float64).reshape(-1, len(SUM_COLUMNS))
+    count, dt_count, speed_sum, speed_sq, speed_max, dt_sum, dt_sq, distance = sums.T
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_speed = speed_sum / count
+        avg_time_delta = dt_sum / dt_count
+        # sum of squared deviations = sum(v^2) - sum(v)^2 / n, never below 0
+        speed_dev_sq = np.maximum(speed_sq - speed_sum * avg_speed, 0.0)
+        dt_dev_sq = np.maximum(dt_sq - dt_sum * avg_time_delta, 0.0)
+
+    features = np.column_stack([
+        avg_speed, _sample_std(speed_dev_sq, count), speed_max,
+        avg_time_delta, _sample_std(dt_dev_sq, dt_count),
+        distance,
+    ])
+    features[~np.isfinite(features)] = 0.0
+    return features
+
+
+def _sample_std(sum_sq_dev: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Sample standard deviation (ddof=1); NaN where there are < 2 values."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.sqrt(sum_sq_dev / (counts - 1))
+
+
+class WindowFeatureAccumulator:
+    """
+    Computes the same window features as window_features(), but over
+    a time-ordered event stream that arrives in chunks.
+
+    The last event of each chunk is remembered so the first delta of
+    the next chunk is correct, and events that don't fill a whole
+    window yet are carried over. Memory stays bounded by the chunk
+    size no matter how long the stream is.
+    """
+
+    def __init__(self, window: int = WINDOW_SIZE):
+        self.window = window
+        self.n_events = 0
+
+        self._last_event: tuple[float, float, float] | None = None
+        self._carry = (np.empty(0), np.empty(0), np.empty(0))
+
+    def add(self, timestamps, x, y) -> np.ndarray:
+        """
+        Feeds the next chunk of events (sorted by time, and not
+        earlier than the previous chunk). Returns the feature rows of
+        every window completed by this chunk.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if len(timestamps) == 0:
+            return np.empty((0, len(FEATURE_COLUMNS)))
+
+        if self._last_event is None:
+            deltas = event_deltas(timestamps, x, y)
+        else:
+            # Prepend the previous chunk's last event, then drop its delta
+            last_ts, last_x, last_y = self._last_event
+            deltas = event_deltas(
+                np.concatenate(([last_ts], timestamps)),
+                np.concatenate(([last_x], x)),
+                np.concatenate(([last_y], y))
+            )
+            deltas = tuple(values[1:] for values in deltas)
+
+        self._last_event = (timestamps[-1], x[-1], y[-1])
+        self.n_events += len(timestamps)
+
+        # Complete windows go out, the remainder waits for the next chunk
+        pending = tuple(np.concatenate((carried, new)) for carried, new in zip(self._carry, deltas))
+        complete = len(pending[0]) // self.window * self.window
+        self._carry = tuple(values[complete:] for values in pending)
+
+        return aggregate_windows(*(values[:complete] for values in pending), window=self.window)
+
+    def finish(self) -> np.ndarray:
+        """Returns the last, partial window (if any)."""
+        carry, self._carry = self._carry, (np.empty(0), np.empty(0), np.empty(0))
+        return aggregate_windows(*carry, window=self.window)
@@ -0,0 +1,330 @@
+import os
+
+import numpy as np
+
+from core.features import window_features, event_deltas, aggregate_windows, WINDOW_SIZE, FEATURE_COLUMNS
+
+# --- Keystroke Feature Config (from .env) ---
+# Keydowns further apart than this start a new typing burst: the gap is
+# counted as a pause, not as a flight time
+KEYSTROKE_BURST_GAP_MS = int(os.getenv("KEYSTROKE_BURST_GAP_MS", "1000"))
+
+# Keys that undo typing; how often they're used is a habit of the typist
+CORRECTION_KEYS = ("Backspace", "Delete")
+
+# Keystroke dynamics and click cadence, one row per mouse-movement
+# window (core.features), so they line up with its FEATURE_COLUMNS.
+# The frontend only sends keydowns (no keyups), so there are no dwell
+# times: flight times are keydown-to-keydown latencies within a burst,
+# which is also each digraph's latency.
+KEYSTROKE_COLUMNS = [
+    "key_count",
+    "flight_mean",
+    "flight_std",
+    "rhythm_cv",
+    "pause_ratio",
+    "correction_ratio",
+    "click_count",
+    "click_interval_mean",
+    "click_interval_std",
+]
+
+# What a model can be trained on: the mouse features, then these
+ALL_FEATURE_COLUMNS = FEATURE_COLUMNS + KEYSTROKE_COLUMNS
+
+# Per-window running totals the columns above are computed from.
+# Totals of two parts of a window merge by adding.
+KEYSTROKE_SUM_COLUMNS = [
+    "key_count",
+    "flight_count",
+    "flight_sum",
+    "flight_sum_sq",
+    "pause_count",
+    "correction_count",
+    "click_count",
+    "click_dt_count",
+    "click_dt_sum",
+    "click_dt_sum_sq",
+]
+
+
+def window_starts(timestamps, window: int = WINDOW_SIZE) -> np.ndarray:
+    """
+    Start time of every mouse-movement window, for time-ordered
+    mousemove timestamps (the first event of each block of 'window').
+    """
+    return np.asarray(timestamps, dtype=np.float64)[::window]
+
+
+def window_of(starts: np.ndarray, timestamps) -> np.ndarray:
+    """
+    The window each timestamp belongs to: the last one that started at
+    or before it (events before the first window go to the first one).
+    """
+    index = np.searchsorted(starts, timestamps, side="right") - 1
+    return np.maximum(index, 0)
+
+
+def keystroke_sums(starts: np.ndarray, timestamps, is_click, is_correction,
+                   last_key_ts: float | None = None, last_click_ts: float | None = None,
+                   burst_gap_ms: int = KEYSTROKE_BURST_GAP_MS,
+                   rows: np.ndarray | None = None) -> tuple[np.ndarray, float | None, float | None]:
+    """
+    Reduces time-ordered keydown and click events into KEYSTROKE_SUM_COLUMNS
+    totals for each of the windows starting at 'starts', in one pass.
+
+    'is_click' marks clicks (everything else is a keydown) and
+    'is_correction' keydowns of CORRECTION_KEYS. An interval is counted
+    in the window of the event that ends it. 'last_key_ts' and
+    'last_click_ts' carry the previous chunk's last events over, and the
+    new ones are returned: (sums, last_key_ts, last_click_ts).
+
+    With 'rows' (increasing window indexes, e.g. a training sample) only
+    those windows' totals are kept, one row each, in that order.
+    """
+    n_windows = len(starts) if rows is None else len(rows)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    is_click = np.asarray(is_click, dtype=bool)
+    is_correction = np.asarray(is_correction, dtype=bool)
+    sums = np.zeros((n_windows, len(KEYSTROKE_SUM_COLUMNS)))
+    if n_windows == 0 or len(timestamps) == 0:
+        return sums, last_key_ts, last_click_ts
+
+    windows = window_of(starts, timestamps)
+    key_ts, click_ts = timestamps[~is_click], timestamps[is_click]
+    key_dt, click_dt = _intervals(key_ts, last_key_ts), _intervals(click_ts, last_click_ts)
+    if rows is not None:
+        # Intervals are taken over every event above; now drop the
+        # events of windows that aren't kept
+        slots = np.minimum(np.searchsorted(rows, windows), n_windows - 1)
+        kept = rows[slots] == windows
+        key_dt, click_dt = key_dt[kept[~is_click]], click_dt[kept[is_click]]
+        windows, is_click, is_correction = slots[kept], is_click[kept], is_correction[kept]
+    sums = _window_totals(n_windows, windows, is_click, is_correction, key_dt, click_dt, burst_gap_ms)
+
+    if len(key_ts):
+        last_key_ts = float(key_ts[-1])
+    if len(click_ts):
+        last_click_ts = float(click_ts[-1])
+    return sums, last_key_ts, last_click_ts
+
+
+def _intervals(ts: np.ndarray, last_ts: float | None = None, first=None) -> np.ndarray:
+    """
+    Gaps to the previous event of the same kind, in seconds: NaN for the
+    very first (unless 'last_ts' is given) and wherever 'first' marks
+    the start of a separate sequence.
+    """
+    previous = np.empty_like(ts)
+    if len(ts):
+        previous[0] = np.nan if last_ts is None else last_ts
+        previous[1:] = ts[:-1]
+    if first is not None:
+        previous[first] = np.nan
+    return (ts - previous) / 1000.0
+
+
+def _window_totals(n_windows: int, windows, is_click, is_correction, key_dt, click_dt,
+                   burst_gap_ms: int) -> np.ndarray:
+    """
+    KEYSTROKE_SUM_COLUMNS totals per window, given each event's window
+    and the intervals (seconds, NaN = none) before every keydown and
+    every click, in event order.
+    """
+    def totals(index, weights=None):
+        return np.bincount(index, weights, minlength=n_windows)[:n_windows]
+
+    # Keydowns: flight times within bursts, pauses between them
+    keys = ~is_click
+    key_windows = windows[keys]
+    flight = key_dt < burst_gap_ms / 1000.0  # NaN compares False
+    pause = key_dt >= burst_gap_ms / 1000.0
+    flight_dt, flight_windows = key_dt[flight], key_windows[flight]
+
+    # Clicks: cadence is the interval between consecutive clicks
+    click_windows = windows[is_click]
+    valid = ~np.isnan(click_dt)
+    click_dt, click_dt_windows = click_dt[valid], click_windows[valid]
+
+    sums = np.zeros((n_windows, len(KEYSTROKE_SUM_COLUMNS)))
+    sums[:, 0] = totals(key_windows)
+    sums[:, 1] = totals(flight_windows)
+    sums[:, 2] = totals(flight_windows, flight_dt)
+    sums[:, 3] = totals(flight_windows, flight_dt * flight_dt)
+    sums[:, 4] = totals(key_windows[pause])
+    sums[:, 5] = totals(windows[keys & is_correction])
+    sums[:, 6] = totals(click_windows)
+    sums[:, 7] = totals(click_dt_windows)
+    sums[:, 8] = totals(click_dt_windows, click_dt)
+    sums[:, 9] = totals(click_dt_windows, click_dt * click_dt)
+    return sums
+
+
+def features_from_keystroke_sums(sums: np.ndarray) -> np.ndarray:
+    """Feature rows (KEYSTROKE_COLUMNS) from per-window totals (KEYSTROKE_SUM_COLUMNS)."""
+    sums = np.asarray(sums, dtype=np.float64).reshape(-1, len(KEYSTROKE_SUM_COLUMNS))
+    (key_count, flight_count, flight_sum, flight_sq, pause_count, correction_count,
+     click_count, click_dt_count, click_dt_sum, click_dt_sq) = sums.T
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        flight_mean = flight_sum / flight_count
+        flight_std = np.sqrt(np.maximum(flight_sq - flight_sum * flight_mean, 0.0) / (flight_count - 1))
+        click_mean = click_dt_sum / click_dt_count
+        click_std = np.sqrt(np.maximum(click_dt_sq - click_dt_sum * click_mean, 0.0) / (click_dt_count - 1))
+        features = np.column_stack([
+            key_count,
+            flight_mean,
+            flight_std,
+            flight_std / flight_mean,  # Typing rhythm: how even the flight times are
+            pause_count / key_count,
+            correction_count / key_count,
+            click_count,
+            click_mean,
+            click_std,
+        ])
+    # Windows without typing or clicks get zeros, like the mouse features
+    features[~np.isfinite(features)] = 0.0
+    return features
+
+
+def keystroke_features(starts: np.ndarray, timestamps, event_types, keys) -> np.ndarray:
+    """
+    KEYSTROKE_COLUMNS for the windows starting at 'starts', from one
+    batch of events of any type (e.g. a prediction request). Events
+    other than keydowns and clicks are ignored.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    event_types = np.asarray(event_types, dtype=object)
+    is_click = event_types == "click"
+    relevant = is_click | (event_types == "keydown")
+
+    order = np.argsort(timestamps[relevant], kind="stable")
+    is_correction = np.isin(np.asarray(keys, dtype=object)[relevant], CORRECTION_KEYS)
+    sums, _, _ = keystroke_sums(starts, timestamps[relevant][order], is_click[relevant][order], is_correction[order])
+    return features_from_keystroke_sums(sums)
+
+
+def event_features(timestamps, event_types, x, y, keys) -> np.ndarray:
+    """
+    Feature rows (ALL_FEATURE_COLUMNS) for one batch of events of any
+    type: the mouse features of each window of mouse movements
+    (core.features), and the typing and clicking during it.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    event_types = np.asarray(event_types, dtype=object)
+    moves = event_types == "mousemove"
+    move_ts = timestamps[moves]
+    mouse = window_features(move_ts, np.asarray(x, dtype=np.float64)[moves], np.asarray(y, dtype=np.float64)[moves])
+    return np.hstack([mouse, keystroke_features(window_starts(np.sort(move_ts)), timestamps, event_types, keys)])
+
+
+def batch_event_features(segments, timestamps, event_types, x, y, keys,
+                         window: int = WINDOW_SIZE) -> tuple[np.ndarray, np.ndarray]:
+    """
+    event_features() for many independent batches of events at once
+    (e.g. several users' prediction requests), concatenated in one set
+    of arrays: 'segments' is the (non-decreasing) batch number of every
+    event. No delta, window or interval crosses from one batch to the
+    next, so each batch's rows are exactly what event_features() gives
+    for it alone. Returns (features, row_segments): the feature rows of
+    every batch in order, and the batch each row belongs to (batches
+    without mouse movements have no rows).
+    """
+    segments = np.asarray(segments, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    event_types = np.asarray(event_types, dtype=object)
+    moves = event_types == "mousemove"
+    move_segments, move_ts = segments[moves], timestamps[moves]
+    n = len(move_ts)
+    if n == 0:
+        return np.empty((0, len(ALL_FEATURE_COLUMNS))), np.empty(0, dtype=np.int64)
+
+    # Deltas in time order within each batch, kept at the original
+    # positions (like window_features()); each batch's first movement
+    # has nothing to diff against
+    order = np.lexsort((move_ts, move_segments))
+    first = np.r_[True, move_segments[1:] != move_segments[:-1]]
+    time_delta_s, distance, speed = event_deltas(
+        move_ts[order], np.asarray(x, dtype=np.float64)[moves][order], np.asarray(y, dtype=np.float64)[moves][order]
+    )
+    time_delta_s[first], distance[first], speed[first] = np.nan, 0.0, 0.0
+    deltas = []
+    for values in (time_delta_s, distance, speed):
+        original = np.empty_like(values)
+        original[order] = values
+        deltas.append(original)
+
+    # Windows: every window-th movement of a batch starts one
+    batch_starts = np.flatnonzero(first)
+    position = np.arange(n) - np.repeat(batch_starts, np.diff(np.append(batch_starts, n)))
+    blocks = np.flatnonzero(position % window == 0)
+    mouse = aggregate_windows(*deltas, starts=blocks)
+    row_segments = move_segments[blocks]
+    starts = move_ts[order][blocks]
+
+    # Keydowns and clicks of batches that have windows, in time order per batch
+    is_click = event_types == "click"
+    relevant = (is_click | (event_types == "keydown")) & np.isin(segments, row_segments)
+    key_segments, key_ts = segments[relevant], timestamps[relevant]
+    key_order = np.lexsort((key_ts, key_segments))
+    key_segments, key_ts = key_segments[key_order], key_ts[key_order]
+    key_is_click = is_click[relevant][key_order]
+    is_correction = np.isin(np.asarray(keys, dtype=object)[relevant][key_order], CORRECTION_KEYS)
+
+    # Each goes to the last window of its batch that started at or
+    # before it, or else the batch's first (window_of() per batch)
+    merged = np.lexsort((np.r_[np.zeros(len(starts)), np.ones(len(key_ts))],
+                         np.r_[starts, key_ts], np.r_[row_segments, key_segments]))
+    is_start = merged < len(starts)
+    windows = (np.cumsum(is_start) - 1)[~is_start]
+    windows = np.maximum(windows, np.searchsorted(row_segments, key_segments, side="left"))
+
+    sums = _window_totals(
+        len(starts), windows, key_is_click, is_correction,
+        _intervals(key_ts[~key_is_click], first=_new_segment(key_segments[~key_is_click])),
+        _intervals(key_ts[key_is_click], first=_new_segment(key_segments[key_is_click])),
+        KEYSTROKE_BURST_GAP_MS,
+    )
+    return np.hstack([mouse, features_from_keystroke_sums(sums)]), row_segments
+
+
+def _new_segment(segments: np.ndarray) -> np.ndarray:
+    return np.r_[True, segments[1:] != segments[:-1]] if len(segments) else np.zeros(0, dtype=bool)
+
+
+def select_columns(values: np.ndarray, columns: list[str] | None) -> np.ndarray:
+    """
+    The columns (from ALL_FEATURE_COLUMNS rows) a model was trained on.
+    Models saved without column names predate keystroke features.
+    """
+    columns = list(columns or FEATURE_COLUMNS)
+    return values[:, [ALL_FEATURE_COLUMNS.index(column) for column in columns]]
+
+
+class KeystrokeFeatureAccumulator:
+    """
+    KEYSTROKE_COLUMNS for known mouse windows over a time-ordered stream
+    of keydowns and clicks that arrives in chunks (see
+    core.feature_store.iter_keystroke_chunks). Memory is the per-window
+    totals, no matter how long the stream is. With 'rows', only those
+    windows get totals (and feature rows), see keystroke_sums().
+    """
+
+    def __init__(self, starts: np.ndarray, rows: np.ndarray | None = None):
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.rows = None if rows is None else np.asarray(rows, dtype=np.int64)
+        self.n_events = 0
+        self._sums = np.zeros((len(self.starts) if rows is None else len(rows), len(KEYSTROKE_SUM_COLUMNS)))
+        self._last_key_ts = None
+        self._last_click_ts = None
+
+    def add(self, timestamps, is_click, is_correction) -> None:
+        sums, self._last_key_ts, self._last_click_ts = keystroke_sums(
+            self.starts, timestamps, is_click, is_correction, self._last_key_ts, self._last_click_ts,
+            rows=self.rows
+        )
+        self._sums += sums
+        self.n_events += len(timestamps)
+
+    def features(self) -> np.ndarray:
+        return features_from_keystroke_sums(self._sums)
@@ -1,11 +1,23 @@
-from sqlalchemy import Column, Integer, String, BigInteger, TIMESTAMP, func
+from sqlalchemy import Column, Integer, String, BigInteger, TIMESTAMP, Index, func
 from ..database import Base # Import Base from our database.py
 
 class BehavioralEvent(Base):
     __tablename__ = "behavioral_events"
+    __table_args__ = (
+        # Every training query filters on user + event type and sorts by time.
+        # x/y are included so those reads can be index-only scans.
+        Index(
+            "ix_behavioral_events_user_type_ts",
+            "user_id", "event_type", "timestamp",
+            postgresql_include=["x", "y"]
+        ),
+        # Native range partitioning, one partition per day
+        # (see core/partitions.py for creating/dropping partitions)
+        {"postgresql_partition_by": "RANGE (received_at)"},
+    )
 
     # This is like 'id = models.AutoField(primary_key=True)'
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     
     # This is like 'user_id = models.CharField(max_length=100, null=True)'
     user_id = Column(String(100), nullable=True) 
@@ -16,5 +28,10 @@ class BehavioralEvent(Base):
     key = Column(String(20), nullable=True)
     timestamp = Column(BigInteger)
     
+    # ID of the Redis Stream entry this event came from.
+    # Lets the logger skip entries that are redelivered after a crash.
+    stream_id = Column(String(32), nullable=True, index=True)
+
     # This is like 'received_at = models.DateTimeField(auto_now_add=True)'
-    received_at = Column(TIMESTAMP, server_default=func.now())
\ No newline at end of file
+    # It's the partition key, so it has to be part of the primary key.
+    received_at = Column(TIMESTAMP, primary_key=True, server_default=func.now(), nullable=False)
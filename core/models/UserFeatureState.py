@@ -0,0 +1,31 @@
+from sqlalchemy import Column, String, Integer, BigInteger, Float, Boolean, TIMESTAMP, func
+from ..database import Base # Import Base from our database.py
+
+class UserFeatureState(Base):
+    """
+    Where a user's feature windows (UserFeatureWindow) currently end.
+    The next event continues from here, even across logger restarts.
+    """
+    __tablename__ = "user_feature_state"
+
+    user_id = Column(String(100), primary_key=True)
+
+    # Mouse movements folded into the windows so far.
+    # The open (partial) window, if any, is window n_events // 10.
+    n_events = Column(BigInteger, nullable=False, default=0)
+
+    # The last event applied; the next event's deltas are taken against it
+    last_ts = Column(BigInteger, nullable=True)
+    last_x = Column(Float, nullable=True)
+    last_y = Column(Float, nullable=True)
+    # How many of the applied events have timestamp last_ts. They are the
+    # earliest inserted (lowest id) of the user's events at last_ts, so
+    # catch-up re-reads that timestamp and skips exactly these.
+    last_ts_count = Column(Integer, nullable=False, default=0, server_default="1")
+
+    # Set when the windows can't be trusted (an event arrived too late to be
+    # applied in order, or history predates the store). Training then reads
+    # raw events, and the logger rebuilds the user's windows from them.
+    needs_rebuild = Column(Boolean, nullable=False, default=False, index=True)
+
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, BigInteger, Float
+from ..database import Base # Import Base from our database.py
+
+class UserFeatureWindow(Base):
+    """
+    Running totals of one feature window (WINDOW_SIZE consecutive mouse
+    movements of a user, in time order), maintained by the event logger.
+    Training turns these into feature rows instead of re-reading raw events.
+    """
+    __tablename__ = "user_feature_windows"
+
+    user_id = Column(String(100), primary_key=True)
+    # Position of the window in the user's history: events [i * 10, i * 10 + 10)
+    window_index = Column(Integer, primary_key=True)
+
+    # Event timestamps (ms) of the first and last event in the window
+    first_ts = Column(BigInteger, nullable=False)
+    last_ts = Column(BigInteger, nullable=False)
+
+    # The totals of core.features.SUM_COLUMNS
+    event_count = Column(Integer, nullable=False)
+    dt_count = Column(Integer, nullable=False)
+    speed_sum = Column(Float, nullable=False)
+    speed_sum_sq = Column(Float, nullable=False)
+    speed_max = Column(Float, nullable=False)
+    dt_sum = Column(Float, nullable=False)
+    dt_sum_sq = Column(Float, nullable=False)
+    distance_sum = Column(Float, nullable=False)
@@ -0,0 +1,160 @@
+import os
+import logging
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# --- Partitioning Config (from .env) ---
+# 'behavioral_events' is range-partitioned on 'received_at', one partition per day.
+PARENT_TABLE = "behavioral_events"
+PARTITION_PREFIX = f"{PARENT_TABLE}_p"
+
+# How many days of partitions to keep created ahead of time
+PARTITION_DAYS_AHEAD = int(os.getenv("PARTITION_DAYS_AHEAD", "7"))
+
+# Partitions whose whole day is older than this are dropped
+PARTITION_RETENTION_DAYS = int(os.getenv("PARTITION_RETENTION_DAYS", "90"))
+
+
+def partition_name(day: date) -> str:
+    """e.g. behavioral_events_p20251120"""
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def partition_day(name: str) -> date | None:
+    """The day a partition covers, or None if 'name' isn't a daily partition."""
+    if not name.startswith(PARTITION_PREFIX):
+        return None
+    try:
+        return datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def list_partitions(conn) -> list[str]:
+    """Names of every partition currently attached to the parent table."""
+    result = conn.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+        WHERE pg_inherits.inhparent = to_regclass(:parent)
+        ORDER BY child.relname
+    """), {"parent": PARENT_TABLE})
+    return [row[0] for row in result]
+
+
+def default_partition(conn) -> str | None:
+    """Name of the parent table's DEFAULT partition, or None if it has none."""
+    return conn.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+        WHERE pg_inherits.inhparent = to_regclass(:parent)
+          AND pg_get_expr(child.relpartbound, child.oid) = 'DEFAULT'
+    """), {"parent": PARENT_TABLE}).scalar()
+
+
+def parent_columns(conn) -> list[str]:
+    """The parent table's columns, in table order."""
+    result = conn.execute(text("""
+        SELECT attname
+        FROM pg_attribute
+        WHERE attrelid = to_regclass(:parent) AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """), {"parent": PARENT_TABLE})
+    return [row[0] for row in result]
+
+
+def create_partition(conn, day: date) -> bool:
+    """
+    Creates the partition for one day. Returns False if it already existed.
+
+    PostgreSQL refuses to create a partition while the DEFAULT partition
+    holds rows in its range (e.g. events that arrived while the partition
+    job was down). In that case the DEFAULT partition is detached, the new
+    partition created, the day's rows moved into it and the DEFAULT
+    partition reattached, all in the caller's transaction.
+    """
+    name = partition_name(day)
+    if name in list_partitions(conn):
+        return False
+    bounds = {"lo": day, "hi": day + timedelta(days=1)}
+    default = default_partition(conn)
+    stranded = default is not None and conn.execute(text(
+        f'SELECT EXISTS (SELECT 1 FROM "{default}" WHERE received_at >= :lo AND received_at < :hi)'
+    ), bounds).scalar()
+    if stranded:
+        conn.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{default}"'))
+    conn.execute(text(
+        f'CREATE TABLE "{name}" PARTITION OF {PARENT_TABLE} '
+        f"FOR VALUES FROM ('{bounds['lo'].isoformat()}') TO ('{bounds['hi'].isoformat()}')"
+    ))
+    if stranded:
+        columns = ", ".join(f'"{column}"' for column in parent_columns(conn))
+        moved = conn.execute(text(f"""
+            WITH moved AS (
+                DELETE FROM "{default}" WHERE received_at >= :lo AND received_at < :hi
+                RETURNING {columns}
+            )
+            INSERT INTO "{name}" ({columns}) SELECT {columns} FROM moved
+        """), bounds).rowcount
+        conn.execute(text(f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION "{default}" DEFAULT'))
+        logger.info(f"Moved {moved} rows from {default} into {name}.")
+    logger.info(f"Created partition {name}.")
+    return True
+
+
+def ensure_partitions(conn, start: date | None = None, days_ahead: int = PARTITION_DAYS_AHEAD) -> list[str]:
+    """
+    Makes sure a partition exists for every day from 'start'
+    (default: today) up to 'days_ahead' days in the future.
+    Returns the names of the partitions that were created.
+
+    Each day runs in its own savepoint, so a day that can't be created
+    is logged and skipped instead of stopping the days after it.
+    """
+    today = date.today()
+    day = start or today
+    created = []
+    while day <= today + timedelta(days=days_ahead):
+        try:
+            with conn.begin_nested():
+                if create_partition(conn, day):
+                    created.append(partition_name(day))
+        except Exception as e:
+            logger.error(f"Could not create partition {partition_name(day)}: {e}")
+        day += timedelta(days=1)
+    return created
+
+
+def expired_partitions(conn, retention_days: int = PARTITION_RETENTION_DAYS) -> list[str]:
+    """Daily partitions that lie entirely before the retention cutoff."""
+    cutoff = date.today() - timedelta(days=retention_days)
+    expired = []
+    for name in list_partitions(conn):
+        day = partition_day(name)
+        if day is not None and day < cutoff:
+            expired.append(name)
+    return expired
+
+
+def drop_expired_partitions(conn, retention_days: int = PARTITION_RETENTION_DAYS) -> list[str]:
+    """
+    Detaches and drops every expired daily partition. Dropping a
+    partition is instant, unlike DELETEing millions of rows.
+    Returns the names of the dropped partitions.
+    """
+    dropped = []
+    for name in expired_partitions(conn, retention_days):
+        drop_partition(conn, name)
+        logger.info(f"Dropped expired partition {name}.")
+        dropped.append(name)
+    return dropped
+
+
+def drop_partition(conn, name: str) -> None:
+    """Detaches and drops one partition."""
+    conn.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"'))
+    conn.execute(text(f'DROP TABLE "{name}"'))
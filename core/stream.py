@@ -0,0 +1,254 @@
+import os
+import time
+import zlib
+import logging
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# --- Stream Config (from .env) ---
+# The ingestor XADDs every event to this stream, and consumers read it
+# through a consumer group, so nothing is lost while a consumer is down.
+STREAM_KEY = "behavioral-stream"
+
+# Every consumer in a group gets a disjoint subset of the entries,
+# so several loggers can run side by side without duplicating rows.
+CONSUMER_GROUP = os.getenv("STREAM_CONSUMER_GROUP", "event-logger")
+
+# Approximate cap on the stream length (XADD MAXLEN ~). Old entries are
+# trimmed by Redis once consumers have had plenty of time to read them.
+STREAM_MAXLEN = int(os.getenv("STREAM_MAXLEN", "1000000"))
+
+# Entries that stay un-acked this long are assumed to belong to a dead
+# consumer and are claimed by a live one.
+RECLAIM_IDLE_MS = int(os.getenv("STREAM_RECLAIM_IDLE_MS", "60000"))
+
+# The stream entry field that holds the encoded events
+# (see core/event_codec.py for the formats)
+DATA_FIELD = "data"
+
+# Pub/sub channel the risk engine's stream scorer publishes live window
+# scores to (JSON with user_id); the ingestor relays them to the user's
+# WebSocket connections.
+RISK_SCORES_CHANNEL = os.getenv("RISK_SCORES_CHANNEL", "risk-scores")
+
+# Events can be spread over several streams, 'behavioral-stream:<n>',
+# by a hash of user_id: every event of a user lands in the same shard,
+# so a logger worker that owns the shard sees that user's events in
+# order. 1 = the single STREAM_KEY. Ingestor and loggers must agree.
+STREAM_SHARDS = int(os.getenv("STREAM_SHARDS", "1"))
+
+
+def shard_of(user_id: str | None, shards: int = STREAM_SHARDS) -> int:
+    """The shard a user's events go to (stable across processes, unlike hash())."""
+    return zlib.crc32((user_id or "").encode()) % shards
+
+
+def stream_for(user_id: str | None, shards: int = STREAM_SHARDS) -> str:
+    """The stream a user's events are published to."""
+    if shards <= 1:
+        return STREAM_KEY
+    return f"{STREAM_KEY}:{shard_of(user_id, shards)}"
+
+
+def shard_streams(shards: int = STREAM_SHARDS) -> list[str]:
+    """Every stream events may be published to."""
+    if shards <= 1:
+        return [STREAM_KEY]
+    return [f"{STREAM_KEY}:{n}" for n in range(shards)]
+
+
+def qualified_id(stream: str, entry_id: str) -> str:
+    """
+    Entry IDs are only unique within a stream, so entries of a shard are
+    identified as '<shard>/<entry_id>' (what the logger stores as
+    stream_id). Entries of the unsharded stream keep their plain ID.
+    """
+    if stream == STREAM_KEY:
+        return entry_id
+    return f"{stream.rsplit(':', 1)[1]}/{entry_id}"
+
+
+def split_qualified_id(qualified: str) -> tuple[str, str]:
+    """(stream, entry_id) for an ID from qualified_id()."""
+    shard, sep, entry_id = qualified.partition("/")
+    if not sep:
+        return STREAM_KEY, qualified
+    return f"{STREAM_KEY}:{shard}", entry_id
+
+
+def publish(client, data: str | bytes, stream: str = STREAM_KEY):
+    """
+    Appends one entry (encoded events, see core/event_codec.py) to the
+    stream (see stream_for() for picking a user's shard).
+    Works with a sync client, an async client (returns a coroutine)
+    or a pipeline (queues the command).
+    """
+    return client.xadd(
+        stream,
+        {DATA_FIELD: data},
+        maxlen=STREAM_MAXLEN,
+        approximate=True
+    )
+
+
+def ensure_group(client, group: str = CONSUMER_GROUP, stream: str = STREAM_KEY, start_id: str = "0") -> None:
+    """
+    Creates the consumer group (and the stream) if it doesn't exist yet.
+    A new group starts reading after 'start_id': "0" for everything still
+    in the stream, "$" for new entries only.
+    """
+    try:
+        client.xgroup_create(stream, group, id=start_id, mkstream=True)
+        logger.info(f"Created consumer group '{group}' on stream '{stream}'.")
+    except redis.ResponseError as e:
+        # BUSYGROUP = the group already exists, which is fine
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+class StreamConsumer:
+    """
+    Reads one or more Redis Streams as one member of a consumer group.
+
+    Delivery is at-least-once: an entry stays in the group's pending
+    entries list (PEL) until it is acked, so the caller must ack only
+    after the entry has been durably processed. Entries returned with
+    'redelivered=True' may already have been processed by a consumer
+    that crashed before acking, so the caller should de-duplicate them.
+
+    Entries are returned (and acked) by their qualified_id(), so IDs
+    from different shards never collide. IDs are always str, but the
+    fields are as the client returns them: read the binary event
+    encoding with decode_responses=False (see core/event_codec.py).
+
+    With 'claim=True' the consumer takes over every entry pending in its
+    streams at start-up, whoever read it. Only do that when this consumer
+    is the streams' sole owner (a sharded logger worker): the previous
+    owner is known to be gone, so there's no point waiting for its
+    entries to go idle.
+    """
+
+    def __init__(
+        self,
+        client,
+        consumer: str,
+        group: str = CONSUMER_GROUP,
+        stream: str | list[str] = STREAM_KEY,
+        count: int = 500,
+        reclaim_idle_ms: int = RECLAIM_IDLE_MS,
+        claim: bool = False,
+        start_id: str = "0",
+    ):
+        self.client = client
+        self.consumer = consumer
+        self.group = group
+        self.streams = [stream] if isinstance(stream, str) else list(stream)
+        self.count = count
+        self.reclaim_idle_ms = reclaim_idle_ms
+
+        # On start-up we first re-read our own un-acked entries
+        # (left over from a previous run under the same consumer name).
+        # The cursor moves past each page so we don't re-read it.
+        self._pending_cursors: dict[str, str] = {name: "0" for name in self.streams}
+
+        # XAUTOCLAIM is an extra round trip, so only do it now and then
+        self._reclaim_cursors: dict[str, str] = {name: "0-0" for name in self.streams}
+        self._next_reclaim_at = 0.0
+
+        for name in self.streams:
+            ensure_group(client, group, name, start_id)
+            if claim:
+                self._claim_all(name)
+
+    def read(self, block_ms: int = 1000) -> tuple[list[tuple[str, dict]], bool]:
+        """
+        Returns (entries, redelivered). 'entries' is a list of
+        (qualified_id, fields) tuples.
+        """
+        # 1. Our own pending entries from a previous run
+        for name, cursor in list(self._pending_cursors.items()):
+            entries = self._xreadgroup({name: cursor}, block_ms=None)
+            if entries:
+                self._pending_cursors[name] = split_qualified_id(entries[-1][0])[1]
+                return entries, True
+            del self._pending_cursors[name]
+
+        # 2. Entries abandoned by dead consumers
+        now = time.monotonic()
+        if now >= self._next_reclaim_at:
+            claimed = self.reclaim()
+            if claimed:
+                return claimed, True
+            # Keep walking the PELs on the next call if a cursor isn't back at the start
+            if all(cursor == "0-0" for cursor in self._reclaim_cursors.values()):
+                self._next_reclaim_at = now + self.reclaim_idle_ms / 2000.0
+
+        # 3. New entries, from whichever stream has some
+        return self._xreadgroup({name: ">" for name in self.streams}, block_ms=block_ms), False
+
+    def reclaim(self) -> list[tuple[str, dict]]:
+        """Claims entries that have been pending longer than 'reclaim_idle_ms'."""
+        claimed = []
+        for name in self.streams:
+            result = self.client.xautoclaim(
+                name,
+                self.group,
+                self.consumer,
+                min_idle_time=self.reclaim_idle_ms,
+                start_id=self._reclaim_cursors[name],
+                count=self.count
+            )
+            self._reclaim_cursors[name], entries = _text(result[0]), result[1]
+            # Entries trimmed from the stream come back with no fields
+            entries = [(qualified_id(name, _text(entry_id)), fields) for entry_id, fields in entries if fields]
+            if entries:
+                logger.warning(f"Reclaimed {len(entries)} stale entries from '{name}'.")
+                claimed.extend(entries)
+        return claimed
+
+    def ack(self, entry_ids: list[str]) -> None:
+        """Acks entries by the IDs read() returned them with."""
+        by_stream: dict[str, list[str]] = {}
+        for qualified in entry_ids:
+            name, entry_id = split_qualified_id(qualified)
+            by_stream.setdefault(name, []).append(entry_id)
+        for name, ids in by_stream.items():
+            self.client.xack(name, self.group, *ids)
+
+    def _claim_all(self, stream: str) -> None:
+        """Moves every pending entry of the stream to this consumer's PEL."""
+        cursor, total = "0-0", 0
+        while True:
+            # Not justid=True: redis-py then drops the cursor from the reply
+            result = self.client.xautoclaim(stream, self.group, self.consumer, min_idle_time=0,
+                                            start_id=cursor, count=self.count)
+            cursor = _text(result[0])
+            total += len(result[1])
+            if cursor == "0-0":
+                break
+        if total:
+            logger.info(f"Took over {total} pending entries of '{stream}'.")
+
+    def _xreadgroup(self, streams: dict[str, str], block_ms: int | None) -> list[tuple[str, dict]]:
+        response = self.client.xreadgroup(
+            self.group,
+            self.consumer,
+            streams,
+            count=self.count,
+            block=block_ms
+        )
+        if not response:
+            return []
+        # response = [[stream_name, [(entry_id, fields), ...]], ...]
+        return [
+            (qualified_id(_text(name), _text(entry_id)), fields)
+            for name, entries in response
+            for entry_id, fields in entries
+        ]
+
+
+def _text(value: str | bytes) -> str:
+    # Stream names and entry IDs, from clients with decode_responses=False
+    return value.decode() if isinstance(value, bytes) else value
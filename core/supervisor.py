@@ -0,0 +1,126 @@
+import time
+import signal
+import logging
+import multiprocessing
+from collections import deque
+
+from core.stream import STREAM_SHARDS, shard_streams
+
+logger = logging.getLogger(__name__)
+
+
+class ShardSupervisor:
+    """
+    Runs a stream consumer as several worker processes, each the sole
+    consumer of a fixed set of stream shards (so one user's events are
+    always handled by one process, in order). Used by the event logger
+    and the risk engine's stream scorer.
+
+    'target(index, streams)' is a worker's entry point; it must stop
+    cleanly (flushing and acking what it has) on SIGTERM.
+
+    A worker that dies is restarted on the same shards and takes over
+    what it had read but not acked. If one keeps dying, all workers are
+    stopped and one fewer is started, with the shards spread over them.
+    """
+
+    def __init__(self, target, workers: int, name: str, shards: int = STREAM_SHARDS,
+                 max_restarts: int = 5, restart_window: float = 60.0, stop_timeout: float = 30.0):
+        self.target = target
+        self.name = name
+        self.streams = shard_streams(shards)
+        if workers > len(self.streams):
+            logger.warning(f"{workers} workers but only {len(self.streams)} stream shard(s): "
+                           f"starting {len(self.streams)}. Raise STREAM_SHARDS to use more.")
+            workers = len(self.streams)
+        self.workers = workers
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.stop_timeout = stop_timeout
+
+        # Spawn, not fork: workers must not inherit the parent's Redis
+        # and database connections
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: list = []
+        self._restarts: list[deque] = []
+        self._stopping = False
+
+    def assignment(self, workers: int) -> list[list[str]]:
+        """Which streams each of 'workers' workers owns (round-robin)."""
+        return [self.streams[i::workers] for i in range(workers)]
+
+    def run(self) -> int:
+        """Supervises the workers until SIGTERM/SIGINT. Returns an exit code."""
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        logger.info(f"Supervising {self.workers} {self.name} workers over {len(self.streams)} stream shard(s).")
+        self._start_all()
+        try:
+            while not self._stopping:
+                time.sleep(0.5)
+                for index, process in enumerate(self._processes):
+                    if not process.is_alive() and not self._stopping:
+                        if not self._handle_exit(index, process):
+                            break
+                if self.workers == 0:
+                    logger.critical(f"No {self.name} workers left; giving up.")
+                    return 1
+        finally:
+            self._stop_all()
+        logger.info(f"All {self.name} workers stopped.")
+        return 0
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def _start(self, index: int, streams: list[str]):
+        process = self._context.Process(target=self.target, args=(index, streams), name=f"{self.name}-w{index}")
+        process.start()
+        logger.info(f"Started worker {index} (pid {process.pid}) on {', '.join(streams)}")
+        return process
+
+    def _start_all(self):
+        self._processes = [self._start(index, streams) for index, streams in enumerate(self.assignment(self.workers))]
+        self._restarts = [deque() for _ in self._processes]
+
+    def _stop_all(self):
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()  # SIGTERM: the worker flushes and acks
+        deadline = time.monotonic() + self.stop_timeout
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.error(f"Worker {process.name} did not stop in {self.stop_timeout} s; killing it.")
+                process.kill()
+                process.join()
+
+    def _handle_exit(self, index: int, process) -> bool:
+        """
+        Restarts or gives up on a worker that exited. Returns False if the
+        workers were rebalanced (so the caller's process list is stale).
+        """
+        now = time.monotonic()
+        restarts = self._restarts[index]
+        while restarts and now - restarts[0] > self.restart_window:
+            restarts.popleft()
+
+        streams = self.assignment(self.workers)[index]
+        if len(restarts) < self.max_restarts:
+            restarts.append(now)
+            logger.warning(f"Worker {index} exited with code {process.exitcode}; restarting it.")
+            self._processes[index] = self._start(index, streams)
+            return True
+
+        # Crash-looping: stop everyone so no shard is read by two workers
+        # at once, then hand this worker's shards to the others
+        logger.error(f"Worker {index} exited {len(restarts) + 1} times in {self.restart_window} s; "
+                     f"moving {', '.join(streams)} to the other workers.")
+        self._stop_all()
+        self.workers -= 1
+        if self.workers > 0:
+            self._start_all()
+        else:
+            self._processes = []
+        return False
@@ -32,6 +32,8 @@ config.set_main_option('DB_NAME', os.getenv('DB_NAME') or '')
 # 3. Import your models
 from core.database import Base
 import core.models.BehavioralEvent
+import core.models.UserFeatureWindow
+import core.models.UserFeatureState
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
@@ -43,6 +45,16 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+# Partitions of 'behavioral_events' are created and dropped at runtime
+# (core/partitions.py), so autogenerate must not treat them as stray tables.
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == "table" and (name.startswith("behavioral_events_p") or name == "behavioral_events_default"):
+        return False
+    if type_ == "index" and getattr(object, "table", None) is not None:
+        return include_object(object.table, object.table.name, "table", reflected, compare_to)
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -65,6 +77,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -88,7 +101,9 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
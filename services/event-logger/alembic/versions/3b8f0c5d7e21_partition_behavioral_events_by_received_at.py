@@ -0,0 +1,125 @@
+"""Partition behavioral_events by received_at and add training index
+
+Revision ID: 3b8f0c5d7e21
+Revises: 7c1d2e9f4a10
+Create Date: 2025-11-24 10:31:47.902214
+
+"""
+from datetime import date, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8f0c5d7e21'
+down_revision: Union[str, Sequence[str], None] = '7c1d2e9f4a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Daily partitions are created this far ahead; after that the
+# maintenance job (services/event-logger/manage_partitions.py) keeps going.
+DAYS_AHEAD = 7
+
+COLUMNS = "id, user_id, event_type, x, y, key, timestamp, stream_id, received_at"
+
+
+def _create_daily_partitions(first_day: date) -> None:
+    day = first_day
+    last_day = date.today() + timedelta(days=DAYS_AHEAD)
+    while day <= last_day:
+        op.execute(
+            f'CREATE TABLE "behavioral_events_p{day:%Y%m%d}" PARTITION OF behavioral_events '
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+        )
+        day += timedelta(days=1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 1. Move the old table (and its index/constraint names) out of the way.
+    #    The id sequence is detached so the new table keeps counting from it.
+    op.execute("ALTER TABLE behavioral_events RENAME TO behavioral_events_unpartitioned")
+    op.execute("ALTER TABLE behavioral_events_unpartitioned RENAME CONSTRAINT behavioral_events_pkey TO behavioral_events_unpartitioned_pkey")
+    op.execute("ALTER INDEX ix_behavioral_events_id RENAME TO ix_behavioral_events_unpartitioned_id")
+    op.execute("ALTER INDEX ix_behavioral_events_stream_id RENAME TO ix_behavioral_events_unpartitioned_stream_id")
+    op.execute("ALTER SEQUENCE behavioral_events_id_seq OWNED BY NONE")
+
+    # 2. The partitioned table. The partition key has to be part of the
+    #    primary key, so received_at becomes NOT NULL and joins the PK.
+    op.execute("""
+        CREATE TABLE behavioral_events (
+            id INTEGER NOT NULL DEFAULT nextval('behavioral_events_id_seq'),
+            user_id VARCHAR(100),
+            event_type VARCHAR(50),
+            x INTEGER,
+            y INTEGER,
+            key VARCHAR(20),
+            timestamp BIGINT,
+            stream_id VARCHAR(32),
+            received_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+            CONSTRAINT behavioral_events_pkey PRIMARY KEY (id, received_at)
+        ) PARTITION BY RANGE (received_at)
+    """)
+    op.execute("ALTER SEQUENCE behavioral_events_id_seq OWNED BY behavioral_events.id")
+
+    # 3. Indexes on the parent are created on every partition automatically.
+    #    The training query filters on (user_id, event_type) and sorts by
+    #    timestamp; x/y are INCLUDEd so it can be an index-only scan.
+    op.create_index(op.f('ix_behavioral_events_id'), 'behavioral_events', ['id'], unique=False)
+    op.create_index(op.f('ix_behavioral_events_stream_id'), 'behavioral_events', ['stream_id'], unique=False)
+    op.create_index(
+        'ix_behavioral_events_user_type_ts',
+        'behavioral_events',
+        ['user_id', 'event_type', 'timestamp'],
+        unique=False,
+        postgresql_include=['x', 'y']
+    )
+
+    # 4. One partition per day, from the oldest existing row to a week ahead,
+    #    plus a DEFAULT partition so an insert can never fail for lack of one.
+    first_received = op.get_bind().execute(
+        sa.text("SELECT min(received_at)::date FROM behavioral_events_unpartitioned")
+    ).scalar()
+    _create_daily_partitions(first_received or date.today())
+    op.execute("CREATE TABLE behavioral_events_default PARTITION OF behavioral_events DEFAULT")
+
+    # 5. Copy the data across and drop the old table
+    op.execute(f"""
+        INSERT INTO behavioral_events ({COLUMNS})
+        SELECT id, user_id, event_type, x, y, key, timestamp, stream_id, coalesce(received_at, now())
+        FROM behavioral_events_unpartitioned
+    """)
+    op.execute("DROP TABLE behavioral_events_unpartitioned")
+    op.execute("ANALYZE behavioral_events")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE behavioral_events RENAME TO behavioral_events_partitioned")
+    op.execute("ALTER TABLE behavioral_events_partitioned RENAME CONSTRAINT behavioral_events_pkey TO behavioral_events_partitioned_pkey")
+    op.execute("ALTER INDEX ix_behavioral_events_id RENAME TO ix_behavioral_events_partitioned_id")
+    op.execute("ALTER INDEX ix_behavioral_events_stream_id RENAME TO ix_behavioral_events_partitioned_stream_id")
+    op.execute("ALTER INDEX ix_behavioral_events_user_type_ts RENAME TO ix_behavioral_events_partitioned_user_type_ts")
+    op.execute("ALTER SEQUENCE behavioral_events_id_seq OWNED BY NONE")
+
+    op.create_table('behavioral_events',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('behavioral_events_id_seq')"), nullable=False),
+    sa.Column('user_id', sa.String(length=100), nullable=True),
+    sa.Column('event_type', sa.String(length=50), nullable=True),
+    sa.Column('x', sa.Integer(), nullable=True),
+    sa.Column('y', sa.Integer(), nullable=True),
+    sa.Column('key', sa.String(length=20), nullable=True),
+    sa.Column('timestamp', sa.BigInteger(), nullable=True),
+    sa.Column('stream_id', sa.String(length=32), nullable=True),
+    sa.Column('received_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("ALTER SEQUENCE behavioral_events_id_seq OWNED BY behavioral_events.id")
+    op.create_index(op.f('ix_behavioral_events_id'), 'behavioral_events', ['id'], unique=False)
+    op.create_index(op.f('ix_behavioral_events_stream_id'), 'behavioral_events', ['stream_id'], unique=False)
+
+    op.execute(f"INSERT INTO behavioral_events ({COLUMNS}) SELECT {COLUMNS} FROM behavioral_events_partitioned")
+    # Dropping the parent drops every partition with it
+    op.execute("DROP TABLE behavioral_events_partitioned")
@@ -0,0 +1,56 @@
+"""Add user_feature_windows and user_feature_state
+
+Revision ID: 5d2a8e6b4c13
+Revises: 3b8f0c5d7e21
+Create Date: 2025-11-27 16:05:12.318840
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2a8e6b4c13'
+down_revision: Union[str, Sequence[str], None] = '3b8f0c5d7e21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_feature_windows',
+    sa.Column('user_id', sa.String(length=100), nullable=False),
+    sa.Column('window_index', sa.Integer(), nullable=False),
+    sa.Column('first_ts', sa.BigInteger(), nullable=False),
+    sa.Column('last_ts', sa.BigInteger(), nullable=False),
+    sa.Column('event_count', sa.Integer(), nullable=False),
+    sa.Column('dt_count', sa.Integer(), nullable=False),
+    sa.Column('speed_sum', sa.Float(), nullable=False),
+    sa.Column('speed_sum_sq', sa.Float(), nullable=False),
+    sa.Column('speed_max', sa.Float(), nullable=False),
+    sa.Column('dt_sum', sa.Float(), nullable=False),
+    sa.Column('dt_sum_sq', sa.Float(), nullable=False),
+    sa.Column('distance_sum', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id', 'window_index')
+    )
+    op.create_table('user_feature_state',
+    sa.Column('user_id', sa.String(length=100), nullable=False),
+    sa.Column('n_events', sa.BigInteger(), nullable=False),
+    sa.Column('last_ts', sa.BigInteger(), nullable=True),
+    sa.Column('last_x', sa.Float(), nullable=True),
+    sa.Column('last_y', sa.Float(), nullable=True),
+    sa.Column('needs_rebuild', sa.Boolean(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index(op.f('ix_user_feature_state_needs_rebuild'), 'user_feature_state', ['needs_rebuild'], unique=False)
+    # Existing history is backfilled with services/event-logger/rebuild_features.py
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_user_feature_state_needs_rebuild'), table_name='user_feature_state')
+    op.drop_table('user_feature_state')
+    op.drop_table('user_feature_windows')
@@ -0,0 +1,30 @@
+"""Add stream_id to behavioral_events
+
+Revision ID: 7c1d2e9f4a10
+Revises: e410bfcf554c
+Create Date: 2025-11-20 14:12:05.481126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1d2e9f4a10'
+down_revision: Union[str, Sequence[str], None] = 'e410bfcf554c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('behavioral_events', sa.Column('stream_id', sa.String(length=32), nullable=True))
+    op.create_index(op.f('ix_behavioral_events_stream_id'), 'behavioral_events', ['stream_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_behavioral_events_stream_id'), table_name='behavioral_events')
+    op.drop_column('behavioral_events', 'stream_id')
@@ -0,0 +1,29 @@
+"""Add last_ts_count to user_feature_state
+
+Revision ID: 9e4b7a2c1f38
+Revises: 5d2a8e6b4c13
+Create Date: 2026-10-17 10:20:41.207316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4b7a2c1f38'
+down_revision: Union[str, Sequence[str], None] = '5d2a8e6b4c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing states applied at least their last event at last_ts
+    op.add_column('user_feature_state', sa.Column('last_ts_count', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('user_feature_state', 'last_ts_count')
@@ -0,0 +1,54 @@
+import sys
+import os
+import argparse
+from dotenv import load_dotenv
+
+# --- Path Setup ---
+# 1. Add project root to sys.path so we can import 'core'
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(project_root)
+
+# 2. Load the root .env file
+load_dotenv(os.path.join(project_root, '.env'))
+
+# --- Now, regular imports ---
+import logging
+
+# --- Our project's code ---
+from core.database import engine
+from core import archive
+
+# --- Configuration ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("partition-archiver")
+
+
+def main():
+    """
+    Moves aged 'behavioral_events' partitions to Parquet cold storage.
+    Run it daily, before manage_partitions.py (whose retention drop
+    would otherwise delete partitions that were never archived): it
+    exports each partition older than --older-than-days into per-user,
+    per-day files under ARCHIVE_DIR, then drops it. Training reads the
+    archive and the table together.
+    """
+    parser = argparse.ArgumentParser(description="Export aged behavioral_events partitions to Parquet and drop them.")
+    parser.add_argument("--older-than-days", type=int, default=archive.ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--dir", default=archive.ARCHIVE_DIR, help="archive directory")
+    parser.add_argument("--keep-partitions", action="store_true", help="export, but don't drop the partitions")
+    parser.add_argument("--dry-run", action="store_true", help="only list what would be archived")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        with engine.connect() as conn:
+            due = archive.partitions_to_archive(conn, args.older_than_days, args.dir)
+        logger.info(f"Would archive {len(due)} partition(s): {[name for name, _ in due]}")
+        return
+
+    exported = archive.archive_aged_partitions(engine, args.older_than_days, drop=not args.keep_partitions,
+                                               root=args.dir)
+    logger.info(f"Archived {len(exported)} partition(s) to {args.dir}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import logging
+import time
+
+from sqlalchemy import insert, select
+
+from core import metrics
+from core.models.BehavioralEvent import BehavioralEvent
+
+logger = logging.getLogger("event-logger")
+
+rows_inserted = metrics.Counter("logger_rows_inserted_total", "Rows written to behavioral_events")
+flush_errors = metrics.Counter("logger_flush_errors_total", "Batches that failed to insert")
+flush_seconds = metrics.Histogram("logger_batch_flush_seconds", "Time to insert and commit one batch")
+batch_rows = metrics.Histogram("logger_batch_rows", "Rows per flushed batch",
+                               buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000))
+
+
+def event_to_row(event_data: dict, stream_id: str | None = None) -> dict:
+    """
+    Maps a parsed event payload (as published by the ingestor)
+    onto the columns of the 'behavioral_events' table.
+    'received_at' is left to the DB default.
+    """
+    return {
+        "stream_id": stream_id,
+        "event_type": event_data.get('type'),
+        "x": event_data.get('x'),
+        "y": event_data.get('y'),
+        "key": event_data.get('key'),
+        "timestamp": event_data.get('timestamp'),
+        "user_id": event_data.get('user_id'),
+    }
+
+
+def existing_stream_ids(engine, stream_ids: list[str]) -> set[str]:
+    """
+    Returns which of the given stream entry IDs are already stored.
+    Used to skip redelivered entries that a crashed consumer had
+    written but not yet acked.
+    """
+    if not stream_ids:
+        return set()
+    column = BehavioralEvent.__table__.c.stream_id
+    with engine.connect() as conn:
+        result = conn.execute(select(column).where(column.in_(stream_ids)))
+        return {row[0] for row in result}
+
+
+class BatchWriter:
+    """
+    Buffers parsed events and writes them to the database in bulk.
+
+    A batch is flushed when it reaches 'batch_size' rows or when the
+    oldest buffered row is older than 'flush_interval' seconds,
+    whichever comes first. Each flush is ONE multi-row INSERT in ONE
+    transaction, instead of one INSERT + COMMIT per event.
+
+    'on_flush', if given, is called with the written rows after the
+    transaction commits (e.g. to ack the corresponding stream entries).
+    """
+
+    def __init__(self, engine, batch_size: int = 500, flush_interval: float = 0.5, on_flush=None):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+
+        self._rows: list[dict] = []
+        self._first_row_at: float | None = None
+
+        # Running totals, so we can tune batch_size / flush_interval
+        self.total_rows = 0
+        self.total_batches = 0
+        self.total_flush_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, row: dict) -> None:
+        """Buffers one row and flushes if the batch is full."""
+        self.add_many([row])
+
+    def add_many(self, rows: list[dict]) -> None:
+        """
+        Buffers rows that must be committed together (the events of one
+        stream entry) and flushes if the batch is full. A batch may go
+        over 'batch_size' by up to len(rows) - 1.
+        """
+        if not self._rows:
+            self._first_row_at = time.monotonic()
+        self._rows.extend(rows)
+
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def seconds_until_flush(self) -> float | None:
+        """
+        How long the caller may block waiting for new data before the
+        current batch is due. None means the buffer is empty.
+        """
+        if self._first_row_at is None:
+            return None
+        elapsed = time.monotonic() - self._first_row_at
+        return max(0.0, self.flush_interval - elapsed)
+
+    def flush_if_due(self) -> None:
+        """Flushes the buffer if its flush interval has elapsed."""
+        remaining = self.seconds_until_flush()
+        if remaining is not None and remaining <= 0:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Writes every buffered row with a single bulk INSERT.
+        Returns the number of rows written. On failure the batch is
+        dropped from the buffer and logged; 'on_flush' is not called,
+        so un-acked stream entries will be redelivered later.
+        """
+        if not self._rows:
+            return 0
+
+        rows = self._rows
+        self._rows = []
+        self._first_row_at = None
+
+        start = time.perf_counter()
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(insert(BehavioralEvent.__table__), rows)
+        except Exception as e:
+            logger.error(f"Database error while flushing {len(rows)} events: {e}")
+            flush_errors.inc()
+            return 0
+        elapsed = time.perf_counter() - start
+        flush_seconds.observe(elapsed)
+        batch_rows.observe(len(rows))
+        rows_inserted.inc(len(rows))
+
+        if self.on_flush is not None:
+            self.on_flush(rows)
+
+        self.total_rows += len(rows)
+        self.total_batches += 1
+        self.total_flush_seconds += elapsed
+
+        rows_per_s = len(rows) / elapsed if elapsed > 0 else float('inf')
+        # Per batch, so debug only; throughput is on /metrics
+        logger.debug(
+            f"Flushed batch of {len(rows)} events in {elapsed * 1000:.1f} ms "
+            f"({rows_per_s:,.0f} rows/s)"
+        )
+        return len(rows)
+
+    def stats(self) -> dict:
+        """Cumulative throughput since start-up."""
+        avg_rows_per_s = (
+            self.total_rows / self.total_flush_seconds
+            if self.total_flush_seconds > 0 else 0.0
+        )
+        return {
+            "rows": self.total_rows,
+            "batches": self.total_batches,
+            "avg_batch_size": self.total_rows / self.total_batches if self.total_batches else 0.0,
+            "avg_rows_per_s": avg_rows_per_s,
+        }
@@ -13,11 +13,19 @@ load_dotenv(os.path.join(project_root, '.env'))
 # --- Now, regular imports ---
 import redis
 import logging
-import json
+import argparse
+import time
+import signal
+import socket
+import threading
 
 # --- Our project's code ---
-from core.database import SessionLocal  # Import our session maker
-from core.models.BehavioralEvent import BehavioralEvent # Import our model
+from core.database import engine  # Bulk inserts go straight through the engine
+from core import partitions, metrics, event_codec
+from core.stream import StreamConsumer, CONSUMER_GROUP, STREAM_SHARDS, shard_streams, stream_for
+from core.feature_store import FeatureStoreUpdater
+from core.supervisor import ShardSupervisor
+from batch_writer import BatchWriter, event_to_row, existing_stream_ids
 
 # --- Configuration ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -27,83 +35,255 @@ logger = logging.getLogger("event-logger")
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = os.getenv("REDIS_PORT")
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
-REDIS_CHANNEL = "behavioral-stream"
+
+# Each logger process must have a unique consumer name within the group.
+# Set it explicitly to get a stable name that survives restarts.
+# Sharded workers are named '<LOGGER_CONSUMER_NAME or hostname>-w<n>'.
+CONSUMER_NAME = os.getenv("LOGGER_CONSUMER_NAME") or f"{socket.gethostname()}-{os.getpid()}"
+
+# --- Worker Config (from .env) ---
+# Worker processes, each owning a share of the STREAM_SHARDS streams
+# (overridden by --workers). 1 = a single process reads every stream.
+LOGGER_WORKERS = int(os.getenv("LOGGER_WORKERS", "1"))
+# A worker that dies more than LOGGER_MAX_RESTARTS times within
+# LOGGER_RESTART_WINDOW_S seconds is given up on, and its shards are
+# spread over the remaining workers.
+LOGGER_MAX_RESTARTS = int(os.getenv("LOGGER_MAX_RESTARTS", "5"))
+LOGGER_RESTART_WINDOW_S = int(os.getenv("LOGGER_RESTART_WINDOW_S", "60"))
+# How long workers get to flush and ack on shutdown before being killed
+LOGGER_STOP_TIMEOUT_S = int(os.getenv("LOGGER_STOP_TIMEOUT_S", "30"))
+
+# --- Batching Config (from .env) ---
+# Flush when this many events are buffered...
+BATCH_SIZE = int(os.getenv("LOGGER_BATCH_SIZE", "500"))
+# ...or when the oldest buffered event is this old (milliseconds)
+FLUSH_INTERVAL_MS = int(os.getenv("LOGGER_FLUSH_INTERVAL_MS", "500"))
+
+# --- Feature Store Config (from .env) ---
+# Keep the per-user window aggregates that training reads up to date
+FEATURE_STORE_ENABLED = os.getenv("FEATURE_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# --- Metrics Config (from .env) ---
+# /metrics is served on this port (0 = don't serve metrics)
+LOGGER_METRICS_PORT = int(os.getenv("LOGGER_METRICS_PORT", "9102"))
+
+events_received = metrics.Counter("logger_events_received_total", "Stream entries read")
+decode_errors = metrics.Counter("logger_decode_errors_total", "Stream entries that weren't valid events")
+redelivered_skipped = metrics.Counter("logger_redelivered_skipped_total", "Redelivered entries that were already stored")
+feature_apply_seconds = metrics.Histogram("logger_feature_store_apply_seconds", "Time to fold released events into the feature store")
+
+# The feature store updater of the running consume() loop, if any. The
+# metrics below read it, so they are registered once however many times
+# consume() runs in this process.
+feature_store_holder: dict[str, FeatureStoreUpdater | None] = {"updater": None}
+
+def feature_store_total(name: str) -> int:
+    updater = feature_store_holder["updater"]
+    return 0 if updater is None else getattr(updater, name)
+
+metrics.Counter("logger_feature_store_events_applied_total", "Mouse movements folded into feature windows",
+                function=lambda: feature_store_total("events_applied"))
+metrics.Counter("logger_feature_store_late_events_total", "Events too late for their windows",
+                function=lambda: feature_store_total("late_events"))
+metrics.Counter("logger_feature_store_rebuilds_total", "Users rebuilt from raw events",
+                function=lambda: feature_store_total("rebuilds"))
+sampled_log = metrics.SampledLog(logger)
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Persists the behavioral event stream(s) to PostgreSQL.")
+    parser.add_argument("--workers", type=int, default=LOGGER_WORKERS,
+                        help=f"worker processes, each owning some of the {STREAM_SHARDS} stream shard(s)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        supervisor = ShardSupervisor(run_worker, workers=args.workers, name="event-logger",
+                                     max_restarts=LOGGER_MAX_RESTARTS, restart_window=LOGGER_RESTART_WINDOW_S,
+                                     stop_timeout=LOGGER_STOP_TIMEOUT_S)
+        sys.exit(supervisor.run())
+
     logger.info("Starting Event Logger service...")
+    serve_metrics(LOGGER_METRICS_PORT)
+    redis_client = connect_redis()
+    if redis_client is None:
+        return # Exit if we can't connect
+
+    try:
+        consume(redis_client, engine)
+    except KeyboardInterrupt:
+        logger.info("Shutting down logger...")
+    finally:
+        redis_client.close()
+        logger.info("Disconnected from Redis and flushed pending events.")
+
+
+def run_worker(index: int, streams: list[str]):
+    """
+    Entry point of a sharded worker process (started by ShardSupervisor):
+    consumes only 'streams', until the supervisor sends SIGTERM.
+    """
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    # Ctrl-C reaches the whole process group; the supervisor turns it into SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
 
-    # --- Connect to Redis ---
+    logger.info(f"Worker {index} starting on {', '.join(streams)}")
+    serve_metrics(LOGGER_METRICS_PORT + index if LOGGER_METRICS_PORT else 0)
+    redis_client = connect_redis()
+    if redis_client is None:
+        sys.exit(1)
+
+    base_name = os.getenv("LOGGER_CONSUMER_NAME") or socket.gethostname()
+    try:
+        # Sole owner of these streams, so take over whatever the previous
+        # owner read but never acked right away
+        consume(redis_client, engine, consumer_name=f"{base_name}-w{index}", streams=streams, claim=True, stop=stop)
+    finally:
+        redis_client.close()
+        logger.info(f"Worker {index} stopped.")
+
+
+def serve_metrics(port: int):
+    if port:
+        try:
+            metrics.start_http_server(port)
+        except OSError as e:
+            # e.g. another logger on this host already has the port
+            logger.warning(f"Could not serve metrics on port {port}: {e}")
+
+
+def connect_redis():
+    """A connected Redis client, or None."""
     try:
         redis_client = redis.Redis(
             host=REDIS_HOST,
             port=REDIS_PORT,
             password=REDIS_PASSWORD,
-            decode_responses=True
+            decode_responses=False  # Entries may hold binary (msgpack) events
         )
         redis_client.ping()
         logger.info(f"Successfully connected to Redis at {REDIS_HOST}.")
+        return redis_client
     except Exception as e:
         logger.error(f"Failed to connect to Redis: {e}")
-        return # Exit if we can't connect
+        return None
 
-    # --- Subscribe to the Channel ---
-    pubsub = redis_client.pubsub()
-    pubsub.subscribe(REDIS_CHANNEL)
-    logger.info(f"Subscribed to Redis channel: {REDIS_CHANNEL}")
-    logger.info("Waiting for messages...")
 
-    # --- Get a database session ---
-    # We create one session and use it for the lifetime of the script
+def consume(redis_client, engine, consumer_name: str = CONSUMER_NAME, feature_store: bool = FEATURE_STORE_ENABLED,
+            streams: list[str] | None = None, claim: bool = False, stop=None, on_commit=None):
+    """
+    The logger's main loop: reads the stream(s), writes batches to the
+    database and keeps the feature store up to date, until 'stop' (a
+    threading.Event) is set or it's interrupted. Always flushes what's
+    buffered before returning.
+    'streams' defaults to every shard; 'claim' takes over their pending
+    entries at start-up (only for the streams' sole owner).
+    'on_commit', if given, is called with every committed batch of rows
+    (the benchmarks use it to measure end-to-end latency).
+    """
+    streams = streams or shard_streams()
+    # --- Make sure today's (and the next few days') partitions exist ---
     try:
-        db = SessionLocal()
-        logger.info("Database session created.")
+        with engine.begin() as conn:
+            partitions.ensure_partitions(conn)
     except Exception as e:
-        logger.error(f"Failed to create database session: {e}. Check DB connection and credentials.")
-        return
+        # Not fatal: rows still land in the DEFAULT partition
+        logger.warning(f"Could not create upcoming partitions: {e}")
+
+    # --- Join the Consumer Group ---
+    consumer = StreamConsumer(redis_client, consumer_name, stream=streams, count=BATCH_SIZE, claim=claim)
+    logger.info(f"Consuming {', '.join(streams)} as '{consumer_name}' in group '{CONSUMER_GROUP}'")
+    logger.info("Waiting for messages...")
+
+    # --- Set up the feature store ---
+    # Committed mouse movements are folded into per-user window totals,
+    # so retraining reads one row per window instead of every event.
+    features = None
+    if feature_store:
+        # Only this process may write its users' windows
+        owns = None
+        if set(streams) != set(shard_streams()):
+            owned = set(streams)
+            owns = lambda user_id: stream_for(user_id) in owned
+        features = FeatureStoreUpdater(engine, owns=owns)
+        try:
+            features.catch_up()
+        except Exception as e:
+            logger.warning(f"Could not catch up the feature store: {e}")
+        feature_store_holder["updater"] = features
+
+    # --- Set up the batch writer ---
+    # Events are buffered and written with one bulk INSERT per batch.
+    # Stream entries are only acked once their rows are committed.
+    def ack_rows(rows):
+        # An entry holds one or more events; all of its rows are in the same batch
+        consumer.ack(list(dict.fromkeys(row['stream_id'] for row in rows)))
+        if features is not None:
+            features.add(rows)
+        if on_commit is not None:
+            on_commit(rows)
+
+    writer = BatchWriter(
+        engine,
+        batch_size=BATCH_SIZE,
+        flush_interval=FLUSH_INTERVAL_MS / 1000.0,
+        on_flush=ack_rows
+    )
+    logger.info(f"Batching up to {BATCH_SIZE} events or {FLUSH_INTERVAL_MS} ms per insert.")
 
     # --- Listen for Messages ---
     try:
-        for message in pubsub.listen():
-            if message['type'] == 'message':
-                data_str = message['data']
-                logger.info(f"Received data: {data_str}")
-                
+        while stop is None or not stop.is_set():
+            # Block for new data, but never past the current batch's deadline
+            timeout = writer.seconds_until_flush()
+            if features is not None:
+                due = features.seconds_until_due()
+                if due is not None:
+                    timeout = due if timeout is None else min(timeout, due)
+            block_ms = 1000 if timeout is None else max(1, int(timeout * 1000))
+            entries, redelivered = consumer.read(block_ms=block_ms)
+
+            if redelivered:
+                # These may already be in the DB (written by a consumer
+                # that died before acking). Ack those without re-inserting.
+                already_saved = existing_stream_ids(engine, [entry_id for entry_id, _ in entries])
+                consumer.ack(list(already_saved))
+                redelivered_skipped.inc(len(already_saved))
+                entries = [(entry_id, fields) for entry_id, fields in entries if entry_id not in already_saved]
+
+            events_received.inc(len(entries))
+            for entry_id, fields in entries:
+                sampled_log.debug("Received entry: %s", entry_id)
+
+                # JSON (one event) or the compact format (a batch of one user's events)
                 try:
-                    # 1. Parse the JSON string
-                    event_data = json.loads(data_str)
-                    
-                    # 2. Create a model instance (The new ORM way)
-                    new_event = BehavioralEvent(
-                        event_type=event_data.get('type'),
-                        x=event_data.get('x'),
-                        y=event_data.get('y'),
-                        key=event_data.get('key'),
-                        timestamp=event_data.get('timestamp'),
-                        user_id=event_data.get('user_id')
-                        # 'received_at' will be set by the DB default
-                    )
-                    
-                    # 3. Add to the session and commit
-                    db.add(new_event)
-                    db.commit()
-                    logger.info("Successfully saved event to database.")
-                    
-                except json.JSONDecodeError:
-                    logger.error(f"Could not decode JSON: {data_str}")
-                    db.rollback() # Rollback on error
-                except Exception as e:
-                    logger.error(f"Database error: {e}")
-                    db.rollback() # Rollback on error
+                    events = event_codec.decode_fields(fields)
+                except ValueError as e:
+                    logger.error(f"Could not decode entry {entry_id}: {e}")
+                    decode_errors.inc()
+                    consumer.ack([entry_id]) # Never going to succeed, don't redeliver it
+                    continue
+                if not events:
+                    consumer.ack([entry_id])
+                    continue
+                # Together, so a flush never commits only part of an entry
+                writer.add_many([event_to_row(event, stream_id=entry_id) for event in events])
+
+            writer.flush_if_due()
+            if features is not None:
+                start = time.perf_counter()
+                if features.apply_due():
+                    feature_apply_seconds.observe(time.perf_counter() - start)
 
-    except KeyboardInterrupt:
-        logger.info("Shutting down logger...")
     except Exception as e:
         logger.error(f"An error occurred: {e}")
     finally:
-        pubsub.unsubscribe()
-        pubsub.close()
-        db.close() # Close the session
-        logger.info("Disconnected from Redis and closed DB session.")
+        # Don't lose whatever is still buffered
+        writer.flush()
+        logger.info(f"Write stats: {writer.stats()}")
+        if features is not None:
+            features.apply_all()
+            logger.info(f"Feature store stats: {features.stats()}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
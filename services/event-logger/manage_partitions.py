@@ -0,0 +1,51 @@
+import sys
+import os
+import argparse
+from dotenv import load_dotenv
+
+# --- Path Setup ---
+# 1. Add project root to sys.path so we can import 'core'
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(project_root)
+
+# 2. Load the root .env file
+load_dotenv(os.path.join(project_root, '.env'))
+
+# --- Now, regular imports ---
+import logging
+
+# --- Our project's code ---
+from core.database import engine
+from core import partitions
+
+# --- Configuration ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("partition-manager")
+
+
+def main():
+    """
+    Partition maintenance for 'behavioral_events'. Run it daily (cron,
+    k8s CronJob, ...): it creates the upcoming daily partitions and
+    drops the ones that fell out of the retention window.
+    """
+    parser = argparse.ArgumentParser(description="Create future and drop expired behavioral_events partitions.")
+    parser.add_argument("--days-ahead", type=int, default=partitions.PARTITION_DAYS_AHEAD)
+    parser.add_argument("--retention-days", type=int, default=partitions.PARTITION_RETENTION_DAYS)
+    parser.add_argument("--dry-run", action="store_true", help="only list what would be dropped")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        created = partitions.ensure_partitions(conn, days_ahead=args.days_ahead)
+        logger.info(f"Created {len(created)} partition(s).")
+
+        if args.dry_run:
+            expired = partitions.expired_partitions(conn, args.retention_days)
+            logger.info(f"Would drop {len(expired)} expired partition(s): {expired}")
+        else:
+            dropped = partitions.drop_expired_partitions(conn, args.retention_days)
+            logger.info(f"Dropped {len(dropped)} expired partition(s).")
+
+
+if __name__ == "__main__":
+    main()
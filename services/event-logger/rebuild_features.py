@@ -0,0 +1,65 @@
+import sys
+import os
+import argparse
+from dotenv import load_dotenv
+
+# --- Path Setup ---
+# 1. Add project root to sys.path so we can import 'core'
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(project_root)
+
+# 2. Load the root .env file
+load_dotenv(os.path.join(project_root, '.env'))
+
+# --- Now, regular imports ---
+import logging
+from sqlalchemy import select
+
+# --- Our project's code ---
+from core.database import engine
+from core import feature_store
+from core.models.BehavioralEvent import BehavioralEvent
+
+# --- Configuration ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("feature-rebuilder")
+
+
+def main():
+    """
+    (Re)builds the feature store from raw events: run it once after the
+    'user_feature_windows' migration to backfill existing history, or
+    for a user whose windows look wrong.
+
+    By default users are only flagged, and the running event logger
+    rebuilds them a few at a time. --now rebuilds them in this process,
+    which is only safe while no event logger is running.
+    """
+    parser = argparse.ArgumentParser(description="Backfill/rebuild per-user feature windows from behavioral_events.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--user", action="append", dest="users", help="user to rebuild (repeatable)")
+    target.add_argument("--all-users", action="store_true", help="every user with mouse movements")
+    parser.add_argument("--now", action="store_true", help="rebuild here instead of flagging (stop the logger first)")
+    args = parser.parse_args()
+
+    user_ids = args.users
+    if args.all_users:
+        with engine.connect() as conn:
+            user_ids = conn.execute(
+                select(BehavioralEvent.user_id).distinct()
+                .where(BehavioralEvent.event_type == 'mousemove', BehavioralEvent.user_id.is_not(None))
+            ).scalars().all()
+
+    if not args.now:
+        with engine.begin() as conn:
+            feature_store.mark_for_rebuild(conn, user_ids)
+        logger.info(f"Flagged {len(user_ids)} user(s); the event logger will rebuild them.")
+        return
+
+    for user_id in user_ids:
+        feature_store.rebuild_user(engine, user_id)
+    logger.info(f"Rebuilt feature windows for {len(user_ids)} user(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,12 +11,28 @@ export interface BehavioralEvent {
   target?: string;
 }
 
+// A live score of one window of the user's behavior, pushed by the
+// ingestor from the risk engine's stream scorer
+export interface RiskScore {
+  type: 'risk_score';
+  user_id: string;
+  score: number;
+  is_anomalous: boolean;
+  window_end_ts: number;
+  scored_at: number;
+}
+
 export class WebSocketManager {
   private ws: WebSocket | null = null;
   private token: string | null = null;
   private reconnectAttempts = 0;
   private maxReconnectAttempts = 5;
   private reconnectDelay = 1000;
+  // Set when the ingestor asks us to slow down; events are held until then
+  private pausedUntil = 0;
+  private held: BehavioralEvent[] = [];
+  private maxHeldEvents = 2000;
+  private riskScoreListeners = new Set<(score: RiskScore) => void>();
 
   /**
    * Connect to the WebSocket with authentication token
@@ -35,6 +51,19 @@ export class WebSocketManager {
           resolve();
         };
 
+        this.ws.onmessage = (message) => {
+          try {
+            const data = JSON.parse(message.data);
+            if (data.type === 'backpressure' && data.action === 'slow_down') {
+              this.pausedUntil = Date.now() + (data.retry_after_ms ?? 1000);
+            } else if (data.type === 'risk_score') {
+              this.riskScoreListeners.forEach((listener) => listener(data as RiskScore));
+            }
+          } catch {
+            // Not a control message
+          }
+        };
+
         this.ws.onerror = (error) => {
           console.error('WebSocket error:', error);
           reject(error);
@@ -64,6 +93,21 @@ export class WebSocketManager {
    * Send events batch to the WebSocket
    */
   sendEvents(events: BehavioralEvent[]): void {
+    if (Date.now() < this.pausedUntil) {
+      // The ingestor is congested: hold the events (the oldest go first
+      // if there are too many) and send them with the next batch
+      this.held.push(...events);
+      if (this.held.length > this.maxHeldEvents) {
+        this.held.splice(0, this.held.length - this.maxHeldEvents);
+      }
+      return;
+    }
+
+    if (this.held.length > 0) {
+      events = this.held.concat(events);
+      this.held = [];
+    }
+
     if (this.ws && this.ws.readyState === WebSocket.OPEN) {
       try {
         this.ws.send(JSON.stringify(events));
@@ -75,6 +119,17 @@ export class WebSocketManager {
     }
   }
 
+  /**
+   * Subscribe to live risk scores (e.g. to open the security challenge
+   * when a window is anomalous). Returns a function that unsubscribes.
+   */
+  onRiskScore(listener: (score: RiskScore) => void): () => void {
+    this.riskScoreListeners.add(listener);
+    return () => {
+      this.riskScoreListeners.delete(listener);
+    };
+  }
+
   /**
    * Disconnect from the WebSocket
    */
@@ -0,0 +1,57 @@
+from collections import Counter
+
+
+class AdmissionController:
+    """
+    Caps how many WebSocket connections the ingestor serves, in total
+    and per user, so an overload (or a reconnect storm) is turned away
+    at the door instead of degrading every connection.
+
+    Runs on the event loop only, so it needs no locking. Every admitted
+    connection must be released exactly once.
+    """
+
+    def __init__(self, max_connections: int, max_per_user: int):
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+
+        self.active = 0
+        self._per_user: Counter[str] = Counter()
+
+        self.admitted = 0
+        self.rejected = Counter()
+
+    def admit_connection(self) -> bool:
+        """Checked before authenticating: is there room for one more?"""
+        if self.max_connections > 0 and self.active >= self.max_connections:
+            self.rejected["max_connections"] += 1
+            return False
+        self.active += 1
+        return True
+
+    def admit_user(self, user_id: str) -> bool:
+        """Checked after authenticating: may this user open another one?"""
+        if self.max_per_user > 0 and self._per_user[user_id] >= self.max_per_user:
+            self.rejected["max_per_user"] += 1
+            return False
+        self._per_user[user_id] += 1
+        self.admitted += 1
+        return True
+
+    def release_user(self, user_id: str) -> None:
+        self._per_user[user_id] -= 1
+        if self._per_user[user_id] <= 0:
+            del self._per_user[user_id]
+
+    def release_connection(self) -> None:
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active_connections": self.active,
+            "active_users": len(self._per_user),
+            "max_connections": self.max_connections,
+            "max_per_user": self.max_per_user,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
@@ -1,10 +1,15 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
 import logging
-import redis
+import redis.asyncio as aioredis
 import json
 import os
+import time
 import jwt
 import sys
+from collections import Counter
 from dotenv import load_dotenv # <-- Import load_dotenv
 
 # --- Configuration ---
@@ -14,6 +19,13 @@ sys.path.append(project_root)
 # Load the .env file from the PROJECT ROOT
 load_dotenv(os.path.join(project_root, '.env'))
 
+from core import stream, metrics, event_codec, decimation
+from token_cache import TokenCache
+from admission import AdmissionController
+from publish_queue import PublishQueue
+from score_relay import ScoreRelay
+from core.decimation import MouseDecimator, INGEST_DECIMATION
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("ingestor")
@@ -22,23 +34,77 @@ logger = logging.getLogger("ingestor")
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = os.getenv("REDIS_PORT")
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
-REDIS_CHANNEL = "behavioral-stream"
 
-JWT_SECRET = os.getenv("JWT_SECRET")
+# .env.example calls it JWT_SECRET_KEY (shared with the identity service)
+JWT_SECRET = os.getenv("JWT_SECRET") or os.getenv("JWT_SECRET_KEY")
+JWT_ISSUER = os.getenv("JWT_ISSUER")
+JWT_AUDIENCE = os.getenv("JWT_AUDIENCE")
+
+# --- Token Cache Config (from .env) ---
+# Verified tokens are remembered (by digest) until they expire, so a
+# reconnect storm doesn't re-verify the same tokens over and over.
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+JWT_CACHE_MAX_TTL_S = int(os.getenv("JWT_CACHE_MAX_TTL_S", "300"))
+token_cache = TokenCache(max_size=JWT_CACHE_SIZE, max_ttl=JWT_CACHE_MAX_TTL_S)
+
+# --- Admission Config (from .env) ---
+# Connections beyond these limits are closed right away with 1013
+# ("try again later"); 0 means unlimited.
+INGEST_MAX_CONNECTIONS = int(os.getenv("INGEST_MAX_CONNECTIONS", "10000"))
+INGEST_MAX_CONNECTIONS_PER_USER = int(os.getenv("INGEST_MAX_CONNECTIONS_PER_USER", "5"))
+admission = AdmissionController(INGEST_MAX_CONNECTIONS, INGEST_MAX_CONNECTIONS_PER_USER)
+
+# --- Redis Connection Config (from .env) ---
+# The client is created in the app's lifespan, not at import. Until
+# Redis answers a ping it's retried in the background, backing off up
+# to this long between attempts, so a Redis blip at startup only
+# delays ingestion instead of disabling it for the life of the process.
+REDIS_CONNECT_MAX_DELAY_S = float(os.getenv("REDIS_CONNECT_MAX_DELAY_S", "10"))
 
-# Connect to your Redis Cloud instance
-try:
-    redis_client = redis.Redis(
+# Async Redis client, so publishing never blocks the event loop
+redis_client: aioredis.Redis | None = None
+# Set once Redis has answered a ping
+redis_ready = asyncio.Event()
+
+
+def create_redis_client() -> aioredis.Redis:
+    # No connection is opened here; the pool connects on first use.
+    return aioredis.Redis(
         host=REDIS_HOST,
         port=REDIS_PORT,
         password=REDIS_PASSWORD,
         decode_responses=True  # <-- Good practice: decodes responses from bytes to strings
     )
-    redis_client.ping()
-    logger.info(f"Successfully connected to Redis at {REDIS_HOST}.")
-except Exception as e:
-    logger.error(f"Failed to connect to Redis: {e}")
-    redis_client = None
+
+
+async def connect_redis() -> None:
+    """ Pings Redis until it answers, then marks it ready. """
+    delay = 0.1
+    while True:
+        try:
+            await redis_client.ping()
+            logger.info(f"Successfully connected to Redis at {REDIS_HOST}.")
+            redis_ready.set()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to connect to Redis, retrying in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, REDIS_CONNECT_MAX_DELAY_S)
+
+# --- Publish Queue Config (from .env) ---
+# Frames are queued in-process and written to Redis by publisher tasks,
+# so a slow Redis doesn't stall the receive loops. INGEST_OVERFLOW_POLICY
+# (drop_oldest, sample_mousemoves or slow_down) decides what happens
+# when the queue is full; see publish_queue.py.
+INGEST_QUEUE_MAX_EVENTS = int(os.getenv("INGEST_QUEUE_MAX_EVENTS", "50000"))
+INGEST_PUBLISHERS = int(os.getenv("INGEST_PUBLISHERS", "4"))
+INGEST_PUBLISH_BATCH = int(os.getenv("INGEST_PUBLISH_BATCH", "500"))
+INGEST_OVERFLOW_POLICY = os.getenv("INGEST_OVERFLOW_POLICY", "drop_oldest")
+INGEST_SAMPLE_EVERY = int(os.getenv("INGEST_SAMPLE_EVERY", "4"))
+# A connection is told to slow down at most this often
+INGEST_SLOW_DOWN_INTERVAL_MS = int(os.getenv("INGEST_SLOW_DOWN_INTERVAL_MS", "1000"))
 
 if not JWT_SECRET:
     logger.critical("JWT_SECRET NOT SET. AUTHENTICATION WILL FAIL.")
@@ -54,7 +120,13 @@ async def get_user_id_from_token(token: str | None) -> str | None:
     if token is None:
         logger.warning("WebSocket connection attempt without a token.")
         return None
-        
+
+    # Fast path: this exact token was verified recently and hasn't expired
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        logger.debug(f"Token cache hit for user_id: {user_id}")
+        return user_id
+
     try:
         # Decode the token
         # This checks signature, expiration, issuer, and audience all at once
@@ -72,6 +144,7 @@ async def get_user_id_from_token(token: str | None) -> str | None:
         
         if user_id:
             logger.info(f"Token validated for user_id: {user_id}")
+            token_cache.put(token, user_id, payload.get('exp'))
             return user_id
         else:
             logger.warning("Token was valid, but 'sub' (user_id) claim was missing.")
@@ -87,14 +160,163 @@ async def get_user_id_from_token(token: str | None) -> str | None:
         logger.error(f"An unexpected error occurred during token decoding: {e}")
         return None
 
+# --- Metrics ---
+frames_received = metrics.Counter("ingest_frames_received_total", "WebSocket frames received")
+events_received = metrics.Counter("ingest_events_received_total", "Events received from clients")
+events_published = metrics.Counter("ingest_events_published_total", "Events written to the Redis Stream")
+publish_seconds = metrics.Histogram("ingest_publish_seconds", "Time to write one batch to the Redis Stream")
+sampled_log = metrics.SampledLog(logger)
+
+# Mousemoves received and dropped by decimation, over all connections
+decimation_totals = Counter()
+
+
+def new_decimator() -> MouseDecimator:
+    """
+    A connection's decimation stage, with the configured mode (see
+    core/decimation.py for INGEST_DECIMATION and its settings).
+    """
+    return decimation.new_decimator(totals=decimation_totals)
+
+new_decimator()  # An unknown mode fails at startup, not on the first connection
+
+
+def decimation_stats() -> dict:
+    received, dropped = decimation_totals["mousemoves"], decimation_totals["dropped"]
+    return {
+        "mode": INGEST_DECIMATION,
+        "mousemoves_received": received,
+        "mousemoves_dropped": dropped,
+        "reduction_ratio": dropped / received if received else 0.0,
+    }
+
+
+async def publish_events(events: list[dict]):
+    """
+    Appends a batch of ENRICHED events to the Redis Stream
+    in one round trip (pipeline, no MULTI/EXEC needed).
+    Each user's events in the batch become one compact entry
+    (or one JSON entry per event, see STREAM_ENCODING).
+    """
+    start = time.perf_counter()
+    by_user: dict[str, list[dict]] = {}
+    for event in events:
+        by_user.setdefault(event.get('user_id'), []).append(event)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for user_id, user_events in by_user.items():
+            target = stream.stream_for(user_id)
+            for data in event_codec.encode_entries(user_id, user_events):
+                stream.publish(pipe, data, stream=target)
+        await pipe.execute()
+    publish_seconds.observe(time.perf_counter() - start)
+    events_published.inc(len(events))
+
+publish_queue = PublishQueue(
+    publish_events,
+    max_events=INGEST_QUEUE_MAX_EVENTS,
+    workers=INGEST_PUBLISHERS,
+    batch_size=INGEST_PUBLISH_BATCH,
+    policy=INGEST_OVERFLOW_POLICY,
+    sample_every=INGEST_SAMPLE_EVERY
+)
+slow_down_signals = 0
+
+# Live risk scores from the risk engine's stream scorer are pushed to
+# the scored user's open connections as {"type": "risk_score", ...}
+score_relay = ScoreRelay(stream.RISK_SCORES_CHANNEL)
+
+metrics.Gauge("ingest_queue_depth", "Events waiting in the publish queue", function=lambda: len(publish_queue))
+metrics.Counter("ingest_events_dropped_total", "Events dropped by the publish queue", ("reason",),
+                function=lambda: dict(publish_queue.dropped))
+metrics.Counter("ingest_publish_errors_total", "Failed (and retried) publish batches",
+                function=lambda: publish_queue.publish_errors)
+metrics.Counter("ingest_slow_down_signals_total", "Backpressure messages sent to clients",
+                function=lambda: slow_down_signals)
+metrics.Counter("ingest_mousemoves_received_total", "Mousemoves received before decimation",
+                function=lambda: decimation_totals["mousemoves"])
+metrics.Counter("ingest_mousemoves_decimated_total", "Mousemoves dropped by decimation",
+                function=lambda: decimation_totals["dropped"])
+metrics.Gauge("ingest_decimation_reduction_ratio", "Share of received mousemoves dropped by decimation",
+              function=lambda: decimation_stats()["reduction_ratio"])
+metrics.Gauge("ingest_redis_ready", "1 once Redis has answered a ping", function=lambda: int(redis_ready.is_set()))
+metrics.Gauge("ingest_connections", "Open WebSocket connections", function=lambda: admission.active)
+metrics.Counter("ingest_connections_rejected_total", "Connections closed by admission control", ("reason",),
+                function=lambda: dict(admission.rejected))
+metrics.Counter("ingest_risk_scores_relayed_total", "Risk scores sent to client connections",
+                function=lambda: score_relay.delivered)
+metrics.Counter("ingest_token_cache_hits_total", "Tokens found in the verified-token cache",
+                function=lambda: token_cache.hits)
+metrics.Counter("ingest_token_cache_misses_total", "Tokens that had to be verified",
+                function=lambda: token_cache.misses)
+
 # --- FastAPI App ---
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global redis_client
+    # Tests and benchmarks may have set their own client; that one is
+    # theirs to close
+    own_client = redis_client is None
+    if own_client:
+        redis_client = create_redis_client()
+    # Startup doesn't wait for Redis: the publishers and the score relay
+    # retry on their own, and connections are refused until it's ready
+    connecting = asyncio.create_task(connect_redis())
+    publish_queue.start()
+    score_relay.start(redis_client)
+    yield
+    connecting.cancel()
+    await score_relay.stop()
+    # Flush what's still queued before the connection goes away
+    await publish_queue.stop()
+    redis_ready.clear()
+    if own_client:
+        await redis_client.aclose()
+        # A later startup in this process creates a fresh one
+        redis_client = None
+
+app = FastAPI(lifespan=lifespan)
+
+
+def parse_frame(data_str: str, user_id: str) -> list[dict]:
+    """
+    Decodes one WebSocket frame into a list of events.
+    The frontend sends a JSON array of events per frame; a single
+    event object is accepted too. Every event is stamped with the
+    authenticated user_id (never trust one sent by the client).
+    """
+    payload = json.loads(data_str)
+    events = payload if isinstance(payload, list) else [payload]
+
+    batch = []
+    for event in events:
+        if isinstance(event, dict):
+            event['user_id'] = user_id
+            batch.append(event)
+    return batch
 
 @app.get("/")
 def read_root():
     """ A simple health check endpoint. """
     return {"status": "Ingestor Service is running"}
 
+@app.get("/stats")
+def read_stats():
+    """ Redis state, token cache, admission, publish queue and decimation counters. """
+    return {
+        "redis_ready": redis_ready.is_set(),
+        "token_cache": token_cache.stats(),
+        "admission": admission.stats(),
+        "publish_queue": {**publish_queue.stats(), "slow_down_signals": slow_down_signals},
+        "risk_scores": score_relay.stats(),
+        "decimation": decimation_stats(),
+    }
+
+
+@app.get("/metrics")
+def read_metrics():
+    """ Prometheus metrics. """
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 
 @app.websocket("/ws/ingest")
 async def websocket_endpoint(websocket: WebSocket, token: str | None = None):
@@ -102,39 +324,82 @@ async def websocket_endpoint(websocket: WebSocket, token: str | None = None):
     The main WebSocket endpoint for ingesting behavioral data.
     """
     await websocket.accept()
-    
-    user_id = await get_user_id_from_token(token)
-    if user_id is None:
-        # Reject connection if token is invalid, expired, or missing
-        logger.error("Connection rejected: Invalid or missing token.")
-        await websocket.close(code=1008, reason="Invalid authentication token")
+
+    # Shed load before spending anything on the connection
+    if not admission.admit_connection():
+        logger.warning("Connection rejected: server at max connections.")
+        await websocket.close(code=1013, reason="Server busy, try again later")
         return
 
+    try:
+        user_id = await get_user_id_from_token(token)
+        if user_id is None:
+            # Reject connection if token is invalid, expired, or missing
+            logger.error("Connection rejected: Invalid or missing token.")
+            await websocket.close(code=1008, reason="Invalid authentication token")
+            return
+
+        if not admission.admit_user(user_id):
+            logger.warning(f"Connection rejected: too many connections for user_id: {user_id}")
+            await websocket.close(code=1013, reason="Too many connections for this user")
+            return
+
+        score_relay.register(user_id, websocket)
+        try:
+            await ingest(websocket, user_id)
+        finally:
+            score_relay.unregister(user_id, websocket)
+            admission.release_user(user_id)
+    finally:
+        admission.release_connection()
+
+
+async def ingest(websocket: WebSocket, user_id: str):
+    """ Queues every frame an authenticated client sends for publishing. """
+    global slow_down_signals
     logger.info(f"Client connected and authenticated for user_id: {user_id}")
-    
-    if not redis_client:
-        logger.error("Redis connection not available. Closing WebSocket.")
+
+    if not redis_ready.is_set():
+        logger.error("Redis connection not available (yet). Closing WebSocket.")
         await websocket.close(code=1011, reason="Internal server error: No Redis connection")
         return
 
+    last_slow_down = 0.0
+    decimator = new_decimator()
     try:
         while True:
-            data = await websocket.receive_text()
+            data_str = await websocket.receive_text()
             
             try:
-                data_json = json.loads(data_str)
-                data_json['user_id'] = user_id
-                
-                enriched_data_str = json.dumps(data_json)
-                
-                # Publish the ENRICHED data to Redis
-                redis_client.publish(REDIS_CHANNEL, enriched_data_str)
-                logger.info(f"Published enriched data: {enriched_data_str}")
-                
-            except Exception as e:
-                logger.error(f"Error publishing to Redis: {e}")
+                frames_received.inc()
+                events = parse_frame(data_str, user_id)
+                if not events:
+                    continue
+                events_received.inc(len(events))
+                events = decimator.filter(events)
+                if not events:
+                    continue
+
+                # Returns as soon as the events are queued (under the
+                # slow_down policy it waits while the queue is full)
+                congested = await publish_queue.put(events)
+                sampled_log.debug("Queued %d events for user_id: %s", len(events), user_id)
+
+                if congested and publish_queue.policy == "slow_down":
+                    now = time.monotonic()
+                    if now - last_slow_down >= INGEST_SLOW_DOWN_INTERVAL_MS / 1000:
+                        last_slow_down = now
+                        slow_down_signals += 1
+                        await websocket.send_json({
+                            "type": "backpressure",
+                            "action": "slow_down",
+                            "retry_after_ms": INGEST_SLOW_DOWN_INTERVAL_MS,
+                        })
+
+            except json.JSONDecodeError:
+                logger.error(f"Could not decode JSON frame from user_id: {user_id}")
                 
     except WebSocketDisconnect:
         logger.warning("Client disconnected.")
     except Exception as e:
-        logger.error(f"An error occurred in WebSocket: {e}")
\ No newline at end of file
+        logger.error(f"An error occurred in WebSocket: {e}")
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+from collections import Counter, deque
+
+from core.stream import shard_of
+
+logger = logging.getLogger("ingestor")
+
+# What to do with new events when the queue is full
+OVERFLOW_POLICIES = ("drop_oldest", "sample_mousemoves", "slow_down")
+
+
+class PublishQueue:
+    """
+    A bounded in-process buffer between the WebSocket handlers and Redis.
+
+    Handlers put() parsed events and go straight back to reading the
+    socket; 'workers' publisher tasks drain the queue in batches of up
+    to 'batch_size' events through 'publish' (an async callable that
+    writes one batch). If Redis is slow or down, events pile up here
+    (and a failed batch is retried, with backoff) instead of stalling
+    every connection, and 'max_events' caps the memory that can take.
+
+    Every publisher has a lane of its own, and a user's events always go
+    to the same lane (by shard_of(user_id)). So one user's batches are
+    sent by one task, one after another, and a failed batch is retried
+    before anything queued behind it: each user's events reach the
+    stream in the order they were received, which the feature store and
+    the stream scorer rely on.
+
+    What happens when the queue is full depends on 'policy':
+    - drop_oldest: the oldest queued events are dropped to make room.
+    - sample_mousemoves: above the high watermark only every
+      'sample_every'-th mousemove is queued, keydown/click always are.
+      When it's full, new mousemoves are dropped and a keydown/click
+      drops the oldest event instead.
+    - slow_down: above the high watermark put() reports that the client
+      should slow down; when full, put() waits for room, which stops the
+      handler reading its socket (TCP backpressure). Nothing is dropped
+      unless a failed batch no longer fits back in.
+    """
+
+    def __init__(self, publish, max_events: int = 50000, workers: int = 4, batch_size: int = 500,
+                 policy: str = "drop_oldest", high_watermark: float = 0.75, sample_every: int = 4,
+                 max_retry_delay: float = 2.0):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}, expected one of {OVERFLOW_POLICIES}")
+        if max_events < 1:
+            raise ValueError(f"max_events must be at least 1, got {max_events}")
+        self.publish = publish
+        self.max_events = max_events
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.policy = policy
+        self.high_watermark = int(max_events * high_watermark)
+        self.sample_every = max(1, sample_every)
+        self.max_retry_delay = max_retry_delay
+
+        # One lane per publisher, of (arrival number, event): the number
+        # tells which lane holds the oldest event when one must be dropped
+        self._lanes: list[deque[tuple[int, dict]]] = [deque() for _ in range(self.workers)]
+        self._lane_ready = [asyncio.Event() for _ in range(self.workers)]
+        self._size = 0
+        self._arrivals = 0
+        self._has_room = asyncio.Event()
+        self._has_room.set()
+        self._tasks: list[asyncio.Task] = []
+        self._mousemoves_seen = 0
+
+        # Counters
+        self.enqueued = 0
+        self.published = 0
+        self.publish_errors = 0
+        self.max_depth = 0
+        self.dropped = Counter()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def start(self) -> None:
+        """Starts the publisher tasks (on the running event loop)."""
+        self._tasks = [asyncio.create_task(self._publisher(lane)) for lane in range(self.workers)]
+        logger.info(f"Started {self.workers} publishers (queue of {self.max_events} events, policy {self.policy}).")
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        """Gives the publishers up to 'drain_timeout' seconds to empty the queue, then stops them."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + drain_timeout
+        while self._size and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._size:
+            self.dropped["shutdown"] += self._size
+            logger.warning(f"Dropped {self._size} queued events on shutdown.")
+            for lane in self._lanes:
+                lane.clear()
+            self._size = 0
+
+    async def put(self, events: list[dict]) -> bool:
+        """
+        Queues one frame's events. Returns True if the queue is above
+        its high watermark, i.e. the client should slow down.
+        Only waits (for room) under the slow_down policy.
+        """
+        if self.policy == "sample_mousemoves" and self._size >= self.high_watermark:
+            events = self._sample(events)
+
+        for event in events:
+            if self._size >= self.max_events:
+                if self.policy == "slow_down":
+                    while self._size >= self.max_events:
+                        self._has_room.clear()
+                        await self._has_room.wait()
+                elif self.policy == "sample_mousemoves" and event.get('type') == 'mousemove':
+                    self.dropped["overflow"] += 1
+                    continue
+                else:
+                    self._drop_oldest()
+                    self.dropped["overflow"] += 1
+            lane = shard_of(event.get('user_id'), self.workers)
+            self._lanes[lane].append((self._arrivals, event))
+            self._lane_ready[lane].set()
+            self._arrivals += 1
+            self._size += 1
+            self.enqueued += 1
+
+        self.max_depth = max(self.max_depth, self._size)
+        return self._size >= self.high_watermark
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._size,
+            "max_depth": self.max_depth,
+            "capacity": self.max_events,
+            "policy": self.policy,
+            "enqueued": self.enqueued,
+            "published": self.published,
+            "publish_errors": self.publish_errors,
+            "dropped": dict(self.dropped),
+        }
+
+    def _sample(self, events: list[dict]) -> list[dict]:
+        """Keeps every keydown/click but only every 'sample_every'-th mousemove."""
+        kept = []
+        for event in events:
+            if event.get('type') == 'mousemove':
+                self._mousemoves_seen += 1
+                if self._mousemoves_seen % self.sample_every:
+                    self.dropped["sampled"] += 1
+                    continue
+            kept.append(event)
+        return kept
+
+    def _drop_oldest(self) -> None:
+        """Drops the event that has been queued longest, whichever lane it's in."""
+        queued = [lane for lane in self._lanes if lane]
+        if not queued:
+            return
+        oldest = min(queued, key=lambda lane: lane[0][0])
+        oldest.popleft()
+        self._size -= 1
+
+    def _requeue(self, lane: int, batch: list[tuple[int, dict]], reason: str) -> None:
+        """Puts a batch that wasn't published back at the front of its lane, as far as there's room."""
+        room = max(0, self.max_events - self._size)
+        if room < len(batch):
+            self.dropped[reason] += len(batch) - room
+            batch = batch[:room]
+        self._lanes[lane].extendleft(reversed(batch))
+        self._size += len(batch)
+        if batch:
+            self._lane_ready[lane].set()
+
+    async def _publisher(self, lane: int) -> None:
+        events, ready = self._lanes[lane], self._lane_ready[lane]
+        retry_delay = 0.0
+        while True:
+            while not events:
+                ready.clear()
+                await ready.wait()
+
+            batch = [events.popleft() for _ in range(min(self.batch_size, len(events)))]
+            self._size -= len(batch)
+            self._has_room.set()
+
+            try:
+                await self.publish([event for _, event in batch])
+            except asyncio.CancelledError:
+                self._requeue(lane, batch, "shutdown")
+                raise
+            except Exception as e:
+                self.publish_errors += 1
+                retry_delay = min(self.max_retry_delay, max(0.05, retry_delay * 2))
+                logger.error(f"Error publishing {len(batch)} events to Redis (retrying in {retry_delay:.2f}s): {e}")
+                # Retried before anything behind it in the lane, so order holds
+                self._requeue(lane, batch, "publish_failed")
+                await asyncio.sleep(retry_delay)
+                continue
+
+            retry_delay = 0.0
+            self.published += len(batch)
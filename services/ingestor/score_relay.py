@@ -0,0 +1,98 @@
+import json
+import asyncio
+import logging
+
+logger = logging.getLogger("ingestor")
+
+
+class ScoreRelay:
+    """
+    Forwards the stream scorer's live risk scores (published on a Redis
+    pub/sub channel, one JSON message per window) to the WebSocket
+    connections of the user they're about.
+
+    Handlers register() their socket once the user is authenticated and
+    unregister() it when it closes. One subscriber task serves every
+    connection of this ingestor; a score for a user connected to another
+    ingestor is simply ignored here. Pub/sub is fire-and-forget: scores
+    published while the subscription is down are not replayed.
+    """
+
+    def __init__(self, channel: str, max_retry_delay: float = 5.0):
+        self.channel = channel
+        self.max_retry_delay = max_retry_delay
+
+        self._sockets: dict[str, set] = {}
+        self._task: asyncio.Task | None = None
+
+        # Counters
+        self.received = 0
+        self.delivered = 0
+        self.send_errors = 0
+
+    def register(self, user_id: str, websocket) -> None:
+        self._sockets.setdefault(user_id, set()).add(websocket)
+
+    def unregister(self, user_id: str, websocket) -> None:
+        sockets = self._sockets.get(user_id)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self._sockets[user_id]
+
+    def start(self, client) -> None:
+        """Starts the subscriber task (on the running event loop)."""
+        self._task = asyncio.create_task(self._subscriber(client))
+        logger.info(f"Relaying risk scores from channel '{self.channel}'.")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def deliver(self, message: str) -> int:
+        """Sends one published score to its user's sockets. Returns how many got it."""
+        self.received += 1
+        try:
+            user_id = json.loads(message).get("user_id")
+        except (json.JSONDecodeError, AttributeError):
+            logger.error(f"Could not decode risk score: {message}")
+            return 0
+
+        sent = 0
+        for websocket in list(self._sockets.get(user_id, ())):
+            try:
+                await websocket.send_text(message)
+                sent += 1
+            except Exception as e:
+                # The receive loop notices the closed socket and unregisters it
+                self.send_errors += 1
+                logger.debug(f"Could not relay risk score to {user_id}: {e}")
+        self.delivered += sent
+        return sent
+
+    async def _subscriber(self, client) -> None:
+        delay = 0.1
+        while True:
+            try:
+                async with client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    delay = 0.1
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            await self.deliver(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Risk score subscription failed, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    def stats(self) -> dict:
+        return {
+            "connected_users": len(self._sockets),
+            "received": self.received,
+            "delivered": self.delivered,
+            "send_errors": self.send_errors,
+        }
@@ -0,0 +1,70 @@
+import time
+import hashlib
+from collections import OrderedDict
+
+
+class TokenCache:
+    """
+    A bounded cache of already-verified JWTs: token digest -> (user_id, exp).
+
+    When many clients reconnect at once (the frontend retries with
+    backoff), most present a token we verified moments ago; a hit costs
+    one SHA-256 instead of a full decode + signature check.
+
+    - Keys are SHA-256 digests, so raw tokens are never kept in memory.
+    - An entry expires at the token's own 'exp' (or after 'max_ttl'
+      seconds, whichever is first), so a cached token is never accepted
+      after it would have failed verification.
+    - Only successful verifications are cached.
+    - At most 'max_size' entries; the least recently used is evicted.
+    """
+
+    def __init__(self, max_size: int = 10000, max_ttl: float = 300.0):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+
+        self._entries: OrderedDict[bytes, tuple[str, float]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> str | None:
+        """The cached user_id for a still-valid token, or None on a miss."""
+        key = self.digest(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            user_id, expires_at = entry
+            if time.time() < expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return user_id
+            del self._entries[key]
+            self.expired += 1
+        self.misses += 1
+        return None
+
+    def put(self, token: str, user_id: str, exp: float | None) -> None:
+        """Caches a token that was just verified. 'exp' is its exp claim."""
+        expires_at = time.time() + self.max_ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+
+        key = self.digest(token)
+        self._entries[key] = (user_id, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+        }
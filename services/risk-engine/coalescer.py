@@ -0,0 +1,73 @@
+import asyncio
+import logging
+
+logger = logging.getLogger("risk-engine")
+
+
+class Coalescer:
+    """
+    Micro-batches concurrent requests on the event loop: submit() queues
+    an item and waits; after 'window_ms' (or once 'max_batch' items are
+    queued) 'handler' is called once with every queued item and must
+    return one result per item, in order.
+
+    The handler runs inline on the event loop, so it must be quick and
+    must not block (e.g. scoring with already loaded models). If it
+    raises, every request of that batch gets the exception.
+    """
+
+    def __init__(self, handler, window_ms: float, max_batch: int = 256):
+        self.handler = handler
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+
+        self._pending: list[tuple[object, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+
+        # Counters
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000.0, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            results = self.handler([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"Coalesced batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            # The request may have been cancelled (client went away) meanwhile
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window_ms,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
@@ -0,0 +1,108 @@
+import os
+import logging
+
+import numpy as np
+
+from core.features import WindowFeatureAccumulator, FEATURE_COLUMNS, WINDOW_SIZE
+from core.keystroke_features import KeystrokeFeatureAccumulator, KEYSTROKE_COLUMNS, CORRECTION_KEYS
+from core.feature_store import iter_mousemove_chunks, iter_keystroke_chunks, load_features
+from training_policy import RowSampler
+
+logger = logging.getLogger("risk-engine")
+
+# Rows fetched per round trip from the server-side cursor.
+# Peak memory is roughly a few arrays of this many float64s.
+TRAINING_CHUNK_SIZE = int(os.getenv("TRAINING_CHUNK_SIZE", "50000"))
+
+# Train on keystroke dynamics and click cadence (KEYSTROKE_COLUMNS) next
+# to the mouse features. Models remember their columns, so models trained
+# either way keep scoring after this is changed.
+KEYSTROKE_FEATURES_ENABLED = os.getenv("KEYSTROKE_FEATURES_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def training_columns() -> list[str]:
+    """Columns of the matrices load_training_features() returns."""
+    return FEATURE_COLUMNS + (KEYSTROKE_COLUMNS if KEYSTROKE_FEATURES_ENABLED else [])
+
+
+def load_raw_features(engine, user_id: str, chunk_size: int = TRAINING_CHUNK_SIZE,
+                      sampler: RowSampler | None = None) -> tuple[np.ndarray, int, np.ndarray]:
+    """
+    Builds the user's feature matrix from raw events, chunk by chunk.
+    With a 'sampler', each chunk's rows go through it and only its
+    sample is returned.
+    Returns (features, raw_events_processed, window_starts) with the
+    starts of every window.
+    """
+    accumulator = WindowFeatureAccumulator()
+    parts, starts = [], []
+
+    def collect(rows, row_starts):
+        if sampler is None:
+            parts.append(rows)
+        else:
+            sampler.add(rows, row_starts[:len(rows)])
+
+    # Starts of the windows not collected yet: the open window's (carried
+    # over from earlier chunks) and this chunk's
+    pending = np.empty(0)
+    for timestamps, x, y in iter_mousemove_chunks(engine, user_id, chunk_size):
+        # Windows start at every WINDOW_SIZE-th event of the whole stream
+        starts.append(timestamps[-accumulator.n_events % WINDOW_SIZE::WINDOW_SIZE])
+        pending = np.concatenate([pending, starts[-1]])
+        rows = accumulator.add(timestamps, x, y)
+        # The completed windows are the oldest ones not collected yet
+        collect(rows, pending[:len(rows)])
+        pending = pending[len(rows):]
+    starts = np.concatenate(starts) if starts else np.empty(0)
+    collect(accumulator.finish(), pending)
+
+    features = sampler.sample() if sampler is not None else (
+        np.vstack(parts) if parts else np.empty((0, len(FEATURE_COLUMNS)))
+    )
+    logger.info(f"Streamed {accumulator.n_events} events into {len(starts)} feature rows for {user_id}"
+                f"{f', kept {len(features)}' if sampler is not None else ''}.")
+    return features, accumulator.n_events, starts
+
+
+def load_keystroke_features(engine, user_id: str, window_starts: np.ndarray,
+                            chunk_size: int = TRAINING_CHUNK_SIZE, rows: np.ndarray | None = None) -> np.ndarray:
+    """
+    KEYSTROKE_COLUMNS for each of the user's mouse windows (or only
+    those at positions 'rows'), from their keydowns and clicks.
+    """
+    accumulator = KeystrokeFeatureAccumulator(window_starts, rows)
+    for event_types, timestamps, keys in iter_keystroke_chunks(engine, user_id, chunk_size):
+        accumulator.add(timestamps, event_types == "click", np.isin(keys, CORRECTION_KEYS))
+    logger.info(f"Folded {accumulator.n_events} keydowns/clicks into {len(window_starts)} windows for {user_id}.")
+    return accumulator.features()
+
+
+def load_training_features(engine, user_id: str, chunk_size: int = TRAINING_CHUNK_SIZE,
+                           sampler: RowSampler | None = None) -> tuple[np.ndarray, int, str]:
+    """
+    The user's feature matrix (training_columns()), with the mouse
+    features read from the feature store when it is up to date for them
+    (one row per window, no raw events touched), otherwise built from
+    raw events. Keystroke features always come from raw keydowns and
+    clicks, which are a small share of the events.
+    With a 'sampler' (training_policy.new_sampler()) only its sample of
+    the rows is kept, chunk by chunk, and keystroke features are only
+    computed for those.
+    Returns (features, raw_events_processed, source) with source
+    "feature_store" or "raw_events".
+    """
+    stored = load_features(engine, user_id, sampler, chunk_size)
+    if stored is not None:
+        features, n_events, starts = stored
+        source = "feature_store"
+        logger.info(f"Read {len(starts)} feature rows ({n_events} events) from the feature store for {user_id}"
+                    f"{f', kept {len(features)}' if sampler is not None else ''}.")
+    else:
+        features, n_events, starts = load_raw_features(engine, user_id, chunk_size, sampler)
+        source = "raw_events"
+
+    if KEYSTROKE_FEATURES_ENABLED and len(features):
+        rows = sampler.rows if sampler is not None else None
+        features = np.hstack([features, load_keystroke_features(engine, user_id, starts, chunk_size, rows)])
+    return features, n_events, source
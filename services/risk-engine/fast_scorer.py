@@ -0,0 +1,129 @@
+import numpy as np
+
+
+def average_path_length(n_samples):
+    """
+    Average path length of an unsuccessful search in a binary search
+    tree of n samples (the c(n) term from the Isolation Forest paper).
+    Same formula scikit-learn uses internally.
+    """
+    n = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros_like(n)
+    result[n == 2] = 1.0
+    big = n > 2
+    result[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return result
+
+
+def _node_depths(tree) -> np.ndarray:
+    """Depth of every node in a fitted sklearn Tree, counting the root as 1."""
+    depths = np.zeros(tree.node_count, dtype=np.float64)
+    depths[0] = 1.0
+    left, right = tree.children_left, tree.children_right
+    # Children always have a higher node id than their parent
+    for node in range(tree.node_count):
+        if left[node] != -1:
+            depths[left[node]] = depths[node] + 1.0
+            depths[right[node]] = depths[node] + 1.0
+    return depths
+
+
+class PackedForest:
+    """
+    A fitted IsolationForest flattened into a handful of plain arrays,
+    one entry per node across all trees. This is the on-disk model
+    format of the model store: the arrays can be memory-mapped straight
+    from the file, so loading a model is a header parse instead of
+    unpickling a hundred estimator objects.
+
+    Scoring walks every tree at once, one level per step, for at most
+    'max_depth' vectorized steps. Leaves point to themselves, so rows
+    that reach a leaf early just stay there. Gives the same result as
+    IsolationForest.decision_function.
+    """
+
+    # name -> dtype of the arrays that make up a packed forest
+    ARRAYS = {
+        "roots": np.int32,        # node id of every tree's root
+        "left": np.int32,         # child ids (a leaf's children are itself)
+        "right": np.int32,
+        "feature": np.int32,      # split feature, as a column of X
+        "threshold": np.float32,  # split threshold (go left if x <= threshold)
+        "path_length": np.float64,  # depth + c(n) at each node
+    }
+
+    def __init__(self, arrays: dict, meta: dict):
+        self.roots = arrays["roots"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.path_length = arrays["path_length"]
+
+        self.meta = meta
+        self.offset = float(meta["offset"])
+        self.denominator = float(meta["denominator"])
+        self.max_depth = int(meta["max_depth"])
+        self.n_features = int(meta["n_features"])
+        self.feature_names = meta.get("feature_names")
+
+    @classmethod
+    def from_model(cls, model) -> "PackedForest":
+        n_features = int(model.n_features_in_)
+        parts = {name: [] for name in cls.ARRAYS}
+        roots, node_offset, max_depth = [], 0, 0
+
+        for estimator, features in zip(model.estimators_, model.estimators_features_):
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            roots.append(node_offset)
+            parts["left"].append(np.where(is_leaf, nodes, tree.children_left) + node_offset)
+            parts["right"].append(np.where(is_leaf, nodes, tree.children_right) + node_offset)
+            # Map the tree's (possibly subsampled) columns back to columns of X
+            parts["feature"].append(np.where(is_leaf, 0, np.asarray(features)[np.maximum(tree.feature, 0)]))
+            # sklearn compares float32 inputs against float64 thresholds.
+            # Rounding each threshold down to float32 keeps every comparison
+            # identical while halving the size.
+            threshold = tree.threshold.astype(np.float32)
+            too_high = threshold.astype(np.float64) > tree.threshold
+            threshold[too_high] = np.nextafter(threshold[too_high], np.float32(-np.inf))
+            parts["threshold"].append(np.where(is_leaf, np.float32(0), threshold))
+            parts["path_length"].append(_node_depths(tree) + average_path_length(tree.n_node_samples) - 1.0)
+
+            node_offset += tree.node_count
+            max_depth = max(max_depth, int(tree.max_depth))
+
+        arrays = {"roots": np.asarray(roots)}
+        arrays.update({name: np.concatenate(values) for name, values in parts.items() if values})
+        arrays = {name: np.ascontiguousarray(arrays[name], dtype=dtype) for name, dtype in cls.ARRAYS.items()}
+
+        feature_names = getattr(model, 'feature_names_in_', None)
+        meta = {
+            "offset": float(model.offset_),
+            "denominator": len(roots) * float(average_path_length([model.max_samples_])[0]),
+            "max_depth": max_depth,
+            "n_features": n_features,
+            "feature_names": None if feature_names is None else [str(name) for name in feature_names],
+        }
+        return cls(arrays, meta)
+
+    def score_samples(self, X) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])
+        # (n_trees, n_rows): where each row currently is in each tree
+        nodes = np.repeat(self.roots[:, None], X.shape[0], axis=1)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        depths = self.path_length[nodes].sum(axis=0)
+
+        if self.denominator == 0:
+            # Trained on a single sample: sklearn defines the score as -1
+            return -np.ones_like(depths)
+        return -(2.0 ** (-depths / self.denominator))
+
+    def decision_function(self, X) -> np.ndarray:
+        """< 0 means anomalous, exactly like IsolationForest.decision_function."""
+        return self.score_samples(X) - self.offset
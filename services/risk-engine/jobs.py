@@ -0,0 +1,161 @@
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+
+from core import metrics
+from training import TrainingError, init_worker, train_user_model
+
+logger = logging.getLogger("risk-engine")
+
+# Observed here, in the API process, from what the worker reports back
+training_jobs_finished = metrics.Counter("risk_training_jobs_total", "Finished training jobs", ("status",))
+training_seconds = metrics.Histogram(
+    "risk_training_seconds", "Time spent per training stage (load = features from the DB)", ("stage",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+)
+
+
+@dataclass
+class TrainingJob:
+    """One queued/running/finished training run for a user."""
+    job_id: str
+    user_id: str
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    status: str = "queued"  # queued -> running -> succeeded | failed
+    result: dict | None = None
+    error: str | None = None
+    error_code: int | None = None
+    future: Future | None = field(default=None, repr=False)
+
+    def to_dict(self) -> dict:
+        status = self.status
+        if status == "queued" and self.future is not None and self.future.running():
+            status = "running"
+        return {
+            "job_id": self.job_id,
+            "user_id": self.user_id,
+            "status": status,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+            "error_code": self.error_code,
+        }
+
+
+class TrainingJobQueue:
+    """
+    Runs training jobs on a pool of worker processes, so fitting a
+    model never blocks the API's event loop (or its GIL).
+
+    - At most 'max_workers' jobs run at once; the rest wait in the pool's queue.
+    - A user has at most one queued/running job: submitting again returns it.
+    - The last 'history_size' finished jobs are kept for status polling.
+    """
+
+    def __init__(self, max_workers: int, history_size: int = 1000, on_success=None):
+        self.max_workers = max_workers
+        self.history_size = history_size
+        self.on_success = on_success
+
+        self._executor: ProcessPoolExecutor | None = None
+        self._jobs: OrderedDict[str, TrainingJob] = OrderedDict()
+        self._active_by_user: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use. 'spawn' so workers don't inherit the
+        # server's threads, sockets or DB connections.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker
+            )
+        return self._executor
+
+    def submit(self, user_id: str) -> tuple[TrainingJob, bool]:
+        """
+        Queues a training job for the user.
+        Returns (job, created); created is False for a deduplicated request.
+        """
+        with self._lock:
+            active_id = self._active_by_user.get(user_id)
+            if active_id is not None:
+                return self._jobs[active_id], False
+
+            # Registered only once it's in the pool: if submitting fails,
+            # the user mustn't be left with an active job that never ends
+            job = TrainingJob(job_id=uuid.uuid4().hex, user_id=user_id)
+            job.future = self._submit_to_pool(user_id)
+            self._jobs[job.job_id] = job
+            self._active_by_user[user_id] = job.job_id
+
+        job.future.add_done_callback(lambda future: self._finish(job, future))
+        logger.info(f"Queued training job {job.job_id} for user_id: {user_id}")
+        return job, True
+
+    def _submit_to_pool(self, user_id: str) -> Future:
+        """Sends a job to the pool, restarting it once if it's broken. Call with the lock held."""
+        try:
+            return self._get_executor().submit(train_user_model, user_id)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool
+            logger.warning("Training pool is broken, restarting it.")
+            # Shut the broken pool down, or its management thread
+            # and any surviving workers are leaked
+            broken, self._executor = self._executor, None
+            broken.shutdown(wait=False, cancel_futures=True)
+            return self._get_executor().submit(train_user_model, user_id)
+
+    def get(self, job_id: str) -> TrainingJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts: dict[str, int] = {}
+            for job in self._jobs.values():
+                status = job.to_dict()["status"]
+                counts[status] = counts.get(status, 0) + 1
+        return {"max_workers": self.max_workers, "jobs": counts}
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _finish(self, job: TrainingJob, future: Future) -> None:
+        """Called (from an executor thread) when a job's future completes."""
+        try:
+            job.result = future.result()
+            job.status = "succeeded"
+        except TrainingError as e:
+            job.status, job.error, job.error_code = "failed", e.detail, e.status_code
+        except Exception as e:
+            # Cancelled, or the worker process died
+            job.status, job.error, job.error_code = "failed", str(e) or type(e).__name__, 500
+        job.finished_at = time.time()
+        training_jobs_finished.labels(job.status).inc()
+        if job.result is not None:
+            for stage, seconds in job.result.get("timings", {}).items():
+                training_seconds.labels(stage).observe(seconds)
+        logger.info(f"Training job {job.job_id} for {job.user_id} {job.status}.")
+
+        with self._lock:
+            self._active_by_user.pop(job.user_id, None)
+            self._prune_history()
+
+        if job.status == "succeeded" and self.on_success is not None:
+            self.on_success(job.user_id)
+
+    def _prune_history(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[job_id]
@@ -1,9 +1,10 @@
 import sys
 import os
+import time
 import logging
 from dotenv import load_dotenv
-from pydantic import BaseModel, conlist
-from typing import List
+from pydantic import BaseModel, Field, AliasChoices, conlist
+from typing import List, TYPE_CHECKING
 
 # --- Path Setup ---
 # 1. Add project root to sys.path so we can import 'core'
@@ -14,28 +15,87 @@ sys.path.append(project_root)
 load_dotenv(os.path.join(project_root, '.env'))
 
 # --- Regular Imports ---
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 from fastapi import FastAPI, HTTPException
-import pandas as pd
-from sklearn.ensemble import IsolationForest
-import joblib
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import select, func
+import numpy as np
+
+if TYPE_CHECKING:
+    # Imported where it's used: pandas alone takes ~0.4 s to import
+    import pandas as pd
 
 # --- Our Project's Code ---
-from core.database import SessionLocal
+from core.database import get_async_engine, dispose_async_engine
+from core import metrics
 from core.models.BehavioralEvent import BehavioralEvent
+from core.decimation import new_decimator, decimate
+from core.keystroke_features import event_features, batch_event_features, select_columns, ALL_FEATURE_COLUMNS
+from model_cache import ModelCache
+from fast_scorer import PackedForest
+from training import model_store
+from jobs import TrainingJobQueue
+from coalescer import Coalescer
 
 # --- Configuration ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("risk-engine")
 
-app = FastAPI()
+# Keep the most recently used models open, so scoring doesn't
+# re-open a file on every request. Models are memory-mapped packed
+# forests, so a cached model costs little more than its page cache.
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "256"))
+model_cache = ModelCache(model_store, max_size=MODEL_CACHE_SIZE)
+
+# Training runs as background jobs on a pool of worker processes.
+# Defaults to one worker per core.
+TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS") or os.cpu_count() or 1)
+training_jobs = TrainingJobQueue(max_workers=TRAINING_WORKERS, on_success=model_cache.invalidate)
+
+# Most windows one /model/predict-batch request (or one coalesced batch) may hold
+PREDICT_BATCH_MAX = int(os.getenv("PREDICT_BATCH_MAX", "1000"))
+# Concurrent /model/predict requests wait up to this long (ms) for each
+# other and are scored together, like one /model/predict-batch request.
+# Trades that much latency for throughput under load. 0 = score each
+# request on its own.
+PREDICT_COALESCE_MS = int(os.getenv("PREDICT_COALESCE_MS", "0"))
+
+# At startup, load the models of this many of the most active users
+# into the cache in the background, so their first predictions don't
+# wait for a model file to be opened. 0 = off; at most MODEL_CACHE_SIZE.
+MODEL_PRELOAD_USERS = int(os.getenv("MODEL_PRELOAD_USERS", "0"))
+# "Most active" = most mouse movements received in the last this many hours
+MODEL_PRELOAD_HOURS = int(os.getenv("MODEL_PRELOAD_HOURS", "24"))
+
+# --- Metrics ---
+predict_seconds = metrics.Histogram("risk_predict_seconds", "Prediction latency, including model lookup")
+feature_seconds = metrics.Histogram("risk_feature_seconds", "Feature engineering time per request", ("endpoint",))
+predictions = metrics.Counter("risk_predictions_total", "Scored prediction requests", ("verdict",))
+predict_batch_seconds = metrics.Histogram("risk_predict_batch_seconds", "Bulk prediction latency, including model lookups")
+batch_windows = metrics.Histogram("risk_predict_batch_windows", "Windows scored together (bulk or coalesced)",
+                                  buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+metrics.Counter("risk_model_cache_hits_total", "Model lookups served from the cache", function=lambda: model_cache.hits)
+metrics.Counter("risk_model_cache_misses_total", "Model lookups that opened a file", function=lambda: model_cache.misses)
 
-# Create a folder to store our trained models
-MODEL_DIR = "trained_models"
-os.makedirs(MODEL_DIR, exist_ok=True)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Requests are served while the models load
+    preload = asyncio.create_task(preload_models(MODEL_PRELOAD_USERS)) if MODEL_PRELOAD_USERS > 0 else None
+    yield
+    if preload is not None:
+        preload.cancel()
+    training_jobs.shutdown()
+    await dispose_async_engine()
+
+app = FastAPI(lifespan=lifespan)
 
 class Event(BaseModel):
     """Defines what a single event from the frontend looks like"""
-    event_type: str
+    # The frontend sends this as 'type'
+    event_type: str = Field(validation_alias=AliasChoices("event_type", "type"))
     x: int | None = None
     y: int | None = None
     key: str | None = None
@@ -45,130 +105,366 @@ class PredictRequest(BaseModel):
     """Defines the list of events we expect"""
     events: conlist(Event, min_length=10) # Require at least 10 events
 
+class BatchPredictItem(BaseModel):
+    """One user's window of events in a bulk request"""
+    user_id: str
+    events: conlist(Event, min_length=10)
+
+class BatchPredictRequest(BaseModel):
+    """Windows of events of any number of users, scored together"""
+    requests: conlist(BatchPredictItem, min_length=1, max_length=PREDICT_BATCH_MAX)
+
 # --- HELPER: Feature Engineering ---
-def create_features(df: pd.DataFrame) -> pd.DataFrame:
+def create_features(df: "pd.DataFrame") -> "pd.DataFrame":
     """
     Transforms raw event data into features for the AI.
     This is the "secret sauce."
+
+    We create "sessions" of 10 mouse movements at a time and calculate
+    stats (mouse speed, rhythm, distance) for each session, plus the
+    typing and clicking that happened during it. The math runs
+    vectorized over NumPy arrays in core.features and
+    core.keystroke_features.
     """
-    logger.info(f"Creating features from {len(df)} events...")
-    
-    # Sort by time to be safe
-    df = df.sort_values(by='timestamp')
-    
-    # Calculate time differences (in seconds)
-    df['time_delta_s'] = df['timestamp'].diff() / 1000.0
-    
-    # Calculate mouse speed (pixels per second)
-    df['x_delta'] = df['x'].diff().fillna(0)
-    df['y_delta'] = df['y'].diff().fillna(0)
-    df['distance'] = (df['x_delta']**2 + df['y_delta']**2)**0.5
-    
-    # Avoid division by zero
-    df['speed_px_s'] = df.apply(
-        lambda row: row['distance'] / row['time_delta_s'] if row['time_delta_s'] > 0 else 0,
-        axis=1
-    )
-    
-    # --- Feature Creation ---
-    # We will create "sessions" of 10 events at a time
-    # and calculate stats for each session.
-    
-    # 1. Group events into chunks of 10
-    n = 10 
-    df['group'] = (df.index // n)
-    
-    # 2. Calculate statistics for each group
-    # 'agg' is a powerful pandas function
-    features = df.groupby('group').agg(
-        # Mouse speed features
-        avg_speed=('speed_px_s', 'mean'),
-        std_speed=('speed_px_s', 'std'),
-        max_speed=('speed_px_s', 'max'),
-        
-        # Time features (how "rhythmic" is the user?)
-        avg_time_delta=('time_delta_s', 'mean'),
-        std_time_delta=('time_delta_s', 'std'),
-        
-        # Distance features
-        total_distance=('distance', 'sum')
-    )
-    
-    # Our AI model can't handle missing values ("NaN")
-    features = features.fillna(0)
-    
-    # Remove any infinite values (from division by zero)
-    features.replace([pd.NA, pd.NaT, float('inf'), -float('inf')], 0, inplace=True)
-
-    logger.info(f"Created {len(features)} feature rows (sessions).")
+    import pandas as pd
+
+    with feature_seconds.labels("create_features").time():
+        values = event_features(
+            df['timestamp'].to_numpy(dtype=np.float64),
+            df['event_type'].to_numpy(dtype=object),
+            df['x'].to_numpy(dtype=np.float64, na_value=np.nan),
+            df['y'].to_numpy(dtype=np.float64, na_value=np.nan),
+            df['key'].to_numpy(dtype=object) if 'key' in df else np.full(len(df), None, dtype=object)
+        )
+        features = pd.DataFrame(values, columns=ALL_FEATURE_COLUMNS)
+        features.index.name = 'group'
+
+    logger.debug(f"Created {len(features)} feature rows (sessions) from {len(df)} events.")
     return features
 
+# --- HELPER: Scoring ---
+def score_events(model: PackedForest, events: List[Event]) -> dict:
+    """
+    Scores a window of events against a user's IsolationForest.
+    Features are built per session of mouse movements, with the
+    keystrokes and clicks in between, and scored on the columns the
+    model was trained on.
+    """
+    check_events(events)
+    with feature_seconds.labels("predict").time():
+        values = select_columns(window_values(events), model.feature_names)
+
+    return verdict(model.decision_function(values))
+
+def window_values(events: List[Event]) -> np.ndarray:
+    """One window's feature rows (ALL_FEATURE_COLUMNS), as create_features builds them."""
+    n = len(events)
+    return event_features(
+        np.fromiter((e.timestamp for e in events), dtype=np.float64, count=n),
+        np.array([e.event_type for e in events], dtype=object),
+        np.fromiter((np.nan if e.x is None else e.x for e in events), dtype=np.float64, count=n),
+        np.fromiter((np.nan if e.y is None else e.y for e in events), dtype=np.float64, count=n),
+        np.array([e.key for e in events], dtype=object)
+    )
+
+def decimate_window(events: List[Event], **settings) -> List[Event]:
+    """
+    The window's events as the ingestor would have stored them: its
+    mousemoves thinned out by the same INGEST_DECIMATION policy (see
+    core/decimation.py; 'settings' replace the configured ones). Models
+    are trained on the stored events, so windows sent in raw are scored
+    the way they were trained.
+    """
+    decimator = new_decimator(**settings)
+    if decimator.mode == "off":
+        return events
+    frames = [{"type": e.event_type, "timestamp": e.timestamp, "x": e.x, "y": e.y, "i": i}
+              for i, e in enumerate(events)]
+    return [events[frame["i"]] for frame in decimate(frames, decimator)]
+
+def check_events(events: List[Event]) -> None:
+    n_moves = sum(1 for e in events if e.event_type == 'mousemove')
+    if n_moves < 2:
+        raise HTTPException(status_code=400, detail="Not enough mouse movement events to score.")
+
+def verdict(scores: np.ndarray) -> dict:
+    """The result for one window of events, from its sessions' scores."""
+    # decision_function < 0 means "anomalous" for an IsolationForest
+    anomalous_windows = int((scores < 0).sum())
+    is_anomalous = bool(scores.mean() < 0)
+
+    # How many of the windows agree with the verdict
+    agreeing = anomalous_windows if is_anomalous else len(scores) - anomalous_windows
+    return {
+        "is_anomalous": is_anomalous,
+        "confidence": agreeing / len(scores),
+        "score": float(scores.mean()),
+        "windows_scored": len(scores),
+        "message": "Behavior deviates from the user's baseline." if is_anomalous else "Behavior matches the user's baseline."
+    }
+
+def score_batch(items: list[tuple[str, PackedForest, List[Event]]]) -> list[dict]:
+    """
+    Scores many windows of events, of any number of users, at once:
+    (user_id, model, events) items, each already check_events()ed.
+    Features are built for all of them in one vectorized pass, and each
+    model's decision_function is called once, on the sessions of every
+    window it scores. Returns one score_events() result per item.
+    """
+    batch_windows.observe(len(items))
+    with feature_seconds.labels("predict_batch").time():
+        segments, timestamps, event_types, x, y, keys = [], [], [], [], [], []
+        for index, (_, _, events) in enumerate(items):
+            segments.extend([index] * len(events))
+            for e in events:
+                timestamps.append(e.timestamp)
+                event_types.append(e.event_type)
+                x.append(np.nan if e.x is None else e.x)
+                y.append(np.nan if e.y is None else e.y)
+                keys.append(e.key)
+        values, row_items = batch_event_features(
+            np.array(segments, dtype=np.int64),
+            np.array(timestamps, dtype=np.float64),
+            np.array(event_types, dtype=object),
+            np.array(x, dtype=np.float64),
+            np.array(y, dtype=np.float64),
+            np.array(keys, dtype=object)
+        )
+
+    # One call per model (a user's windows share it): group the rows by it
+    models, groups = [], {}
+    for _, model, _ in items:
+        if id(model) not in groups:
+            groups[id(model)] = len(models)
+            models.append(model)
+    row_groups = np.array([groups[id(model)] for _, model, _ in items], dtype=np.int64)[row_items]
+    order = np.argsort(row_groups, kind='stable')
+    group_bounds = np.searchsorted(row_groups[order], np.arange(len(models) + 1))
+    scores = np.empty(len(values))
+    for group, model in enumerate(models):
+        rows = order[group_bounds[group]:group_bounds[group + 1]]
+        scores[rows] = model.decision_function(select_columns(values[rows], model.feature_names))
+
+    bounds = np.searchsorted(row_items, np.arange(len(items) + 1))
+    return [verdict(scores[bounds[i]:bounds[i + 1]]) for i in range(len(items))]
+
+# Scores concurrent single predictions together (see PREDICT_COALESCE_MS)
+predict_coalescer = Coalescer(score_batch, PREDICT_COALESCE_MS, PREDICT_BATCH_MAX) if PREDICT_COALESCE_MS > 0 else None
+if predict_coalescer is not None:
+    metrics.Counter("risk_predict_coalesced_batches_total", "Batches of coalesced predictions",
+                    function=lambda: predict_coalescer.batches)
+
 # --- API Endpoints ---
 
 @app.get("/")
 def read_root():
     return {"status": "AI Risk Engine is running"}
 
-@app.post("/model/train/{user_id}")
+@app.get("/metrics")
+def read_metrics():
+    """ Prometheus metrics. """
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+async def users_with_new_data() -> list[str]:
+    """
+    Users whose newest mouse movement arrived after their model was
+    last saved (or who have no model yet).
+    """
+    # received_at is a naive timestamp from the DB's now(), i.e. local time in
+    # the session's TimeZone; trained_at is a UTC epoch from time.time(). Read it
+    # back as the epoch the DB means by it, so both sides are in the same clock.
+    latest_epoch = func.extract('epoch', func.timezone(
+        func.current_setting('TimeZone'), func.max(BehavioralEvent.received_at)
+    ))
+    query = (
+        select(BehavioralEvent.user_id, latest_epoch)
+        .where(BehavioralEvent.event_type == 'mousemove', BehavioralEvent.user_id.is_not(None))
+        .group_by(BehavioralEvent.user_id)
+    )
+    # Async engine, so the aggregate doesn't tie up the event loop or a threadpool thread
+    async with get_async_engine().connect() as conn:
+        latest_by_user = (await conn.execute(query)).all()
+
+    models = await run_in_threadpool(model_store.entries)
+    stale = []
+    for user_id, latest_received_at in latest_by_user:
+        entry = models.get(user_id)
+        if entry is None:
+            stale.append(user_id)
+            continue
+        if latest_received_at is not None and float(latest_received_at) > entry["trained_at"]:
+            stale.append(user_id)
+    return stale
+
+async def most_active_users(limit: int) -> list[str]:
+    """
+    Users with the most mouse movements received in the last
+    MODEL_PRELOAD_HOURS, most active first, if they have a model.
+    Falls back to the most recently trained users if the database
+    can't be reached.
+    """
+    models = await run_in_threadpool(model_store.entries)
+    # received_at is a naive timestamp from the DB's now(); it's also the partition key
+    since = datetime.now() - timedelta(hours=MODEL_PRELOAD_HOURS)
+    query = (
+        select(BehavioralEvent.user_id)
+        .where(BehavioralEvent.event_type == 'mousemove', BehavioralEvent.received_at >= since,
+               BehavioralEvent.user_id.is_not(None))
+        .group_by(BehavioralEvent.user_id)
+        .order_by(func.count().desc())
+        .limit(limit * 2)  # Some of them may not have a model yet
+    )
+    try:
+        async with get_async_engine().connect() as conn:
+            active = [user_id for user_id, in (await conn.execute(query)).all() if user_id in models]
+    except Exception as e:
+        logger.warning(f"Database error, preloading the most recently trained models instead: {e}")
+        active = []
+    if len(active) < limit:
+        recent = sorted(models, key=lambda user_id: models[user_id]["trained_at"], reverse=True)
+        chosen = set(active)
+        active.extend(user_id for user_id in recent if user_id not in chosen)
+    return active[:limit]
+
+async def preload_models(limit: int) -> None:
+    """Warms the model cache with the most active users' models (see MODEL_PRELOAD_USERS)."""
+    start = time.perf_counter()
+    limit = min(limit, MODEL_CACHE_SIZE)
+    try:
+        user_ids = await most_active_users(limit)
+    except Exception as e:
+        logger.error(f"Model preload failed: {e}")
+        return
+
+    loaded = 0
+    for user_id in user_ids:
+        try:
+            await run_in_threadpool(model_cache.get, user_id)
+            loaded += 1
+        except FileNotFoundError:
+            # Deleted since the manifest was read
+            continue
+        except Exception as e:
+            logger.error(f"Failed to preload model for {user_id}: {e}")
+    logger.info(f"Preloaded {loaded} models in {time.perf_counter() - start:.2f} s.")
+
+@app.post("/model/train/{user_id}", status_code=202)
 async def train_model(user_id: str):
     logger.info(f"Received training request for user_id: {user_id}")
-    
-    # 1. Get Data from Database
+
+    # Repeated requests for the same user get the job that's already queued
+    job, created = training_jobs.submit(user_id)
+    response = job.to_dict()
+    response["deduplicated"] = not created
+    return response
+
+@app.post("/model/train-all", status_code=202)
+async def train_all_models():
+    """Retrains every user who has new data, spread across all workers."""
     try:
-        db = SessionLocal()
-        query = db.query(BehavioralEvent).filter(
-            BehavioralEvent.user_id == user_id,
-            BehavioralEvent.event_type == 'mousemove' # Just train on mouse data for now
-        )
-        
-        # Use pandas to read directly from the SQL query
-        df = pd.read_sql(query.statement, db.bind)
-        
+        user_ids = await users_with_new_data()
     except Exception as e:
         logger.error(f"Database error: {e}")
         raise HTTPException(status_code=500, detail="Database connection error")
-    finally:
-        db.close()
 
-    if len(df) < 50: # Need at least some data to train
-        logger.warning(f"Not enough data to train for user: {user_id} (found {len(df)} events)")
-        raise HTTPException(status_code=400, detail="Not enough behavioral data to train a model.")
+    jobs = [training_jobs.submit(user_id)[0] for user_id in user_ids]
+    logger.info(f"Queued retraining for {len(jobs)} users with new data.")
+    return {
+        "users_with_new_data": len(user_ids),
+        "jobs": [{"job_id": job.job_id, "user_id": job.user_id} for job in jobs]
+    }
 
-    # 2. Feature Engineering
-    try:
-        features = create_features(df)
-        if len(features) < 10: # Need at least 10 "sessions"
-             raise Exception("Not enough feature rows after processing.")
-             
-    except Exception as e:
-        logger.error(f"Feature engineering failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Feature engineering failed: {e}")
+@app.get("/model/jobs/{job_id}")
+def get_training_job(job_id: str):
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown training job.")
+    return job.to_dict()
 
-    # 3. Train the AI Model (IsolationForest)
-    try:
-        # IsolationForest is good at "anomaly detection"
-        # contamination=0.1 means "assume 10% of the data is weird"
-        model = IsolationForest(contamination=0.1, random_state=42)
-        model.fit(features)
-        
-        logger.info("Model training complete.")
-    except Exception as e:
-        logger.error(f"Model training failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Model training failed: {e}")
+@app.get("/model/jobs")
+def training_job_stats():
+    return training_jobs.stats()
 
-    # 4. Save the Trained Model to a File
-    model_path = os.path.join(MODEL_DIR, f"{user_id}_model.pkl")
+@app.post("/model/predict/{user_id}")
+async def predict(user_id: str, request: PredictRequest):
+    start = time.perf_counter()
+    # Loading (on a cache miss) runs in the threadpool, so the event
+    # loop is never blocked by disk I/O or unpickling
     try:
-        joblib.dump(model, model_path)
-        logger.info(f"Model for {user_id} saved to {model_path}")
+        model = await run_in_threadpool(model_cache.get, user_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="No trained model for this user.")
     except Exception as e:
-        logger.error(f"Failed to save model: {e}")
-        raise HTTPException(status_code=500, detail="Failed to save trained model.")
+        logger.error(f"Failed to load model for {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to load trained model.")
 
-    return {
-        "status": "training_complete",
-        "user_id": user_id,
-        "model_path": model_path,
-        "raw_events_processed": len(df),
-        "feature_rows_created": len(features)
-    }
\ No newline at end of file
+    # Scoring a cached model is sub-millisecond, so it runs inline
+    events = decimate_window(request.events)
+    if predict_coalescer is not None:
+        check_events(events)
+        result = await predict_coalescer.submit((user_id, model, events))
+    else:
+        result = score_events(model, events)
+    result["user_id"] = user_id
+    predict_seconds.observe(time.perf_counter() - start)
+    predictions.labels("anomalous" if result["is_anomalous"] else "normal").inc()
+    return result
+
+def load_models(user_ids) -> dict:
+    """Each user's model, or the HTTPException a request for them gets."""
+    models = {}
+    for user_id in user_ids:
+        try:
+            models[user_id] = model_cache.get(user_id)
+        except FileNotFoundError:
+            models[user_id] = HTTPException(status_code=404, detail="No trained model for this user.")
+        except Exception as e:
+            logger.error(f"Failed to load model for {user_id}: {e}")
+            models[user_id] = HTTPException(status_code=500, detail="Failed to load trained model.")
+    return models
+
+@app.post("/model/predict-batch")
+async def predict_batch(request: BatchPredictRequest):
+    """
+    Scores windows of events for many users in one call. Results come
+    back in request order, each like /model/predict's; a window that
+    can't be scored gets {"user_id", "status_code", "detail"} instead,
+    without failing the others.
+    """
+    start = time.perf_counter()
+    models = await run_in_threadpool(load_models, {item.user_id for item in request.requests})
+
+    results: list[dict | None] = [None] * len(request.requests)
+    items, positions = [], []
+    for position, item in enumerate(request.requests):
+        model = models[item.user_id]
+        events = decimate_window(item.events)
+        try:
+            if isinstance(model, HTTPException):
+                raise model
+            check_events(events)
+        except HTTPException as e:
+            results[position] = {"user_id": item.user_id, "status_code": e.status_code, "detail": e.detail}
+            continue
+        items.append((item.user_id, model, events))
+        positions.append(position)
+
+    if items:
+        for position, result in zip(positions, score_batch(items)):
+            result["user_id"] = request.requests[position].user_id
+            results[position] = result
+            predictions.labels("anomalous" if result["is_anomalous"] else "normal").inc()
+    predict_batch_seconds.observe(time.perf_counter() - start)
+    return {"results": results}
+
+@app.get("/model/cache")
+def model_cache_stats():
+    return model_cache.stats()
+
+@app.get("/model/{user_id}")
+def model_info(user_id: str):
+    """The user's current model version, from the manifest."""
+    entry = model_store.entry(user_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="No trained model for this user.")
+    return entry
@@ -0,0 +1,68 @@
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("risk-engine")
+
+
+class ModelCache:
+    """
+    A size-bounded LRU cache of loaded models, keyed by user_id.
+
+    Models are loaded through the model store. Each entry remembers
+    the version it was loaded from; if the manifest has a newer one
+    (e.g. the user was retrained), the next lookup reloads it.
+    Thread-safe, so it can be used from FastAPI's threadpool.
+    """
+
+    def __init__(self, store, max_size: int = 256):
+        self.store = store
+        self.max_size = max_size
+
+        self._models: OrderedDict[str, tuple[int, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str):
+        """
+        Returns the user's model, loading it from the store on a miss.
+        Raises FileNotFoundError if the user has no trained model.
+        This reads the manifest (and may map a file), so don't call
+        it on the event loop.
+        """
+        version = self.store.version(user_id)  # Raises FileNotFoundError
+
+        with self._lock:
+            cached = self._models.get(user_id)
+            if cached is not None and cached[0] == version:
+                self._models.move_to_end(user_id)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        # Load outside the lock so one slow load doesn't stall every lookup
+        model = self.store.load(user_id, version)
+        logger.info(f"Loaded model v{version} for {user_id} into cache.")
+
+        with self._lock:
+            self._models[user_id] = (version, model)
+            self._models.move_to_end(user_id)
+            while len(self._models) > self.max_size:
+                evicted, _ = self._models.popitem(last=False)
+                logger.debug(f"Evicted model for {evicted} from cache.")
+        return model
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._models.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._models),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
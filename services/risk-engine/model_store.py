@@ -0,0 +1,234 @@
+import os
+import json
+import mmap
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+
+import numpy as np
+
+from fast_scorer import PackedForest
+
+logger = logging.getLogger("risk-engine")
+
+# --- Model Store Config (from .env) ---
+# Where trained models (and their manifest) live
+MODEL_DIR = os.getenv("MODEL_DIR", "trained_models")
+
+# Older versions of a model are deleted once this many newer ones exist.
+# Keeping one spare means a reader that looked up the previous version a
+# moment ago can still open it.
+MODEL_KEEP_VERSIONS = int(os.getenv("MODEL_KEEP_VERSIONS", "2"))
+
+# File layout: MAGIC, uint32 header length, JSON header, then every
+# array of PackedForest.ARRAYS at a 64-byte aligned offset.
+MAGIC = b"BBFOREST"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+MANIFEST_COLUMNS = "user_id, version, path, size, trained_at, info"
+
+
+def write_forest(forest: PackedForest, f) -> None:
+    """Serializes a packed forest to an open binary file."""
+    arrays, offset = {}, 0
+    for name in PackedForest.ARRAYS:
+        values = getattr(forest, name)
+        arrays[name] = {"dtype": values.dtype.str, "count": int(values.size), "offset": offset}
+        offset += -(-values.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header = json.dumps({"format": FORMAT_VERSION, "meta": forest.meta, "arrays": arrays}).encode()
+    data_start = -(-(len(MAGIC) + 4 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    f.write(MAGIC)
+    f.write(len(header).to_bytes(4, "little"))
+    f.write(header)
+    f.write(b"\0" * (data_start - len(MAGIC) - 4 - len(header)))
+    for name in arrays:
+        values = getattr(forest, name)
+        f.write(values.tobytes())
+        f.write(b"\0" * (-values.nbytes % ALIGNMENT))
+
+
+def read_forest(path: str) -> PackedForest:
+    """
+    Opens a packed forest file. The arrays are memory-mapped, not read:
+    pages are loaded by the OS on first use and shared by every process
+    that maps the same file.
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a packed model file")
+    header_length = int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 4], "little")
+    header = json.loads(buffer[len(MAGIC) + 4:len(MAGIC) + 4 + header_length])
+    if header["format"] != FORMAT_VERSION:
+        raise ValueError(f"{path} has unsupported format {header['format']}")
+
+    data_start = -(-(len(MAGIC) + 4 + header_length) // ALIGNMENT) * ALIGNMENT
+    arrays = {
+        name: np.frombuffer(buffer, dtype=layout["dtype"], count=layout["count"], offset=data_start + layout["offset"])
+        for name, layout in header["arrays"].items()
+    }
+    return PackedForest(arrays, header["meta"])
+
+
+def _entry(row) -> dict:
+    user_id, version, path, size, trained_at, info = row
+    return {"user_id": user_id, "version": version, "path": path, "size": size,
+            "trained_at": trained_at, "info": json.loads(info or "{}")}
+
+
+class ModelStore:
+    """
+    Versioned, atomically written model files plus a manifest.
+
+    - Every save writes a new file '<user_id>.v<version>.forest' (a
+      PackedForest) to a temp file first and renames it into place, so
+      a reader never sees a half-written model.
+    - The manifest (a SQLite database in the model directory) maps each
+      user to their current version; it is only updated after the file
+      is in place. Any number of processes can save and load at once.
+    - Models saved by older versions as '<user_id>_model.pkl' are
+      converted the first time they are loaded.
+    """
+
+    def __init__(self, model_dir: str = MODEL_DIR, keep_versions: int = MODEL_KEEP_VERSIONS):
+        self.model_dir = model_dir
+        self.keep_versions = max(1, keep_versions)
+        os.makedirs(model_dir, exist_ok=True)
+
+        self.manifest_path = os.path.join(model_dir, "manifest.sqlite")
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS models (
+                    user_id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    trained_at REAL NOT NULL,
+                    info TEXT
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.manifest_path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def model_path(self, user_id: str, version: int) -> str:
+        return os.path.join(self.model_dir, f"{user_id}.v{version}.forest")
+
+    def legacy_path(self, user_id: str) -> str:
+        return os.path.join(self.model_dir, f"{user_id}_model.pkl")
+
+    def save(self, user_id: str, model, info: dict | None = None) -> dict:
+        """
+        Packs a fitted IsolationForest and makes it the user's current
+        model. Returns its manifest entry.
+        """
+        forest = PackedForest.from_model(model)
+
+        with tempfile.NamedTemporaryFile(dir=self.model_dir, suffix=".tmp", delete=False) as f:
+            write_forest(forest, f)
+            f.flush()
+            os.fsync(f.fileno())
+            tmp_path = f.name
+
+        conn = self._connect()
+        try:
+            # Takes the manifest's write lock, so concurrent saves of the
+            # same user get consecutive versions
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT version FROM models WHERE user_id = ?", (user_id,)).fetchone()
+            version = (row[0] if row else 0) + 1
+            path = self.model_path(user_id, version)
+            os.replace(tmp_path, path)
+            entry = {
+                "user_id": user_id,
+                "version": version,
+                "path": os.path.basename(path),
+                "size": os.path.getsize(path),
+                "trained_at": time.time(),
+                "info": json.dumps(info or {}),
+            }
+            conn.execute(
+                "INSERT OR REPLACE INTO models (user_id, version, path, size, trained_at, info) "
+                "VALUES (:user_id, :version, :path, :size, :trained_at, :info)",
+                entry
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._delete_old_versions(user_id, version)
+        logger.info(f"Saved model v{version} for {user_id} ({entry['size']} bytes).")
+        return entry
+
+    def version(self, user_id: str) -> int:
+        """
+        The user's current model version.
+        Raises FileNotFoundError if the user has no trained model.
+        """
+        row = self._connect().execute("SELECT version FROM models WHERE user_id = ?", (user_id,)).fetchone()
+        if row is not None:
+            return row[0]
+        if os.path.exists(self.legacy_path(user_id)):
+            return 0
+        raise FileNotFoundError(f"No trained model for {user_id}")
+
+    def load(self, user_id: str, version: int | None = None) -> PackedForest:
+        """
+        Opens the user's model (the current version unless given).
+        Raises FileNotFoundError if the user has no trained model.
+        """
+        if version is None:
+            version = self.version(user_id)
+        if version == 0:
+            return self._convert_legacy(user_id)
+        return read_forest(self.model_path(user_id, version))
+
+    def entry(self, user_id: str) -> dict | None:
+        """The user's manifest entry, or None."""
+        row = self._connect().execute(f"SELECT {MANIFEST_COLUMNS} FROM models WHERE user_id = ?", (user_id,)).fetchone()
+        return None if row is None else _entry(row)
+
+    def entries(self) -> dict[str, dict]:
+        """The whole manifest: user_id -> entry."""
+        rows = self._connect().execute(f"SELECT {MANIFEST_COLUMNS} FROM models").fetchall()
+        return {row[0]: _entry(row) for row in rows}
+
+    def _convert_legacy(self, user_id: str) -> PackedForest:
+        # Only legacy pickles need joblib (and the sklearn it unpickles)
+        import joblib
+
+        path = self.legacy_path(user_id)
+        try:
+            model = joblib.load(path)
+        except FileNotFoundError:
+            # Another thread/process converted it just now
+            return self.load(user_id)
+        entry = self.save(user_id, model, info={"converted_from": os.path.basename(path)})
+        if os.path.exists(path):
+            os.remove(path)
+        logger.info(f"Converted legacy pickle for {user_id} to v{entry['version']}.")
+        return self.load(user_id, entry["version"])
+
+    def _delete_old_versions(self, user_id: str, current: int) -> None:
+        for version in range(current - self.keep_versions, 0, -1):
+            path = self.model_path(user_id, version)
+            if not os.path.exists(path):
+                break
+            os.remove(path)
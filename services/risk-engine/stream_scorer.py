@@ -0,0 +1,319 @@
+import sys
+import os
+from dotenv import load_dotenv
+
+# --- Path Setup ---
+# 1. Add project root to sys.path so we can import 'core'
+project_root = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(project_root)
+
+# 2. Load the root .env file
+load_dotenv(os.path.join(project_root, '.env'))
+
+# --- Regular Imports ---
+import redis
+import logging
+import argparse
+import json
+import time
+import signal
+import socket
+import threading
+
+import numpy as np
+
+# --- Our Project's Code ---
+from core import metrics, event_codec
+from core.stream import StreamConsumer, RISK_SCORES_CHANNEL, STREAM_SHARDS, shard_streams
+from core.keystroke_features import select_columns, CORRECTION_KEYS
+from core.supervisor import ShardSupervisor
+from model_cache import ModelCache
+from model_store import ModelStore, MODEL_DIR
+from window_state import WindowState
+
+# --- Configuration ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("risk-scorer")
+
+# --- Redis Config (from .env) ---
+REDIS_HOST = os.getenv("REDIS_HOST")
+REDIS_PORT = os.getenv("REDIS_PORT")
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+
+# The scorer reads the behavioral stream(s) in its own consumer group,
+# next to the event logger's, so both see every event. A new group
+# starts at the end of the stream: there's no point scoring old events.
+SCORER_CONSUMER_GROUP = os.getenv("SCORER_CONSUMER_GROUP", "risk-scorer")
+# Workers are named '<SCORER_CONSUMER_NAME or hostname>-w<n>'
+CONSUMER_NAME = os.getenv("SCORER_CONSUMER_NAME") or f"{socket.gethostname()}-{os.getpid()}"
+
+# --- Worker Config (from .env) ---
+# Worker processes, each owning a share of the STREAM_SHARDS streams
+# and the window state of their users (overridden by --workers)
+SCORER_WORKERS = int(os.getenv("SCORER_WORKERS", "1"))
+# Entries read per round trip
+SCORER_BATCH_SIZE = int(os.getenv("SCORER_BATCH_SIZE", "500"))
+
+# --- Window State Config (from .env) ---
+# Users whose open windows are kept per worker; beyond that the least
+# recently seen user's window is dropped
+SCORER_MAX_USERS = int(os.getenv("SCORER_MAX_USERS", "100000"))
+# A full window is scored once the user's next mouse movement starts a
+# new one, or after this long without events from them
+SCORER_IDLE_CLOSE_MS = int(os.getenv("SCORER_IDLE_CLOSE_MS", "2000"))
+# Users not seen for this long are forgotten
+SCORER_USER_TTL_S = int(os.getenv("SCORER_USER_TTL_S", "1800"))
+
+# --- Model Config (from .env) ---
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "256"))
+# Users without a trained model aren't looked up again for this long
+SCORER_MODEL_RECHECK_S = int(os.getenv("SCORER_MODEL_RECHECK_S", "30"))
+
+# --- Metrics Config (from .env) ---
+# /metrics is served on this port (+ the worker index; 0 = don't serve metrics)
+SCORER_METRICS_PORT = int(os.getenv("SCORER_METRICS_PORT", "9103"))
+
+events_received = metrics.Counter("scorer_events_received_total", "Stream entries read")
+decode_errors = metrics.Counter("scorer_decode_errors_total", "Stream entries that weren't valid events")
+windows_scored = metrics.Counter("scorer_windows_scored_total", "Closed windows scored", ("verdict",))
+windows_unscored = metrics.Counter("scorer_windows_unscored_total", "Closed windows of users without a model")
+batch_seconds = metrics.Histogram("scorer_batch_seconds", "Time to fold, score and publish one batch")
+
+
+class StreamScorer:
+    """
+    Scores live behavior: folds each user's events into their open
+    window (WindowState) and, whenever a window closes, scores it
+    against the user's model and publishes the result on
+    RISK_SCORES_CHANNEL, for the ingestor to relay to the user's
+    connections.
+
+    A user's events must all reach the same scorer, in order, which
+    sharding the stream by user gives (one worker per shard set).
+    """
+
+    def __init__(self, redis_client, models: ModelCache, max_users: int = SCORER_MAX_USERS,
+                 channel: str = RISK_SCORES_CHANNEL):
+        self.redis_client = redis_client
+        self.models = models
+        self.channel = channel
+        self.state = WindowState(max_users)
+
+        # user_id -> when they were last found to have no model
+        self._no_model: dict[str, float] = {}
+
+    def process(self, entries: list[tuple[str, dict]]) -> int:
+        """Folds in a batch of stream entries and publishes the windows they close. Returns how many."""
+        by_user: dict[str, list[dict]] = {}
+        for entry_id, fields in entries:
+            try:
+                events = event_codec.decode_fields(fields)
+            except ValueError:
+                decode_errors.inc()
+                continue
+            for event in events:
+                user_id = event.get('user_id')
+                if user_id:
+                    by_user.setdefault(user_id, []).append(event)
+
+        scored = []
+        for user_id, events in by_user.items():
+            features, end_ts = self.add_events(user_id, events)
+            if len(features):
+                scored.append((user_id, features, end_ts))
+        return self.publish(scored)
+
+    def add_events(self, user_id: str, events: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+        """Folds one user's events into their window state. Returns the closed windows' (features, end_ts)."""
+        events.sort(key=lambda event: event.get('timestamp') or 0)
+        moves = [e for e in events if e.get('type') == 'mousemove' and e.get('timestamp') is not None]
+        keys = [e for e in events if e.get('type') in ('keydown', 'click') and e.get('timestamp') is not None]
+
+        def column(rows, name):
+            return np.array([np.nan if row.get(name) is None else row[name] for row in rows], dtype=np.float64)
+
+        return self.state.add(
+            self.state.slot(user_id),
+            column(moves, 'timestamp'), column(moves, 'x'), column(moves, 'y'),
+            column(keys, 'timestamp'),
+            np.array([e['type'] == 'click' for e in keys], dtype=bool),
+            np.array([e.get('key') in CORRECTION_KEYS for e in keys], dtype=bool),
+        )
+
+    def close_idle(self, idle_s: float = SCORER_IDLE_CLOSE_MS / 1000.0) -> int:
+        """Publishes the full windows of users who went quiet. Returns how many."""
+        return self.publish(self.state.close_idle(idle_s))
+
+    def expire(self, ttl_s: float = SCORER_USER_TTL_S) -> int:
+        now = time.monotonic()
+        self._no_model = {u: t for u, t in self._no_model.items() if now - t < SCORER_MODEL_RECHECK_S}
+        return self.state.expire(ttl_s)
+
+    def model(self, user_id: str):
+        """The user's model, or None (without hitting the store again for a while)."""
+        missed_at = self._no_model.get(user_id)
+        if missed_at is not None and time.monotonic() - missed_at < SCORER_MODEL_RECHECK_S:
+            return None
+        try:
+            return self.models.get(user_id)
+        except FileNotFoundError:
+            self._no_model[user_id] = time.monotonic()
+            return None
+
+    def publish(self, scored: list[tuple[str, np.ndarray, np.ndarray]]) -> int:
+        """Scores each user's closed windows against their model and publishes one message per window."""
+        messages = []
+        scored_at = int(time.time() * 1000)
+        for user_id, features, end_ts in scored:
+            try:
+                model = self.model(user_id)
+            except Exception as e:
+                logger.error(f"Failed to load model for {user_id}: {e}")
+                model = None
+            if model is None:
+                windows_unscored.inc(len(features))
+                continue
+
+            # decision_function < 0 means "anomalous" for an IsolationForest
+            scores = model.decision_function(select_columns(features, model.feature_names))
+            for score, window_end_ts in zip(scores.tolist(), end_ts.tolist()):
+                windows_scored.labels("anomalous" if score < 0 else "normal").inc()
+                messages.append(json.dumps({
+                    "type": "risk_score",
+                    "user_id": user_id,
+                    "score": score,
+                    "is_anomalous": score < 0,
+                    "window_end_ts": int(window_end_ts),
+                    "scored_at": scored_at,
+                }))
+
+        if messages:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for message in messages:
+                pipe.publish(self.channel, message)
+            pipe.execute()
+        return len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scores live behavior from the event stream(s) as it arrives.")
+    parser.add_argument("--workers", type=int, default=SCORER_WORKERS,
+                        help=f"worker processes, each owning some of the {STREAM_SHARDS} stream shard(s)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        supervisor = ShardSupervisor(run_worker, workers=args.workers, name="risk-scorer")
+        sys.exit(supervisor.run())
+
+    logger.info("Starting stream scorer...")
+    serve_metrics(SCORER_METRICS_PORT)
+    redis_client = connect_redis()
+    if redis_client is None:
+        return # Exit if we can't connect
+
+    try:
+        score_stream(redis_client)
+    except KeyboardInterrupt:
+        logger.info("Shutting down stream scorer...")
+    finally:
+        redis_client.close()
+
+
+def run_worker(index: int, streams: list[str]):
+    """
+    Entry point of a sharded worker process (started by ShardSupervisor):
+    scores only 'streams', until the supervisor sends SIGTERM.
+    """
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    # Ctrl-C reaches the whole process group; the supervisor turns it into SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    logger.info(f"Worker {index} starting on {', '.join(streams)}")
+    serve_metrics(SCORER_METRICS_PORT + index if SCORER_METRICS_PORT else 0)
+    redis_client = connect_redis()
+    if redis_client is None:
+        sys.exit(1)
+
+    base_name = os.getenv("SCORER_CONSUMER_NAME") or socket.gethostname()
+    try:
+        score_stream(redis_client, consumer_name=f"{base_name}-w{index}", streams=streams, claim=True, stop=stop)
+    finally:
+        redis_client.close()
+        logger.info(f"Worker {index} stopped.")
+
+
+def serve_metrics(port: int):
+    if port:
+        try:
+            metrics.start_http_server(port)
+        except OSError as e:
+            logger.warning(f"Could not serve metrics on port {port}: {e}")
+
+
+def connect_redis():
+    """A connected Redis client, or None."""
+    try:
+        redis_client = redis.Redis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            password=REDIS_PASSWORD,
+            decode_responses=False  # Entries may hold binary (msgpack) events
+        )
+        redis_client.ping()
+        logger.info(f"Successfully connected to Redis at {REDIS_HOST}.")
+        return redis_client
+    except Exception as e:
+        logger.error(f"Failed to connect to Redis: {e}")
+        return None
+
+
+def score_stream(redis_client, consumer_name: str = CONSUMER_NAME, streams: list[str] | None = None,
+                 claim: bool = False, stop=None, scorer: StreamScorer | None = None):
+    """
+    The scorer's main loop: reads the stream(s), scores the windows
+    that close and acks what it has read, until 'stop' (a
+    threading.Event) is set or it's interrupted.
+    'streams' defaults to every shard; 'claim' takes over their pending
+    entries at start-up (only for the streams' sole owner).
+    """
+    streams = streams or shard_streams()
+    if scorer is None:
+        scorer = StreamScorer(redis_client, ModelCache(ModelStore(MODEL_DIR), max_size=MODEL_CACHE_SIZE))
+    metrics.Gauge("scorer_users", "Users with an open window", function=lambda: len(scorer.state))
+    metrics.Counter("scorer_users_evicted_total", "Open windows dropped to make room",
+                    function=lambda: scorer.state.evictions)
+
+    consumer = StreamConsumer(redis_client, consumer_name, group=SCORER_CONSUMER_GROUP, stream=streams,
+                              count=SCORER_BATCH_SIZE, claim=claim, start_id="$")
+    logger.info(f"Scoring {', '.join(streams)} as '{consumer_name}' in group '{SCORER_CONSUMER_GROUP}', "
+                f"publishing to '{scorer.channel}'")
+
+    # Check for idle windows a few times per SCORER_IDLE_CLOSE_MS
+    block_ms = max(1, min(1000, SCORER_IDLE_CLOSE_MS // 4))
+    next_expiry = time.monotonic() + 60
+    try:
+        while stop is None or not stop.is_set():
+            # Entries are scored on arrival; a redelivered one (after a
+            # restart, with its window state gone) just starts a new window
+            entries, _ = consumer.read(block_ms=block_ms)
+            if entries:
+                events_received.inc(len(entries))
+                start = time.perf_counter()
+                scorer.process(entries)
+                batch_seconds.observe(time.perf_counter() - start)
+                # Scores are published fire-and-forget; there's nothing to retry
+                consumer.ack([entry_id for entry_id, _ in entries])
+
+            scorer.close_idle()
+            if time.monotonic() >= next_expiry:
+                expired = scorer.expire()
+                if expired:
+                    logger.info(f"Forgot {expired} idle users.")
+                next_expiry = time.monotonic() + 60
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import os
+import time
+import logging
+
+from core.database import get_engine
+from data_loader import load_training_features, training_columns
+from model_store import ModelStore, MODEL_DIR
+import training_policy
+
+logger = logging.getLogger("risk-engine")
+
+# Trained models are saved as versioned, memory-mappable files
+model_store = ModelStore(MODEL_DIR)
+
+
+class TrainingError(Exception):
+    """A training run failed. Carries the HTTP status the API should report."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+    def __reduce__(self):
+        # Keep both fields when the error crosses a process boundary
+        return (TrainingError, (self.status_code, self.detail))
+
+
+def init_worker() -> None:
+    """
+    Runs once in every training worker process. Connections in the
+    engine's pool must never be shared across processes, so start
+    the worker with an empty pool.
+    """
+    logging.basicConfig(level=logging.INFO)
+    get_engine().dispose(close=False)
+
+
+def train_user_model(user_id: str) -> dict:
+    """
+    The full training pipeline for one user: stream their data,
+    build features, fit an IsolationForest and save it.
+    Runs in a worker process; raises TrainingError on failure.
+    """
+    # pandas and scikit-learn take seconds to import, and only training
+    # needs them, so the API server (which imports this module) starts
+    # without them. Training workers import them on their first job.
+    import pandas as pd
+
+    logger.info(f"Training model for user_id: {user_id}")
+    timings = {}
+    start = time.perf_counter()
+
+    # 1. Load features: precomputed window rows from the feature store,
+    # or (if it isn't up to date for this user) raw events streamed
+    # through a server-side cursor, so memory stays bounded either way.
+    # Past TRAINING_MAX_ROWS windows only a sample of them is kept.
+    try:
+        sampler = training_policy.new_sampler() if training_policy.TRAINING_MAX_ROWS > 0 else None
+    except ValueError as e:
+        logger.error(f"Invalid training policy: {e}")
+        raise TrainingError(500, str(e))
+    try:
+        feature_rows, raw_events, feature_source = load_training_features(get_engine(), user_id, sampler=sampler)
+    except Exception as e:
+        logger.error(f"Database error: {e}")
+        raise TrainingError(500, "Database connection error")
+
+    timings["load"] = time.perf_counter() - start
+
+    if raw_events < 50: # Need at least some data to train
+        logger.warning(f"Not enough data to train for user: {user_id} (found {raw_events} events)")
+        raise TrainingError(400, "Not enough behavioral data to train a model.")
+
+    # 2. Feature Engineering
+    try:
+        # The column names are saved with the model, so scoring builds the same columns
+        features = pd.DataFrame(feature_rows, columns=training_columns())
+        if len(features) < 10: # Need at least 10 "sessions"
+             raise Exception("Not enough feature rows after processing.")
+
+    except Exception as e:
+        logger.error(f"Feature engineering failed: {e}")
+        raise TrainingError(500, f"Feature engineering failed: {e}")
+
+    # 3. Train the AI Model (IsolationForest)
+    try:
+        start = time.perf_counter()
+        model = training_policy.new_model()
+        model.fit(features)
+        timings["fit"] = time.perf_counter() - start
+
+        logger.info("Model training complete.")
+    except Exception as e:
+        logger.error(f"Model training failed: {e}")
+        raise TrainingError(500, f"Model training failed: {e}")
+
+    # 4. Save the Trained Model to the model store
+    try:
+        start = time.perf_counter()
+        entry = model_store.save(user_id, model, info={
+            "raw_events": raw_events,
+            "feature_rows": len(features),
+            "windows_seen": sampler.seen if sampler is not None else len(features),
+            "training_policy": training_policy.policy(),
+        })
+        model_path = os.path.join(MODEL_DIR, entry["path"])
+        timings["save"] = time.perf_counter() - start
+        logger.info(f"Model for {user_id} saved to {model_path}")
+    except Exception as e:
+        logger.error(f"Failed to save model: {e}")
+        raise TrainingError(500, "Failed to save trained model.")
+
+    return {
+        "status": "training_complete",
+        "user_id": user_id,
+        "model_path": model_path,
+        "model_version": entry["version"],
+        "raw_events_processed": raw_events,
+        "feature_rows_created": len(features),
+        "windows_seen": sampler.seen if sampler is not None else len(features),
+        "feature_source": feature_source,
+        "timings": timings
+    }
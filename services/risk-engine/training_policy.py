@@ -0,0 +1,142 @@
+import os
+import math
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("risk-engine")
+
+# --- Training Policy Config (from .env) ---
+# A model is fitted on at most this many feature rows (windows), so
+# training time and memory stay bounded however long a user's history
+# gets. 0 = every row.
+TRAINING_MAX_ROWS = int(os.getenv("TRAINING_MAX_ROWS", "100000"))
+
+# Which rows, when there are more than that:
+# - reservoir: a uniform random sample of the whole history
+# - recent: a sample weighted towards recent windows; a window
+#   TRAINING_RECENCY_HALF_LIFE_DAYS older than another is half as
+#   likely to be picked
+TRAINING_SAMPLING = os.getenv("TRAINING_SAMPLING", "reservoir").lower()
+TRAINING_RECENCY_HALF_LIFE_DAYS = float(os.getenv("TRAINING_RECENCY_HALF_LIFE_DAYS", "14"))
+
+# IsolationForest settings. TRAINING_MAX_SAMPLES is "auto" (256 rows
+# per tree), a row count or a fraction of the rows. Training already
+# runs one worker process per core (TRAINING_WORKERS), so only raise
+# TRAINING_N_JOBS when there are fewer concurrent jobs than cores.
+TRAINING_N_ESTIMATORS = int(os.getenv("TRAINING_N_ESTIMATORS", "100"))
+TRAINING_MAX_SAMPLES = os.getenv("TRAINING_MAX_SAMPLES", "auto")
+TRAINING_N_JOBS = int(os.getenv("TRAINING_N_JOBS", "1"))
+TRAINING_CONTAMINATION = 0.1
+TRAINING_RANDOM_STATE = 42
+
+
+class RowSampler:
+    """
+    Keeps a bounded random sample of feature rows that arrive in chunks
+    (time order), so the rows that don't make it are never all in memory
+    at once: at most 'max_rows' plus one chunk are.
+
+    Weighted reservoir sampling (Efraimidis-Spirakis): every row gets the
+    key u ** (1 / weight), u uniform in (0, 1), and the 'max_rows' rows
+    with the largest keys are kept. With 'half_life_ms' the weight halves
+    for every half-life a row's time lies before the newest one seen;
+    without it every weight is 1, which is a uniform reservoir sample.
+    Keys are kept as logs, relative to the newest time, and rescaled
+    when it moves.
+    """
+
+    def __init__(self, max_rows: int, half_life_ms: float | None = None, seed: int = TRAINING_RANDOM_STATE):
+        self.max_rows = max_rows
+        self.decay = math.log(2) / half_life_ms if half_life_ms else 0.0
+        self.rng = np.random.default_rng(seed)
+        self.seen = 0
+
+        self._rows: list[np.ndarray] = []
+        self._index = np.empty(0, dtype=np.int64)
+        self._keys = np.empty(0)
+        self._newest: float | None = None
+
+    def add(self, rows: np.ndarray, times: np.ndarray) -> None:
+        """Offers the next chunk of rows, with each row's time (e.g. its window's first timestamp, ms)."""
+        n = len(rows)
+        if n == 0:
+            return
+        index = np.arange(self.seen, self.seen + n)
+        self.seen += n
+        if self.max_rows <= 0:
+            self._rows.append(rows)
+            self._index = np.concatenate((self._index, index))
+            return
+
+        with np.errstate(divide='ignore'):
+            keys = np.log(self.rng.random(n))  # log(u) <= 0; larger is better
+        if self.decay:
+            times = np.asarray(times, dtype=np.float64)
+            newest = float(times.max()) if self._newest is None else max(self._newest, float(times.max()))
+            with np.errstate(over='ignore'):
+                if self._newest is not None and newest > self._newest:
+                    self._keys = self._keys * np.exp(self.decay * (newest - self._newest))
+                keys *= np.exp(self.decay * (newest - times))
+            self._newest = newest
+
+        rows = np.concatenate(self._rows + [rows]) if self._rows else rows
+        index = np.concatenate((self._index, index))
+        keys = np.concatenate((self._keys, keys))
+        if len(keys) > self.max_rows:
+            keep = np.argpartition(-keys, self.max_rows - 1)[:self.max_rows]
+            rows, index, keys = rows[keep], index[keep], keys[keep]
+        self._rows, self._index, self._keys = [rows], index, keys
+
+    @property
+    def rows(self) -> np.ndarray:
+        """Positions (in arrival order) of the sampled rows, increasing."""
+        return np.sort(self._index)
+
+    def sample(self) -> np.ndarray:
+        """The sampled rows, in arrival order."""
+        if not self._rows:
+            return np.empty((0, 0))
+        rows = np.concatenate(self._rows) if len(self._rows) > 1 else self._rows[0]
+        return rows[np.argsort(self._index, kind='stable')]
+
+
+def new_sampler(max_rows: int = TRAINING_MAX_ROWS, sampling: str = TRAINING_SAMPLING) -> RowSampler:
+    """A RowSampler for the configured policy."""
+    if sampling not in ("reservoir", "recent"):
+        raise ValueError(f"Unknown TRAINING_SAMPLING: {sampling!r} (use 'reservoir' or 'recent')")
+    half_life_ms = TRAINING_RECENCY_HALF_LIFE_DAYS * 86_400_000 if sampling == "recent" else None
+    return RowSampler(max_rows, half_life_ms)
+
+
+def max_samples_setting(value: str = TRAINING_MAX_SAMPLES):
+    """TRAINING_MAX_SAMPLES as IsolationForest takes it: "auto", an int or a float fraction."""
+    if value == "auto":
+        return value
+    return float(value) if "." in value else int(value)
+
+
+def new_model(n_estimators: int = TRAINING_N_ESTIMATORS, max_samples=None, n_jobs: int = TRAINING_N_JOBS):
+    """An unfitted IsolationForest with the configured settings."""
+    # Imported here: training workers need scikit-learn, the API doesn't
+    from sklearn.ensemble import IsolationForest
+
+    # IsolationForest is good at "anomaly detection"
+    # contamination=0.1 means "assume 10% of the data is weird"
+    return IsolationForest(
+        n_estimators=n_estimators,
+        max_samples=max_samples_setting() if max_samples is None else max_samples,
+        contamination=TRAINING_CONTAMINATION,
+        n_jobs=n_jobs,
+        random_state=TRAINING_RANDOM_STATE,
+    )
+
+
+def policy() -> dict:
+    """The settings a model was trained with (saved in its manifest entry)."""
+    return {
+        "max_rows": TRAINING_MAX_ROWS,
+        "sampling": TRAINING_SAMPLING,
+        "n_estimators": TRAINING_N_ESTIMATORS,
+        "max_samples": TRAINING_MAX_SAMPLES,
+    }
@@ -0,0 +1,156 @@
+import time
+
+import numpy as np
+
+from core.features import WINDOW_SIZE, event_deltas, aggregate_windows
+from core.keystroke_features import KEYSTROKE_SUM_COLUMNS, keystroke_sums, features_from_keystroke_sums
+
+# Columns of a buffered mouse movement: its deltas to the previous one, and its time
+_DT, _DISTANCE, _SPEED, _TS = range(4)
+
+
+def _optional(value: float) -> float | None:
+    return None if np.isnan(value) else float(value)
+
+
+class WindowState:
+    """
+    Live per-user window state for the stream scorer, in preallocated
+    arrays with one row ("slot") per user instead of objects per event:
+
+    - the open window's mouse movements (deltas and time), up to
+      WINDOW_SIZE, and the last movement (to diff the next one against)
+    - the open window's keystroke totals (KEYSTROKE_SUM_COLUMNS) and the
+      last keydown/click times
+
+    Deltas are computed as events arrive; a window's feature row (the
+    same ALL_FEATURE_COLUMNS training uses) is only aggregated when it
+    closes. A full window closes when the user's next mouse movement
+    opens a new one, so typing after its last movement still counts
+    towards it, as in training, or after being idle (close_idle()).
+
+    When every slot is taken, the least recently seen user's is reused.
+    """
+
+    def __init__(self, capacity: int, window: int = WINDOW_SIZE):
+        self.capacity = capacity
+        self.window = window
+
+        self.moves = np.zeros((capacity, window, 4))
+        self.fill = np.zeros(capacity, dtype=np.int64)
+        self.last_move = np.full((capacity, 3), np.nan)  # timestamp, x, y
+        self.key_sums = np.zeros((capacity, len(KEYSTROKE_SUM_COLUMNS)))
+        self.last_key_ts = np.full(capacity, np.nan)
+        self.last_click_ts = np.full(capacity, np.nan)
+        self.last_seen = np.zeros(capacity)  # time.monotonic()
+
+        self.user_ids: list[str | None] = [None] * capacity
+        self._slots: dict[str, int] = {}
+        self._free = list(range(capacity - 1, -1, -1))
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def slot(self, user_id: str) -> int:
+        """The user's slot, taking a free (or the stalest) one for a new user."""
+        slot = self._slots.get(user_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = int(np.argmin(self.last_seen))
+                del self._slots[self.user_ids[slot]]
+                self.evictions += 1
+            self._reset(slot)
+            self.user_ids[slot] = user_id
+            self._slots[user_id] = slot
+        self.last_seen[slot] = time.monotonic()
+        return slot
+
+    def _reset(self, slot: int) -> None:
+        self.fill[slot] = 0
+        self.last_move[slot] = np.nan
+        self.key_sums[slot] = 0.0
+        self.last_key_ts[slot] = np.nan
+        self.last_click_ts[slot] = np.nan
+
+    def add(self, slot: int, move_ts, move_x, move_y, key_ts, is_click, is_correction) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Folds a user's new mouse movements and keydowns/clicks (each in
+        time order) into their state. Returns (features, end_ts) for
+        every window this closed: ALL_FEATURE_COLUMNS rows, and the time
+        of each window's last movement.
+        """
+        window, fill = self.window, self.fill[slot]
+        if len(move_ts):
+            last_ts, last_x, last_y = self.last_move[slot]
+            if np.isnan(last_ts):
+                deltas = event_deltas(move_ts, move_x, move_y)
+            else:
+                # Diff the first new movement against the last one, then drop that delta
+                deltas = tuple(values[1:] for values in event_deltas(
+                    np.r_[last_ts, move_ts], np.r_[last_x, move_x], np.r_[last_y, move_y]
+                ))
+            self.last_move[slot] = (move_ts[-1], move_x[-1], move_y[-1])
+            pending = np.concatenate((self.moves[slot, :fill], np.column_stack(deltas + (move_ts,))))
+        else:
+            pending = self.moves[slot, :fill]
+
+        # Windows start at every window-th pending movement, the first
+        # being the open one (before any movement, keys wait for it)
+        total = len(pending)
+        starts = pending[::window, _TS] if total else np.array([-np.inf])
+        sums, last_key_ts, last_click_ts = keystroke_sums(
+            starts, key_ts, is_click, is_correction,
+            _optional(self.last_key_ts[slot]), _optional(self.last_click_ts[slot])
+        )
+        self.last_key_ts[slot] = np.nan if last_key_ts is None else last_key_ts
+        self.last_click_ts[slot] = np.nan if last_click_ts is None else last_click_ts
+        sums[0] += self.key_sums[slot]
+
+        # Every window but the last is closed: a newer one has started
+        closed = (total - 1) // window if total else 0
+        done = pending[:closed * window]
+        features = np.hstack([
+            aggregate_windows(done[:, _DT], done[:, _DISTANCE], done[:, _SPEED], window=window),
+            features_from_keystroke_sums(sums[:closed]),
+        ])
+
+        rest = pending[closed * window:]
+        self.moves[slot, :len(rest)] = rest
+        self.fill[slot] = len(rest)
+        self.key_sums[slot] = sums[closed]
+        return features, done[window - 1::window, _TS]
+
+    def close_idle(self, idle_s: float) -> list[tuple[str, np.ndarray, np.ndarray]]:
+        """
+        Closes the full windows of users not seen for 'idle_s' seconds, so
+        a user who stops moving still gets their last window scored.
+        Returns (user_id, features, end_ts) per closed window.
+        """
+        cutoff = time.monotonic() - idle_s
+        closed = []
+        for slot in np.flatnonzero((self.fill == self.window) & (self.last_seen < cutoff)):
+            moves = self.moves[slot]
+            features = np.hstack([
+                aggregate_windows(moves[:, _DT], moves[:, _DISTANCE], moves[:, _SPEED], window=self.window),
+                features_from_keystroke_sums(self.key_sums[slot]),
+            ])
+            closed.append((self.user_ids[slot], features, moves[-1:, _TS].copy()))
+            self.fill[slot] = 0
+            self.key_sums[slot] = 0.0
+        return closed
+
+    def expire(self, ttl_s: float) -> int:
+        """Frees the slots of users not seen for 'ttl_s' seconds. Returns how many."""
+        cutoff = time.monotonic() - ttl_s
+        expired = 0
+        for slot in np.flatnonzero(self.last_seen < cutoff):
+            user_id = self.user_ids[slot]
+            if user_id is not None:
+                del self._slots[user_id]
+                self.user_ids[slot] = None
+                self._free.append(int(slot))
+                expired += 1
+        return expired